@@ -77,5 +77,4 @@ tar --exclude=cdk-vpc-peering/node_modules \
     -czf $build_dist_dir/eksfedctl.tar.gz \
     eksfedctl \
     cdk-vpc-peering \
-    eks-cluster-setup \
     examples
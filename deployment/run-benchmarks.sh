@@ -0,0 +1,25 @@
+#!/bin/bash
+#
+# Runs eksfedctl create and destroy end to end against fake command-line
+# tools, a local AWS stand-in and a fake instance metadata service, no AWS
+# account or network access is needed
+#
+# This script should be run from the repo's deployment directory
+# cd deployment
+# ./run-benchmarks.sh [--regions N] [--max-overhead SECONDS] [--min-parallelism X] [-o results.json]
+#
+
+# Get reference for all important folders
+template_dir="$PWD"
+source_dir="$template_dir/../source"
+
+echo "------------------------------------------------------------------------------"
+echo "[Init] Install benchmark dependencies"
+echo "------------------------------------------------------------------------------"
+python3 -m pip install --quiet -r $source_dir/benchmark/requirements.txt
+
+echo "------------------------------------------------------------------------------"
+echo "[Benchmark] eksfedctl create and destroy"
+echo "------------------------------------------------------------------------------"
+cd $source_dir/benchmark
+python3 bench.py "$@"
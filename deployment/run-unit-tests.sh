@@ -33,3 +33,9 @@ echo "[Test] Compile python files"
 echo "------------------------------------------------------------------------------"
 cd $source_dir/eksfedctl
 python3 -m compileall .
+
+echo "------------------------------------------------------------------------------"
+echo "[Test] eksfedctl"
+echo "------------------------------------------------------------------------------"
+python3 -m pip install --quiet -r requirements-dev.txt
+python3 -m pytest -q test
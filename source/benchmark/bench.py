@@ -0,0 +1,505 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+# Offline benchmark of "eksfedctl create" and "eksfedctl destroy". The
+# command-line tools are replaced by fake_tool.py, AWS by a local moto server
+# and the instance metadata service by fake_imds.py, so the runs measure the
+# orchestration itself: how much time eksfedctl adds on top of the tools,
+# how many tools it keeps busy at the same time, how it fails and how fast
+# the command line starts.
+#
+#   python3 bench.py                                  all scenarios
+#   python3 bench.py -s speedup --regions 4           a single scenario
+#   python3 bench.py --max-overhead 5 --min-parallelism 1.5 -o results.json
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import boto3
+from moto.core.responses import ActionResult
+from moto.ec2.responses.vpc_peering_connections import VPCPeeringConnections
+from moto.eks.models import EKSBackend
+from moto.server import ThreadedMotoServer
+
+from fake_imds import FakeInstanceMetadataServer
+
+BENCHMARK_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(BENCHMARK_PATH, "..")
+
+TOOLS = ["eksctl", "cdk", "kubectl", "kubefedctl", "helm", "aws", "npm"]
+BASTION_REGION = "us-east-1"
+BASTION_VPC_CIDR = "172.20.0.0/16"
+REGIONS = ["us-east-1", "us-west-2", "eu-west-1", "eu-central-1",
+           "ap-southeast-1", "ap-northeast-1", "sa-east-1", "ca-central-1"]
+
+# Latencies in seconds of the slow commands, scaled by --latency-scale
+LATENCIES = {
+    "EKSCTL_CREATE": 4.0,
+    "EKSCTL_DELETE": 2.0,
+    "CDK_DEPLOY": 1.0,
+    "NPM": 2.0,
+    "HELM": 0.5,
+    "KUBECTL": 0.5,
+    "KUBEFEDCTL": 1.0,
+}
+
+SCENARIOS = {
+    # Every tool returns immediately, the run time is eksfedctl itself
+    "overhead": {"latency": False},
+    # Realistic relative latencies, measures the parallelism
+    "speedup": {"latency": True},
+    "speedup-batch": {"latency": True, "engine": "cdk-batch"},
+    "speedup-native": {"latency": True, "engine": "native"},
+    # The second cluster fails, the others are rolled back and the
+    # federation is completed with --resume
+    "failure": {"latency": True, "fail": {"EKSCTL": "name: {name}-2"}},
+    # Every cluster and peering deployment is throttled once, the run
+    # completes through the retries
+    "throttling": {"latency": True, "fail": {"EKSCTL": "^create", "CDK": "^deploy"},
+                   "fail_times": 1, "fail_message": "Throttling: Rate exceeded"},
+    # Several federations listed from the local index and destroyed at once
+    "fleet": {"latency": False, "federations": 3},
+    # A region is added to the live federation and a member is removed,
+    # only the changed clusters are created or deleted
+    "scale": {"latency": True, "scale": True},
+    # CLI start without and with compiled bytecode, then a create that
+    # prewarms the CDK app and a second one that reuses it
+    "startup": {"latency": True, "startup": True},
+}
+
+RUNS = ["cold_start", "warm_start", "failed_create", "create", "warm_create",
+        "add_region", "remove_region", "destroy"]
+
+# Warm starts are the fastest of a few runs
+WARM_START_RUNS = 5
+
+DEFAULT_YAML = """apiVersion: fedk8s/v1
+kind: FederatedEKSConfig
+metadata:
+  name: eksfedctl
+spec:
+  apiVersion: eksctl.io/v1alpha5
+  kind: ClusterConfig
+  metadata:
+    version: "1.18"
+  vpc:
+    clusterEndpoints:
+      publicAccess: true
+      privateAccess: true
+  managedNodeGroups:
+    - name: ng-1
+      instanceType: m5.large
+      desiredCapacity: 1
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="eksfedctl offline benchmark")
+    parser.add_argument("-s", "--scenario", nargs="+", choices=list(SCENARIOS),
+                        default=list(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--regions", type=int, default=3,
+                        help="Number of federated clusters")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier of the fake tool latencies")
+    parser.add_argument("--max-overhead", type=float,
+                        help="Fail when eksfedctl adds more seconds than this to a run")
+    parser.add_argument("--min-parallelism", type=float,
+                        help="Fail when the speedup scenarios keep fewer tools busy on average")
+    parser.add_argument("-o", "--output", help="Write the results to a JSON file")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the working folder with the logs and reports")
+    args = parser.parse_args()
+
+    if args.regions > len(REGIONS):
+        parser.error(f"At most {len(REGIONS)} regions are supported")
+
+    # The AWS stand-in logs every request and warns about the resource
+    # types of the placeholder stacks otherwise
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore", category=UserWarning, module="moto")
+
+    with Benchmark(args.keep) as benchmark:
+        results = [benchmark.run_scenario(name, args.regions, args.latency_scale)
+                   for name in args.scenario]
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    errors = check_results(results, args.max_overhead, args.min_parallelism)
+    for error in errors:
+        print(f"FAILED: {error}", file=sys.stderr)
+
+    return 1 if errors else 0
+
+
+class Benchmark:
+    def __init__(self, keep=False):
+        self.keep = keep
+        self.workdir = tempfile.mkdtemp(prefix="eksfedctl-bench-")
+        self.home = os.path.join(self.workdir, "home")
+        self.install_path = os.path.join(self.workdir, "install")
+        self.bin_path = os.path.join(self.workdir, "bin")
+        self.calls_log = os.path.join(self.workdir, "calls.jsonl")
+
+    def __enter__(self):
+        os.makedirs(self.home)
+        self.install()
+        self.install_tools()
+
+        add_peering_filters()
+        merge_cluster_config_updates()
+        self.aws = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        self.aws.start()
+        host, port = self.aws.get_host_and_port()
+
+        self.env = {
+            **os.environ,
+            "HOME": self.home,
+            "XDG_CACHE_HOME": os.path.join(self.home, ".cache"),
+            "PATH": self.bin_path + os.pathsep + os.environ.get("PATH", ""),
+            "TMUX": "benchmark",
+            "AWS_ENDPOINT_URL": f"http://{host}:{port}",
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            "AWS_DEFAULT_REGION": BASTION_REGION,
+            "FAKE_CALLS_LOG": self.calls_log,
+        }
+        for name in ["AWS_PROFILE", "KUBECONFIG", "EKSFEDCTL_BASTION_REGION",
+                     "EKSFEDCTL_BASTION_VPC_ID", "EKSFEDCTL_BASTION_VPC_CIDR"]:
+            self.env.pop(name, None)
+
+        ec2 = boto3.client("ec2", region_name=BASTION_REGION,
+                           endpoint_url=self.env["AWS_ENDPOINT_URL"],
+                           aws_access_key_id="benchmark", aws_secret_access_key="benchmark")
+        vpc_id = ec2.create_vpc(CidrBlock=BASTION_VPC_CIDR)["Vpc"]["VpcId"]
+
+        self.imds = FakeInstanceMetadataServer(BASTION_REGION, vpc_id, BASTION_VPC_CIDR).start()
+        self.env["EKSFEDCTL_IMDS_ENDPOINT"] = self.imds.endpoint
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.imds.stop()
+        self.aws.stop()
+
+        if self.keep:
+            print(f"Benchmark files kept in {self.workdir}")
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def install(self):
+        # Same layout as the bastion host: eksfedctl resolves the CDK app
+        # and default.yaml relative to itself
+        shutil.copytree(os.path.join(SOURCE_PATH, "eksfedctl"),
+                        os.path.join(self.install_path, "eksfedctl"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        os.makedirs(os.path.join(self.install_path, "cdk-vpc-peering"))
+
+        with open(os.path.join(self.install_path, "default.yaml"), "w") as default_file:
+            default_file.write(DEFAULT_YAML)
+
+    def install_tools(self):
+        os.makedirs(self.bin_path)
+        fake_tool = os.path.join(BENCHMARK_PATH, "fake_tool.py")
+
+        for tool in TOOLS:
+            filename = os.path.join(self.bin_path, tool)
+            with open(filename, "w") as tool_file:
+                tool_file.write(f"#!/bin/sh\nexec \"{sys.executable}\" \"{fake_tool}\" {tool} \"$@\"\n")
+            os.chmod(filename, 0o755)
+
+    def eksfedctl(self, args, env, stdin=None):
+        command = [sys.executable, os.path.join(self.install_path, "eksfedctl", "eksfedctl.py")]
+        log_filename = os.path.join(self.workdir, "eksfedctl.log")
+
+        with open(self.calls_log, "w"):
+            pass
+
+        start = time.monotonic()
+        with open(log_filename, "a") as log_file:
+            log_file.write(f"\n$ eksfedctl {' '.join(args)}\n")
+            log_file.flush()
+            process = subprocess.run(command + args, env=env, input=stdin, text=True,
+                                     stdout=log_file, stderr=subprocess.STDOUT)
+        wall = time.monotonic() - start
+
+        return {"returncode": process.returncode, **measure(self.read_calls(), wall)}
+
+    def read_calls(self):
+        with open(self.calls_log, "r") as calls_file:
+            return [json.loads(line) for line in calls_file if line.strip()]
+
+    def run_scenario(self, name, regions, latency_scale):
+        scenario = SCENARIOS[name]
+        federation_name = f"bench-{name}"
+
+        env = dict(self.env)
+        if scenario["latency"]:
+            for key, value in LATENCIES.items():
+                env[f"FAKE_LATENCY_{key}"] = str(value * latency_scale)
+
+        create_args = ["create", "-n", federation_name, "-r"] + REGIONS[:regions] + \
+            ["--peering-engine", scenario.get("engine", "cdk")]
+
+        print(f"Running scenario {name} with {regions} regions...", file=sys.stderr)
+        result = {"scenario": name, "regions": regions}
+
+        failing_env = dict(env)
+        for tool, pattern in scenario.get("fail", {}).items():
+            failing_env[f"FAKE_FAIL_{tool}"] = pattern.format(name=federation_name)
+        if "fail_times" in scenario:
+            failing_env["FAKE_FAIL_TIMES"] = str(scenario["fail_times"])
+            failing_env["FAKE_FAIL_MESSAGE"] = scenario["fail_message"]
+
+        if "federations" in scenario:
+            return self.run_fleet(result, create_args, env, scenario["federations"])
+        if scenario.get("scale"):
+            return self.run_scale(result, create_args, env, regions)
+        if scenario.get("startup"):
+            return self.run_startup(result, create_args, env)
+
+        if "fail" in scenario and "fail_times" not in scenario:
+            result["failed_create"] = self.eksfedctl(create_args, failing_env)
+            result["failed_create"]["rollbacks"] = self.count_rollbacks()
+            # The regions and the engine come from the state file
+            result["create"] = self.eksfedctl(
+                ["create", "-n", federation_name, "--resume"], env)
+        else:
+            result["create"] = self.eksfedctl(create_args, failing_env)
+
+        env_filename = os.path.join(self.home, f"{federation_name}.env")
+        if os.path.exists(env_filename):
+            result["destroy"] = self.eksfedctl(["destroy", "-f", env_filename], env, stdin="y\n")
+
+        return result
+
+    def run_fleet(self, result, create_args, env, count):
+        names = [f"{create_args[2]}-{idx+1}" for idx in range(count)]
+        for name in names:
+            result["create"] = self.eksfedctl(
+                create_args[:2] + [name] + create_args[3:], env)
+
+        listing = subprocess.run(
+            [sys.executable, os.path.join(self.install_path, "eksfedctl", "eksfedctl.py"),
+             "list", "-o", "json"], env=env, text=True, capture_output=True)
+        listed = [federation["name"] for federation in json.loads(listing.stdout or "[]")]
+        result["listed"] = len(set(names) & set(listed))
+
+        result["destroy"] = self.eksfedctl(
+            ["destroy", "-n"] + names + ["--parallel", str(count)], env, stdin="y\n")
+        return result
+
+    def run_scale(self, result, create_args, env, regions):
+        name = create_args[2]
+        result["create"] = self.eksfedctl(create_args, env)
+        result["unhealthy"] = self.get_unhealthy_probes(name, env)
+
+        result["add_region"] = self.eksfedctl(
+            ["add-region", "-n", name, "-r", REGIONS[regions]], env)
+        result["add_region"]["clusters"] = self.count_calls("create", "cluster")
+
+        # A member in the middle, the last one keeps its number
+        result["remove_region"] = self.eksfedctl(
+            ["remove-region", "-n", name, "-r", REGIONS[regions - 1]], env, stdin="y\n")
+
+        result["destroy"] = self.eksfedctl(["destroy", "-n", name], env, stdin="y\n")
+        return result
+
+    def run_startup(self, result, create_args, env):
+        name = create_args[2]
+        shutil.rmtree(os.path.join(self.home, ".cache", "eksfedctl", "cdk-apps"),
+                      ignore_errors=True)
+        shutil.rmtree(os.path.join(self.install_path, "eksfedctl", "__pycache__"),
+                      ignore_errors=True)
+
+        result["cold_start"] = self.eksfedctl(["--version"], env)
+        result["warm_start"] = min(
+            [self.eksfedctl(["--version"], env) for _ in range(WARM_START_RUNS)],
+            key=lambda measures: measures["wall"])
+
+        result["create"] = self.eksfedctl(create_args, env)
+        result["create"]["npm"] = self.count_calls(tool="npm")
+
+        result["warm_create"] = self.eksfedctl(
+            create_args[:2] + [f"{name}-warm"] + create_args[3:], env)
+        result["warm_create"]["npm"] = self.count_calls(tool="npm")
+
+        result["destroy"] = self.eksfedctl(
+            ["destroy", "-n", name, f"{name}-warm"], env, stdin="y\n")
+        return result
+
+    def get_unhealthy_probes(self, name, env):
+        # The stand-in has no Kubernetes API, the KubeFed probes always fail
+        status = subprocess.run(
+            [sys.executable, os.path.join(self.install_path, "eksfedctl", "eksfedctl.py"),
+             "status", "-n", name, "-o", "json"], env=env, text=True, capture_output=True)
+        if status.returncode:
+            return [f"status exited with {status.returncode}"]
+
+        return [f"{probe['probe']} {probe['target']}: {probe['status']} {probe['detail']}"
+                for probe in json.loads(status.stdout or "[]")
+                if not probe["healthy"] and probe["probe"] != "kubefed"]
+
+    def count_calls(self, *args, tool="eksctl"):
+        return len([call for call in self.read_calls()
+                    if call["tool"] == tool and call["args"][:len(args)] == list(args)])
+
+    def count_rollbacks(self):
+        return self.count_calls("delete", "cluster")
+
+
+def add_peering_filters():
+    # The stand-in ignores the filters of DescribeVpcPeeringConnections,
+    # the native peering engine finds its connections by VPC, state and tag
+    def get_filter_value(pcx, name):
+        if name == "requester-vpc-info.vpc-id":
+            return pcx.vpc.id
+        if name == "accepter-vpc-info.vpc-id":
+            return pcx.peer_vpc.id
+        if name == "status-code":
+            return pcx._status.code
+        return pcx.get_filter_value(name)
+
+    def describe_vpc_peering_connections(self):
+        vpc_pcxs = self.ec2_backend.describe_vpc_peering_connections(
+            vpc_peering_ids=self._get_param("VpcPeeringConnectionIds", []))
+        filters = self._filters_from_querystring()
+
+        return ActionResult({"VpcPeeringConnections": [
+            pcx for pcx in vpc_pcxs
+            if all(get_filter_value(pcx, name) in values for name, values in filters.items())]})
+
+    VPCPeeringConnections.describe_vpc_peering_connections = describe_vpc_peering_connections
+
+
+def merge_cluster_config_updates():
+    # The stand-in replaces the whole VPC configuration of the cluster with
+    # the update, EKS only changes the fields that are sent
+    update_cluster_config = EKSBackend.update_cluster_config
+
+    def merge_update(self, name, resources_vpc_config, *args, **kwargs):
+        cluster = self.clusters.get(name)
+        if cluster and resources_vpc_config:
+            resources_vpc_config = {**cluster.resources_vpc_config, **resources_vpc_config}
+        return update_cluster_config(self, name, resources_vpc_config, *args, **kwargs)
+
+    EKSBackend.update_cluster_config = merge_update
+
+
+def measure(calls, wall):
+    # busy: time during which at least one tool ran, idle: the rest of the
+    # wall time, spent in eksfedctl and in AWS API calls. parallelism:
+    # average number of tools running at the same time
+    intervals = sorted((call["start"], call["end"]) for call in calls)
+    busy = 0.0
+    current_start, current_end = None, None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        busy += current_end - current_start
+
+    tool_time = sum(end - start for start, end in intervals)
+
+    return {
+        "wall": round(wall, 3),
+        "calls": len(calls),
+        "failed_calls": len([call for call in calls if call["returncode"]]),
+        "tool_time": round(tool_time, 3),
+        "busy": round(busy, 3),
+        "overhead": round(wall - busy, 3),
+        "parallelism": round(tool_time / wall, 2) if wall else 0.0,
+    }
+
+
+def print_results(results):
+    header = ["SCENARIO", "RUN", "RC", "WALL", "CALLS", "TOOL TIME", "OVERHEAD", "PARALLELISM"]
+    rows = []
+    for result in results:
+        for run in RUNS:
+            if run in result:
+                measures = result[run]
+                rows.append([result["scenario"], run, str(measures["returncode"]),
+                             format_duration(measures["wall"]), str(measures["calls"]),
+                             f"{measures['tool_time']:.1f}s", f"{measures['overhead']:.1f}s",
+                             f"{measures['parallelism']:.2f}"])
+
+    widths = [max(len(row[idx]) for row in [header] + rows) for idx in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def format_duration(seconds):
+    # Start times are well below a second
+    return f"{seconds:.1f}s" if seconds >= 1 else f"{seconds * 1000:.0f}ms"
+
+
+def check_results(results, max_overhead=None, min_parallelism=None):
+    errors = []
+    for result in results:
+        scenario = result["scenario"]
+
+        for run in [run for run in RUNS if run != "failed_create"]:
+            if result.get(run, {}).get("returncode", 0) != 0:
+                errors.append(f"{scenario}: {run} exited with {result[run]['returncode']}")
+        if "destroy" not in result:
+            errors.append(f"{scenario}: no federation to destroy")
+        if result.get("listed", SCENARIOS[scenario].get("federations")) != \
+                SCENARIOS[scenario].get("federations"):
+            errors.append(f"{scenario}: {result['listed']} federations listed")
+
+        if result.get("add_region", {}).get("clusters", 1) != 1:
+            errors.append(f"{scenario}: add-region created "
+                          f"{result['add_region']['clusters']} clusters instead of 1")
+
+        for probe in result.get("unhealthy", []):
+            errors.append(f"{scenario}: unhealthy {probe}")
+
+        if result.get("warm_create", {}).get("npm", 0) != 0:
+            errors.append(f"{scenario}: the second create ran npm "
+                          f"{result['warm_create']['npm']} times")
+
+        if "failed_create" in result:
+            if result["failed_create"]["returncode"] == 0:
+                errors.append(f"{scenario}: the injected failure wasn't reported")
+            if result["failed_create"]["rollbacks"] == 0:
+                errors.append(f"{scenario}: the interrupted clusters weren't rolled back")
+
+        create = result.get("create", {})
+        if max_overhead is not None and create.get("overhead", 0) > max_overhead:
+            errors.append(f"{scenario}: overhead {create['overhead']}s above {max_overhead}s")
+        if min_parallelism is not None and scenario.startswith("speedup") and \
+                create.get("parallelism", 0) < min_parallelism:
+            errors.append(
+                f"{scenario}: parallelism {create['parallelism']} below {min_parallelism}")
+
+    return errors
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+# IMDSv2 stand-in serving the bastion facts eksfedctl reads: the identity
+# document, the MAC of the primary interface and its VPC ID and CIDR.
+# eksfedctl is pointed at it with EKSFEDCTL_IMDS_ENDPOINT
+
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAC = "0a:00:00:00:00:01"
+
+
+class InstanceMetadataHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        if self.path != "/latest/api/token":
+            return self.reply(404, "Not Found")
+
+        self.reply(200, self.server.token)
+
+    def do_GET(self):
+        if self.headers.get("X-aws-ec2-metadata-token") != self.server.token:
+            return self.reply(401, "Unauthorized")
+
+        value = self.server.paths.get(self.path)
+        if value is None:
+            return self.reply(404, "Not Found")
+
+        self.reply(200, value)
+
+    def reply(self, status, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeInstanceMetadataServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, region, vpc_id, vpc_cidr, port=0):
+        super().__init__(("127.0.0.1", port), InstanceMetadataHandler)
+        self.token = str(uuid.uuid4())
+
+        interface_path = f"/latest/meta-data/network/interfaces/macs/{MAC}"
+        self.paths = {
+            "/latest/dynamic/instance-identity/document": json.dumps(
+                {"region": region, "instanceId": "i-0123456789abcdef0"}),
+            "/latest/meta-data/mac": MAC,
+            f"{interface_path}/vpc-id": vpc_id,
+            f"{interface_path}/vpc-ipv4-cidr-block": vpc_cidr,
+        }
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
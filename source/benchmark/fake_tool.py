@@ -0,0 +1,304 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+# Stand-in for eksctl, cdk, kubectl, kubefedctl, helm, aws and npm. The
+# benchmark puts a wrapper per tool on PATH that calls this script with the
+# tool name as first argument. Every invocation sleeps for the configured
+# latency and records itself in the calls log, the commands that create AWS
+# resources create them in the local AWS stand-in instead.
+#
+#   FAKE_LATENCY_<TOOL>        seconds to sleep, e.g. FAKE_LATENCY_EKSCTL=2
+#   FAKE_LATENCY_<TOOL>_<CMD>  per sub-command, e.g. FAKE_LATENCY_CDK_DEPLOY=1
+#   FAKE_FAIL_<TOOL>           regex matched against the arguments and stdin,
+#                              matching invocations fail after their latency
+#   FAKE_FAIL_TIMES            fail only the first N matching invocations of
+#                              the same command, e.g. to inject transient errors
+#   FAKE_FAIL_MESSAGE          error printed by the failing invocations
+#   FAKE_CALLS_LOG             JSON lines file receiving one record per call
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import boto3
+import yaml
+
+PLACEHOLDER_RESOURCES = {
+    "Handle": {"Type": "AWS::CloudFormation::WaitConditionHandle"},
+}
+
+
+def main(argv):
+    tool, args = argv[1], argv[2:]
+    stdin = sys.stdin.read() if "-" in args else ""
+    command = " ".join(args)
+    started = time.time()
+
+    key = hashlib.sha1(f"{tool} {command}\n{stdin}".encode()).hexdigest()
+
+    returncode = 0
+    try:
+        time.sleep(get_latency(tool, args))
+
+        pattern = os.environ.get(f"FAKE_FAIL_{env_name(tool)}")
+        if pattern and (re.search(pattern, command) or re.search(pattern, stdin)) and \
+                count_failures(key) < int(os.environ.get("FAKE_FAIL_TIMES", sys.maxsize)):
+            raise Exception(os.environ.get(
+                "FAKE_FAIL_MESSAGE", f"injected failure of \"{tool} {command}\""))
+
+        # "aws --region REGION eks ..." is dispatched on the sub-command
+        names = args[2:] if args[:1] == ["--region"] else args
+        handler = HANDLERS.get((tool, tuple(names[:2]))) or HANDLERS.get((tool, tuple(names[:1])))
+        if handler:
+            handler(args, stdin)
+        else:
+            print(f"{tool} {command}")
+    except Exception as ex:
+        print(f"Error: {ex}", file=sys.stderr)
+        returncode = 1
+
+    record_call(tool, args, key, started, returncode)
+    return returncode
+
+
+def env_name(value):
+    return re.sub("[^A-Z0-9]", "_", value.upper())
+
+
+def get_latency(tool, args):
+    for name in [f"{tool}_{args[0]}" if args else None, tool]:
+        if name and f"FAKE_LATENCY_{env_name(name)}" in os.environ:
+            return float(os.environ[f"FAKE_LATENCY_{env_name(name)}"])
+
+    return 0.0
+
+
+def count_failures(key):
+    filename = os.environ.get("FAKE_CALLS_LOG")
+    if not filename or not os.path.exists(filename):
+        return 0
+
+    with open(filename, "r") as calls_file:
+        calls = [json.loads(line) for line in calls_file if line.strip()]
+
+    return len([call for call in calls if call["key"] == key and call["returncode"]])
+
+
+def record_call(tool, args, key, started, returncode):
+    filename = os.environ.get("FAKE_CALLS_LOG")
+    if not filename:
+        return
+
+    record = {"tool": tool, "args": args, "key": key, "start": started,
+              "end": time.time(), "returncode": returncode}
+
+    # Appends of a single short line are atomic, concurrent calls don't mix
+    with open(filename, "a") as calls_file:
+        calls_file.write(json.dumps(record) + "\n")
+
+
+def get_options(args):
+    # --key=value, --key value and -c key=value arguments
+    options = dict()
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        if arg == "-c" and idx + 1 < len(args):
+            key, _, value = args[idx+1].partition("=")
+            options[key] = value
+            idx += 1
+        elif arg.startswith("--") and "=" in arg:
+            key, _, value = arg[2:].partition("=")
+            options[key] = value
+        elif arg.startswith("--") and idx + 1 < len(args) and not args[idx+1].startswith("-"):
+            options[arg[2:]] = args[idx+1]
+            idx += 1
+        idx += 1
+
+    return options
+
+
+def get_client(service, region):
+    return boto3.client(service, region_name=region)
+
+
+def create_stack(region, stack_name, resources=None, outputs=None):
+    template = {"Resources": resources or PLACEHOLDER_RESOURCES}
+    if outputs:
+        template["Outputs"] = {key: {"Value": value} for key, value in outputs.items()}
+
+    cf = get_client("cloudformation", region)
+    cf.create_stack(StackName=stack_name, TemplateBody=json.dumps(template))
+
+    stack = cf.describe_stacks(StackName=stack_name)["Stacks"][0]
+    return {output["OutputKey"]: output["OutputValue"]
+            for output in stack.get("Outputs", [])}
+
+
+def delete_stack(region, stack_name):
+    cf = get_client("cloudformation", region)
+    cf.delete_stack(StackName=stack_name)
+
+
+def eksctl_create_cluster(args, stdin):
+    cluster_config = yaml.safe_load(stdin)
+    metadata = cluster_config["metadata"]
+    name, region = metadata["name"], metadata["region"]
+
+    # The cluster stack owns the VPC, deleting the stack releases it
+    outputs = create_stack(region, f"eksctl-{name}-cluster", resources={
+        "VPC": {"Type": "AWS::EC2::VPC",
+                "Properties": {"CidrBlock": cluster_config["vpc"]["cidr"]}},
+        "ClusterSharedNodeSecurityGroup": {
+            "Type": "AWS::EC2::SecurityGroup",
+            "Properties": {"GroupDescription": "Cluster security group",
+                           "VpcId": {"Ref": "VPC"}}},
+    }, outputs={
+        "VPC": {"Ref": "VPC"},
+        "SecurityGroup": {"Fn::GetAtt": ["ClusterSharedNodeSecurityGroup", "GroupId"]},
+    })
+
+    # The stand-in stores the VPC configuration as sent, the response-only
+    # fields that EKS computes itself are added to the request body
+    def add_response_fields(request, **kwargs):
+        body = json.loads(request.body)
+        body["resourcesVpcConfig"].update(
+            {"vpcId": outputs["VPC"], "clusterSecurityGroupId": outputs["SecurityGroup"]})
+        request.data = json.dumps(body).encode()
+
+    eks = get_client("eks", region)
+    eks.meta.events.register("before-sign.eks.CreateCluster", add_response_fields)
+    eks.create_cluster(
+        name=name, roleArn="arn:aws:iam::123456789012:role/eksctl-cluster-role",
+        version=str(metadata.get("version", "1.18")),
+        resourcesVpcConfig={"subnetIds": [], "securityGroupIds": [outputs["SecurityGroup"]],
+                            "endpointPublicAccess": True,
+                            "endpointPrivateAccess": True})
+
+    eksctl_create_nodegroup(args, stdin)
+
+
+def eksctl_create_nodegroup(args, stdin):
+    cluster_config = yaml.safe_load(stdin)
+    metadata = cluster_config["metadata"]
+
+    for nodegroup in cluster_config.get("managedNodeGroups", []) + \
+            cluster_config.get("nodeGroups", []):
+        create_stack(metadata["region"],
+                     f"eksctl-{metadata['name']}-nodegroup-{nodegroup['name']}")
+
+
+def eksctl_delete_cluster(args, stdin):
+    options = get_options(args)
+    name, region = options["name"], options["region"]
+
+    cf = get_client("cloudformation", region)
+    for summary in cf.list_stacks()["StackSummaries"]:
+        if summary["StackName"].startswith(f"eksctl-{name}-") and \
+                summary["StackStatus"] != "DELETE_COMPLETE":
+            delete_stack(region, summary["StackName"])
+
+    eks = get_client("eks", region)
+    eks.delete_cluster(name=name)
+
+
+def cdk_deploy(args, stdin):
+    options = get_options(args)
+
+    if "peeringsFile" in options:
+        return cdk_deploy_batch(args, options)
+
+    name, region = options["name"], options["vpc1region"]
+    outputs = dict()
+    if name.endswith("-1"):
+        outputs["PeeringConnectionId"] = create_peering(
+            region, options["vpc1id"], options["vpc2region"], options["vpc2id"])
+
+    create_stack(region, name, outputs=outputs)
+
+
+def cdk_deploy_batch(args, options):
+    with open(options["peeringsFile"], "r") as peerings_file:
+        specs = {spec["name"]: spec for spec in json.load(peerings_file)}
+
+    outputs = dict()
+    for stack_name in [arg for arg in args if arg.rsplit("-", 1)[0] in specs]:
+        spec = specs[stack_name.rsplit("-", 1)[0]]
+        requester, accepter = spec["requester"], spec["accepter"]
+
+        if stack_name.endswith("-1"):
+            outputs[stack_name] = {"PeeringConnectionId": create_peering(
+                requester["region"], requester["id"], accepter["region"], accepter["id"])}
+            create_stack(requester["region"], stack_name, outputs=outputs[stack_name])
+        else:
+            outputs[stack_name] = {}
+            create_stack(accepter["region"], stack_name)
+
+    with open(options["outputs-file"], "w") as outputs_file:
+        json.dump(outputs, outputs_file, indent=2)
+
+
+def helm_pull(args, stdin):
+    # Empty chart archive where helm would download it
+    options = get_options(args)
+    chart_filename = os.path.join(options["destination"],
+                                  f"{args[1]}-{options['version']}.tgz")
+    with open(chart_filename, "wb"):
+        pass
+
+
+def aws_eks_get_token(args, stdin):
+    # ExecCredential of AWS CLI v1 on Amazon Linux 2
+    print(json.dumps({
+        "kind": "ExecCredential",
+        "apiVersion": "client.authentication.k8s.io/v1alpha1",
+        "spec": {},
+        "status": {"expirationTimestamp": "2020-01-01T00:14:00Z",
+                   "token": "k8s-aws-v1.fake"},
+    }))
+
+
+def create_peering(region, vpc_id, peer_region, peer_vpc_id):
+    ec2 = get_client("ec2", region)
+
+    try:
+        peering_id = ec2.create_vpc_peering_connection(
+            VpcId=vpc_id, PeerVpcId=peer_vpc_id, PeerRegion=peer_region
+        )["VpcPeeringConnection"]["VpcPeeringConnectionId"]
+    except Exception:
+        # VPCs unknown to the stand-in, e.g. a bastion VPC given on the
+        # command line, still get a stable identifier
+        digest = hashlib.sha1(f"{vpc_id}:{peer_vpc_id}".encode()).hexdigest()
+        return f"pcx-{digest[:17]}"
+
+    # CloudFormation accepts the connections between VPCs of the same account
+    get_client("ec2", peer_region).accept_vpc_peering_connection(
+        VpcPeeringConnectionId=peering_id)
+    return peering_id
+
+
+HANDLERS = {
+    ("eksctl", ("create", "cluster")): eksctl_create_cluster,
+    ("eksctl", ("create", "nodegroup")): eksctl_create_nodegroup,
+    ("eksctl", ("delete", "cluster")): eksctl_delete_cluster,
+    ("cdk", ("deploy",)): cdk_deploy,
+    ("helm", ("pull",)): helm_pull,
+    ("aws", ("eks", "get-token")): aws_eks_get_token,
+}
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
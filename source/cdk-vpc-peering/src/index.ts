@@ -11,41 +11,54 @@
  *  and limitations under the License.                                                                                *
  *********************************************************************************************************************/
 
+import { readFileSync } from "fs";
 import { App, Stack } from "@aws-cdk/core";
 import { VpcPeeringConstruct } from "./vpc-peering-construct";
+import { addPeeringStacks, PeeringSpec } from "./peering-stacks";
 
 const app = new App();
 const node = app.node;
 
-const name = node.tryGetContext("name");
-const peeringConnectionId = node.tryGetContext("peeringConnectionId");
-
-const vpc1id = node.tryGetContext("vpc1id");
-const vpc1region = node.tryGetContext("vpc1region");
-const vpc1cidr = node.tryGetContext("vpc1cidr");
-
-const vpc2id = node.tryGetContext("vpc2id");
-const vpc2region = node.tryGetContext("vpc2region");
-const vpc2cidr = node.tryGetContext("vpc2cidr");
-
-const stack = new Stack(app, name, {
-    env: {
-        account: process.env.CDK_DEFAULT_ACCOUNT,
-        region: vpc1region
-    }
-});
-
-new VpcPeeringConstruct(stack, name, {
-    peeringConnectionId: peeringConnectionId,
-    name,
-    vpc1: {
-        id: vpc1id,
-        region: vpc1region,
-        cidr: vpc1cidr
-    },
-    vpc2: {
-        id: vpc2id,
-        region: vpc2region,
-        cidr: vpc2cidr
-    }
-});
\ No newline at end of file
+// Batched mode: every peering of the federation is synthesized by one app run
+const peeringsFile = node.tryGetContext("peeringsFile");
+if (peeringsFile) {
+    const peerings: PeeringSpec[] = JSON.parse(readFileSync(peeringsFile, "utf8"));
+    addPeeringStacks(app, peerings, process.env.CDK_DEFAULT_ACCOUNT);
+} else {
+    addSinglePeeringStack();
+}
+
+function addSinglePeeringStack() {
+    const name = node.tryGetContext("name");
+    const peeringConnectionId = node.tryGetContext("peeringConnectionId");
+
+    const vpc1id = node.tryGetContext("vpc1id");
+    const vpc1region = node.tryGetContext("vpc1region");
+    const vpc1cidr = node.tryGetContext("vpc1cidr");
+
+    const vpc2id = node.tryGetContext("vpc2id");
+    const vpc2region = node.tryGetContext("vpc2region");
+    const vpc2cidr = node.tryGetContext("vpc2cidr");
+
+    const stack = new Stack(app, name, {
+        env: {
+            account: process.env.CDK_DEFAULT_ACCOUNT,
+            region: vpc1region
+        }
+    });
+
+    new VpcPeeringConstruct(stack, name, {
+        peeringConnectionId: peeringConnectionId,
+        name,
+        vpc1: {
+            id: vpc1id,
+            region: vpc1region,
+            cidr: vpc1cidr
+        },
+        vpc2: {
+            id: vpc2id,
+            region: vpc2region,
+            cidr: vpc2cidr
+        }
+    });
+}
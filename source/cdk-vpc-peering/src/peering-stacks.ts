@@ -0,0 +1,63 @@
+/*********************************************************************************************************************
+ *  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           *
+ *                                                                                                                    *
+ *  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    *
+ *  with the License. A copy of the License is located at                                                             *
+ *                                                                                                                    *
+ *      http://www.apache.org/licenses/LICENSE-2.0                                                                    *
+ *                                                                                                                    *
+ *  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES *
+ *  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    *
+ *  and limitations under the License.                                                                                *
+ *********************************************************************************************************************/
+
+import { App, Stack } from "@aws-cdk/core";
+import { VpcPeeringConstruct } from "./vpc-peering-construct";
+import { VpcStub } from "./vpc-stub";
+
+export interface PeeringSpec {
+    name: string,
+    requester: VpcStub;
+    accepter: VpcStub;
+    peeringConnectionId?: string;
+}
+
+// Adds the stacks of every peering to a single app. The requester stack
+// "<name>-1" creates the peering connection and the routes of the requester
+// VPC. The accepter stack "<name>-2" adds the routes of the accepter VPC and
+// is only added once the peering connection id is known
+export function addPeeringStacks(app: App, peerings: PeeringSpec[], account?: string): Stack[] {
+    const stacks: Stack[] = [];
+
+    for (const peering of peerings) {
+        const { name, requester, accepter, peeringConnectionId } = peering;
+
+        stacks.push(addPeeringStack(app, `${name}-1`, requester, accepter, account));
+
+        if (peeringConnectionId) {
+            stacks.push(addPeeringStack(app, `${name}-2`, accepter, requester, account,
+                peeringConnectionId));
+        }
+    }
+
+    return stacks;
+}
+
+function addPeeringStack(app: App, name: string, vpc1: VpcStub, vpc2: VpcStub,
+    account?: string, peeringConnectionId?: string): Stack {
+    const stack = new Stack(app, name, {
+        env: {
+            account,
+            region: vpc1.region
+        }
+    });
+
+    new VpcPeeringConstruct(stack, name, {
+        peeringConnectionId,
+        name,
+        vpc1,
+        vpc2
+    });
+
+    return stack;
+}
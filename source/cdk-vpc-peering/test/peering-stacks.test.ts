@@ -0,0 +1,136 @@
+/*********************************************************************************************************************
+ *  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           *
+ *                                                                                                                    *
+ *  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    *
+ *  with the License. A copy of the License is located at                                                             *
+ *                                                                                                                    *
+ *      http://www.apache.org/licenses/LICENSE-2.0                                                                    *
+ *                                                                                                                    *
+ *  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES *
+ *  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    *
+ *  and limitations under the License.                                                                                *
+ *********************************************************************************************************************/
+
+import { App, Stack } from '@aws-cdk/core';
+import { expect as expectCDK, haveResource, countResources, countResourcesLike, SynthUtils } from '@aws-cdk/assert';
+import { Vpc } from '@aws-cdk/aws-ec2';
+import { addPeeringStacks } from '../src/peering-stacks'
+
+const account = Math.random().toString().substring(2, 14);
+const vpc1 = {
+    id: '123',
+    cidr: '172.30.0.0/16',
+    region: "eu-west-1"
+};
+const vpc2 = {
+    id: '333',
+    cidr: '172.31.0.0/16',
+    region: "eu-central-1"
+};
+const vpc3 = {
+    id: '555',
+    cidr: '172.29.0.0/16',
+    region: "us-east-1"
+};
+
+test('requester stacks are created for every peering', () => {
+    const stacks = addPeeringStacks(new App(), [
+        { name: 'peering-a', requester: vpc1, accepter: vpc2 },
+        { name: 'peering-b', requester: vpc1, accepter: vpc3 }
+    ], account);
+
+    //Testing the fact that only requester stacks are created without peering connection ids
+    expect(stacks.map(stack => stack.stackName)).toEqual(['peering-a-1', 'peering-b-1']);
+    for (const stack of stacks) {
+        expectCDK(stack).to(countResources('AWS::EC2::VPCPeeringConnection', 1));
+    }
+});
+
+test('accepter stacks use the provided peering connection id', () => {
+    const peeringConnectionId = "peer-123";
+    const stacks = addPeeringStacks(new App(), [
+        { name: 'peering-a', requester: vpc1, accepter: vpc2, peeringConnectionId }
+    ], account);
+
+    expect(stacks.map(stack => stack.stackName)).toEqual(['peering-a-1', 'peering-a-2']);
+    expect(stacks[1].region).toEqual(vpc2.region);
+
+    //Testing the fact that accepter routes point back to the requester VPC
+    expectCDK(stacks[1]).to(haveResource('AWS::EC2::Route', {
+        DestinationCidrBlock: vpc1.cidr,
+        VpcPeeringConnectionId: peeringConnectionId
+    }));
+    expectCDK(stacks[1]).to(countResources('AWS::EC2::VPCPeeringConnection', 0));
+});
+
+// Number of distinct route tables of the public and private subnets the
+// lookup returns for a VPC, one route is added to each of them
+function countRouteTables(vpcId: string, region: string): number {
+    const stack = new Stack(new App(), 'lookup', { env: { account, region } });
+    const vpc = Vpc.fromLookup(stack, vpcId, { vpcId });
+    return new Set([...vpc.publicSubnets, ...vpc.privateSubnets]
+        .map(subnet => subnet.routeTable.routeTableId)).size;
+}
+
+test('a batch has the requester stack of every peering and the accepter stacks of known connections', () => {
+    const stacks = addPeeringStacks(new App(), [
+        { name: 'peering-a', requester: vpc1, accepter: vpc2, peeringConnectionId: 'pcx-a' },
+        { name: 'peering-b', requester: vpc1, accepter: vpc3 },
+        { name: 'peering-c', requester: vpc2, accepter: vpc3, peeringConnectionId: 'pcx-c' }
+    ], account);
+
+    //Testing the order of the stacks and that each one is deployed to the region of its VPC
+    expect(stacks.map(stack => [stack.stackName, stack.region])).toEqual([
+        ['peering-a-1', vpc1.region],
+        ['peering-a-2', vpc2.region],
+        ['peering-b-1', vpc1.region],
+        ['peering-c-1', vpc2.region],
+        ['peering-c-2', vpc3.region]
+    ]);
+});
+
+test('requester stacks are the same in both deployment waves', () => {
+    const peering = { name: 'peering-a', requester: vpc1, accepter: vpc2 };
+    const [firstWave] = addPeeringStacks(new App(), [peering], account);
+    const [secondWave] = addPeeringStacks(new App(), [
+        { ...peering, peeringConnectionId: 'pcx-a' }
+    ], account);
+
+    //Testing the fact that the second wave leaves the requester stack unchanged
+    expect(SynthUtils.toCloudFormation(secondWave)).toEqual(SynthUtils.toCloudFormation(firstWave));
+    expectCDK(secondWave).to(countResources('AWS::EC2::VPCPeeringConnection', 1));
+});
+
+test('every stack routes all the subnet route tables of its VPC to the peer', () => {
+    const stacks = addPeeringStacks(new App(), [
+        { name: 'peering-a', requester: vpc1, accepter: vpc2, peeringConnectionId: 'pcx-a' }
+    ], account);
+
+    expectCDK(stacks[0]).to(countResourcesLike('AWS::EC2::Route',
+        countRouteTables(vpc1.id, vpc1.region), { DestinationCidrBlock: vpc2.cidr }));
+    expectCDK(stacks[1]).to(countResourcesLike('AWS::EC2::Route',
+        countRouteTables(vpc2.id, vpc2.region), {
+            DestinationCidrBlock: vpc1.cidr,
+            VpcPeeringConnectionId: 'pcx-a'
+        }));
+});
+
+test('export names of a batch are unique', () => {
+    const stacks = addPeeringStacks(new App(), [
+        { name: 'peering-a', requester: vpc1, accepter: vpc2, peeringConnectionId: 'pcx-a' },
+        { name: 'peering-b', requester: vpc1, accepter: vpc3, peeringConnectionId: 'pcx-b' },
+        { name: 'peering-c', requester: vpc2, accepter: vpc3, peeringConnectionId: 'pcx-c' }
+    ], account);
+
+    const exportNames: string[] = [];
+    for (const stack of stacks) {
+        const outputs = SynthUtils.toCloudFormation(stack).Outputs;
+        for (const key of Object.keys(outputs)) {
+            exportNames.push(outputs[key].Export.Name);
+        }
+    }
+
+    //Testing the fact that the stacks of a wave don't clash on their outputs
+    expect(exportNames).toHaveLength(stacks.length);
+    expect(new Set(exportNames).size).toEqual(exportNames.length);
+});
@@ -94,10 +94,17 @@ test('vpcpeering creates dynamic routes', () => {
     });
 
     const sourceVpc = Vpc.fromLookup(stack, vpc1.id, { vpcId: vpc1.id });
-    const numSubnets = sourceVpc.publicSubnets.length + sourceVpc.privateSubnets.length;
+    const routeTableIds = new Set([...sourceVpc.publicSubnets, ...sourceVpc.privateSubnets]
+        .map(subnet => subnet.routeTable.routeTableId));
 
-    //Testing dynamic routes. Check that route has been created for every subnet
-    expect(stack).to(countResourcesLike('AWS::EC2::Route', numSubnets, {
+    //Testing dynamic routes. Check that a route has been created for every subnet route table
+    expect(stack).to(countResourcesLike('AWS::EC2::Route', routeTableIds.size, {
         DestinationCidrBlock: vpc2.cidr
     }));
-});
\ No newline at end of file
+    for (const routeTableId of routeTableIds) {
+        expect(stack).to(haveResource('AWS::EC2::Route', {
+            RouteTableId: routeTableId,
+            DestinationCidrBlock: vpc2.cidr
+        }));
+    }
+});
@@ -0,0 +1,65 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+import os
+
+from apply_script import APPLY_CONCURRENCY, PROPAGATION_TIMEOUT, apply_manifests
+from errors import ArgumentError
+from kube_api import KubeClient, load_context
+from tables import print_table
+
+
+def process(args):
+    if not os.path.exists(args.file):
+        raise ArgumentError(f"No such file or directory: {args.file}")
+
+    concurrency = APPLY_CONCURRENCY if args.concurrency is None else args.concurrency
+    wait = PROPAGATION_TIMEOUT if args.wait is None else args.wait
+    if concurrency < 1:
+        raise ArgumentError("Concurrency must be at least 1")
+
+    # The current context of the federation kubeconfig is the host cluster
+    client = KubeClient(load_context(args.context, args.kubeconfig), concurrency)
+    try:
+        results = apply_manifests(client, args.file, concurrency, wait)
+    finally:
+        client.close()
+
+    print_results(results, args.output)
+
+    failed = [result for result in results if result["error"]]
+    if failed:
+        raise Exception(f"{len(failed)} of {len(results)} objects failed")
+
+
+def print_results(results, output):
+    if output == "json":
+        print(json.dumps([{key: value for key, value in result.items()
+                           if key not in ["object", "applied"]}
+                          for result in results], indent=2))
+        return
+
+    rows = []
+    for result in results:
+        propagation = "-"
+        if result["propagation"] is not None:
+            propagation = f"{result['propagation']:.1f}s"
+        elif result["error"]:
+            propagation = "failed"
+
+        rows.append([result["group"], result["kind"], result["name"],
+                     f"{result['latency'] * 1000:.0f}ms", propagation,
+                     result["clusters"] or "-"])
+
+    print_table(["GROUP", "KIND", "NAME", "APPLY", "PROPAGATION", "CLUSTERS"], rows)
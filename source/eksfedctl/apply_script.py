@@ -0,0 +1,178 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+import logs
+import tracing
+from compiler import Loader
+from execution import set_label
+
+APPLY_CONCURRENCY = 16
+PROPAGATION_TIMEOUT = 60
+POLL_DELAY = 1
+
+MANIFEST_EXTENSIONS = [".yaml", ".yml", ".json"]
+FEDERATED_GROUP = "types.kubefed.io"
+KUBEFED_NAMESPACE = "kube-federation-system"
+KUBEFED_CLUSTERS = f"/apis/core.kubefed.io/v1beta1/namespaces/{KUBEFED_NAMESPACE}/kubefedclusters"
+
+# Objects are applied in groups, every group once the previous one is in
+# place: namespaces and CRDs, then the federated and plain resources, then
+# the scheduling preferences that target the federated resources
+GROUPS = ["namespaces and CRDs", "resources", "scheduling preferences"]
+
+
+def get_group(obj):
+    if obj["kind"] in ["Namespace", "CustomResourceDefinition"]:
+        return 0
+    if obj["apiVersion"].startswith("scheduling.kubefed.io/"):
+        return 2
+    return 1
+
+
+def is_federated(obj):
+    return obj["apiVersion"].startswith(f"{FEDERATED_GROUP}/")
+
+
+def get_manifest_filenames(path):
+    if not os.path.isdir(path):
+        return [path]
+
+    filenames = []
+    for folder, _, names in os.walk(path):
+        filenames.extend(os.path.join(folder, name) for name in names
+                         if os.path.splitext(name)[1] in MANIFEST_EXTENSIONS)
+    return sorted(filenames)
+
+
+def load_objects(path):
+    # Documents are parsed one at a time, List kinds are flattened
+    for filename in get_manifest_filenames(path):
+        with open(filename, "r") as manifest_file:
+            try:
+                for obj in yaml.load_all(manifest_file, Loader=Loader):
+                    if not obj:
+                        continue
+                    for item in obj["items"] if obj.get("kind", "").endswith("List") else [obj]:
+                        validate_object(filename, item)
+                        yield item
+            except yaml.YAMLError as exc:
+                raise Exception(f"Error in manifest {filename}: {exc}")
+
+
+def validate_object(filename, obj):
+    for key in ["apiVersion", "kind"]:
+        if not obj.get(key):
+            raise Exception(f"Property \"{key}\" not found in an object of {filename}")
+
+    if not (obj.get("metadata") or {}).get("name"):
+        raise Exception(f"Property \"metadata.name\" not found in {obj['kind']} of {filename}")
+
+
+@tracing.traced()
+def apply_manifests(client, path, concurrency=APPLY_CONCURRENCY, wait=PROPAGATION_TIMEOUT):
+    groups = [[] for _ in GROUPS]
+    for obj in load_objects(path):
+        groups[get_group(obj)].append(obj)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for group, objects in enumerate(groups):
+            if not objects:
+                continue
+
+            logs.log(f"Applying {len(objects)} {GROUPS[group]}")
+            with tracing.span(f"apply {GROUPS[group]}", objects=len(objects)):
+                group_results = list(executor.map(
+                    lambda obj, group=group: apply_object(client, obj, group), objects))
+            results.extend(group_results)
+
+            # The next groups depend on this one
+            if any(result["error"] for result in group_results):
+                break
+
+        federated = [result for result in results
+                     if is_federated(result["object"]) and not result["error"]]
+        if federated and wait > 0:
+            clusters = [cluster["metadata"]["name"] for cluster in client.list(KUBEFED_CLUSTERS)]
+            logs.log(f"Waiting for {len(federated)} federated objects to propagate "
+                     f"to {len(clusters)} clusters")
+            list(executor.map(
+                lambda result: wait_for_propagation(client, result, clusters, wait), federated))
+
+    return results
+
+
+def apply_object(client, obj, group):
+    metadata = obj["metadata"]
+    name = f"{metadata['namespace']}/{metadata['name']}" if metadata.get("namespace") \
+        else metadata["name"]
+    result = {"object": obj, "kind": obj["kind"], "name": name, "group": group + 1,
+              "latency": None, "applied": None, "generation": None, "error": None,
+              "propagation": None, "clusters": None}
+
+    set_label(f"{obj['kind']}/{name}")
+    start = time.monotonic()
+    try:
+        applied = client.apply(obj)
+        result["generation"] = applied["metadata"].get("generation")
+    except Exception as ex:
+        result["error"] = str(ex)
+        logs.error(f"Can't apply {obj['kind']} {name}: {ex}")
+    finally:
+        set_label(None)
+
+    result["applied"] = time.monotonic()
+    result["latency"] = result["applied"] - start
+    return result
+
+
+def wait_for_propagation(client, result, clusters, timeout):
+    # KubeFed sets the Propagation condition and lists the member clusters
+    # in the status once it has pushed the generation applied
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            status = client.get(result["object"]).get("status") or {}
+        except Exception as ex:
+            # Reported with the object, the other objects are still awaited
+            result["error"] = str(ex)
+            logs.error(f"Can't get {result['kind']} {result['name']}: {ex}")
+            return result
+
+        conditions = {condition["type"]: condition for condition in status.get("conditions", [])}
+        propagation = conditions.get("Propagation")
+        observed = status.get("observedGeneration")
+        current = observed is None or result["generation"] is None or \
+            observed >= result["generation"]
+
+        if propagation and current and propagation["status"] == "True":
+            propagated = [cluster["name"] for cluster in status.get("clusters", [])
+                          if not cluster.get("status")]
+            result["propagation"] = time.monotonic() - result["applied"]
+            result["clusters"] = f"{len(propagated)}/{len(clusters)}"
+            return result
+
+        if time.monotonic() > deadline:
+            result["clusters"] = f"0/{len(clusters)}"
+            result["error"] = propagation.get("reason", "not propagated") if propagation \
+                else "not propagated"
+            return result
+
+        time.sleep(POLL_DELAY)
@@ -0,0 +1,82 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DAY = 24 * 3600
+
+_enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def get_cache_folder():
+    home_folder = os.path.expanduser("~")
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(home_folder, ".cache"))
+    return os.path.join(cache_home, "eksfedctl")
+
+
+def get_filename(key):
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return os.path.join(get_cache_folder(), f"{digest}.json")
+
+
+def cached(key, ttl, func):
+    # Returns the cached value of the key while it's younger than ttl
+    # seconds, otherwise calls func and caches its JSON-serializable result
+    if _enabled:
+        entry = read(key)
+        if entry is not None and time.time() - entry["created"] < ttl:
+            return entry["value"]
+
+    value = func()
+
+    if _enabled:
+        write(key, value)
+
+    return value
+
+
+def read(key):
+    try:
+        with open(get_filename(key), "r") as cache_file:
+            entry = json.load(cache_file)
+    except (IOError, ValueError):
+        return None
+
+    # Guard against digest collisions
+    return entry if entry.get("key") == key else None
+
+
+def write(key, value):
+    folder = get_cache_folder()
+    os.makedirs(folder, exist_ok=True)
+
+    # Concurrent runs never see a partially written entry
+    fd, temp_filename = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump({"key": key, "created": time.time(), "value": value},
+                      temp_file)
+        os.replace(temp_filename, get_filename(key))
+    except Exception:
+        os.remove(temp_filename)
+        raise
@@ -0,0 +1,138 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+# Prewarmed copies of the CDK peering app. A copy holds the app sources, the
+# installed node_modules and the cdk.out folder of its deployments, and is
+# keyed by the hash of package.json and the construct sources: creates run
+# "npm install" only the first time the app changes. Every deployment runs
+# from its own folder of the copy, see get_deploy_path.
+
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+import cache
+import logs
+import tracing
+from execution import exec_command
+
+# Everything "npm install" and the synthesis depend on, relative to the app
+APP_SOURCES = ["package.json", "package-lock.json", "cdk.json", "tsconfig.json", "src"]
+READY_MARKER = ".prewarmed"
+DEPLOYMENTS_FOLDER = "deployments"
+
+
+def get_source_path():
+    root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+    return os.path.join(root_path, "cdk-vpc-peering")
+
+
+def get_apps_folder():
+    return os.path.join(cache.get_cache_folder(), "cdk-apps")
+
+
+def get_source_filenames(source_path):
+    filenames = []
+    for name in APP_SOURCES:
+        path = os.path.join(source_path, name)
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                filenames.extend(os.path.relpath(os.path.join(folder, file_name), source_path)
+                                 for file_name in names)
+        elif os.path.exists(path):
+            filenames.append(name)
+
+    return sorted(filenames)
+
+
+def get_app_hash(source_path):
+    digest = hashlib.sha256()
+    for filename in get_source_filenames(source_path):
+        digest.update(filename.encode() + b"\0")
+        with open(os.path.join(source_path, filename), "rb") as source_file:
+            digest.update(source_file.read())
+        digest.update(b"\0")
+
+    return digest.hexdigest()[:16]
+
+
+@tracing.traced()
+def prepare_app(source_path=None):
+    # Path of the prewarmed app for the current sources, built on a miss.
+    # Concurrent runs wait for the one that builds it
+    source_path = source_path or get_source_path()
+    app_hash = get_app_hash(source_path)
+    folder = get_apps_folder()
+    app_path = os.path.join(folder, app_hash)
+
+    if os.path.exists(os.path.join(app_path, READY_MARKER)):
+        logs.log(f"Using prewarmed CDK app {app_path}")
+        return app_path
+
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"{app_hash}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        if not os.path.exists(os.path.join(app_path, READY_MARKER)):
+            build_app(source_path, app_path)
+
+    return app_path
+
+
+def build_app(source_path, app_path):
+    logs.log(f"Prewarming CDK app {app_path}")
+
+    # Built next to the final folder and renamed, an interrupted install
+    # never leaves a partial app behind
+    build_path = tempfile.mkdtemp(dir=os.path.dirname(app_path), prefix=".build-")
+    try:
+        for filename in get_source_filenames(source_path):
+            os.makedirs(os.path.dirname(os.path.join(build_path, filename)), exist_ok=True)
+            shutil.copy2(os.path.join(source_path, filename), os.path.join(build_path, filename))
+        os.makedirs(os.path.join(build_path, "cdk.out"))
+
+        # Modules installed with the sources, e.g. on the bastion host, only
+        # need to be completed
+        if os.path.isdir(os.path.join(source_path, "node_modules")):
+            shutil.copytree(os.path.join(source_path, "node_modules"),
+                            os.path.join(build_path, "node_modules"), symlinks=True)
+
+        exec_command(["npm", "install", "--quiet", "--no-progress", "--no-fund"],
+                     cwd=build_path)
+
+        with open(os.path.join(build_path, READY_MARKER), "w"):
+            pass
+
+        shutil.rmtree(app_path, ignore_errors=True)
+        os.replace(build_path, app_path)
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+
+
+def get_deploy_path(app_path, name):
+    # Working folder of a single deployment: the app linked into it and its
+    # own cdk.context.json. The CDK CLI rewrites the context file of its
+    # working folder after the VPC lookups, concurrent deployments from the
+    # same folder lose or corrupt each other's entries
+    deploy_path = os.path.join(app_path, DEPLOYMENTS_FOLDER, name)
+    os.makedirs(deploy_path, exist_ok=True)
+
+    for entry in APP_SOURCES + ["node_modules"]:
+        target = os.path.join(app_path, entry)
+        link = os.path.join(deploy_path, entry)
+        if os.path.exists(target) and not os.path.lexists(link):
+            os.symlink(target, link)
+
+    return deploy_path
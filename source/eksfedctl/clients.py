@@ -0,0 +1,91 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import boto3
+import os
+import threading
+from botocore.config import Config
+
+import logs
+import retries
+from execution import get_label
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("EKSFEDCTL_MAX_POOL_CONNECTIONS", "20"))
+MAX_ATTEMPTS = int(os.environ.get("EKSFEDCTL_MAX_ATTEMPTS", "10"))
+
+_clients = dict()
+_clients_lock = threading.Lock()
+_session = None
+
+
+def get_client(service, region, timeout=None):
+    # Clients are thread-safe once created, one client per service and
+    # region is shared by the whole process. Creation goes through a single
+    # session so that botocore parses every service model only once.
+    # Probes pass a timeout and get a separate client that fails fast
+    key = (service, region, timeout)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if key not in _clients:
+            client = get_session().client(
+                service, region_name=region, config=get_config(timeout))
+            register_handlers(client, service, region)
+            _clients[key] = client
+
+        return _clients[key]
+
+
+def register_handlers(client, service, region):
+    # botocore retries throttled and transient errors by itself with
+    # exponential backoff and jitter. Every attempt takes a token from the
+    # bucket shared by all the clients of the service in the region, and
+    # the retries made are logged and counted
+    bucket = retries.get_bucket(service, region)
+
+    def acquire_token(**kwargs):
+        bucket.acquire()
+
+    def report_retries(parsed, model, **kwargs):
+        attempts = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        if attempts:
+            retries.record_retries(get_label(), attempts)
+            logs.log(f"AWS call {service} {model.name} in {region} "
+                     f"retried {attempts} {'time' if attempts == 1 else 'times'}")
+
+    client.meta.events.register("before-send", acquire_token)
+    client.meta.events.register("after-call", report_retries)
+
+
+def get_session():
+    global _session
+
+    if _session is None:
+        _session = boto3.session.Session()
+
+    return _session
+
+
+def get_config(timeout=None):
+    if timeout:
+        return Config(
+            max_pool_connections=MAX_POOL_CONNECTIONS,
+            connect_timeout=timeout, read_timeout=timeout,
+            retries={"mode": "standard", "max_attempts": 2})
+
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS})
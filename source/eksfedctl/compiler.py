@@ -0,0 +1,266 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import hashlib
+import json
+import os
+import sys
+
+import yaml
+
+import cache
+
+# libyaml bindings are several times faster, PyYAML falls back to the pure
+# Python implementation when they are not compiled in
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Bumped whenever the compiled output changes for the same inputs, so stale
+# cache entries are never reused
+COMPILER_VERSION = 1
+
+# Compiled outputs are addressed by the hash of their inputs and never go
+# stale, the TTL only bounds the size of the cache folder
+COMPILE_TTL = 30 * cache.DAY
+
+# Subtrees of the default template that a user template replaces as a whole
+# instead of being merged into: the identity of the federation and the
+# node groups
+REPLACED_PATHS = [("metadata",), ("spec", "managedNodeGroups"), ("spec", "nodeGroups")]
+
+NODE_GROUP_SCHEMA = {
+    "type": dict,
+    "required": ["name"],
+    "properties": {"name": {"type": str}},
+    "additionalProperties": True,
+}
+
+# User template: the federation properties and the supported subset of
+# eksctl.io/v1alpha5 in spec
+USER_SCHEMA = {
+    "type": dict,
+    "required": ["apiVersion", "kind", "metadata"],
+    "properties": {
+        "apiVersion": {"enum": ["fedk8s/v1"]},
+        "kind": {"enum": ["FederatedEKSConfig"]},
+        "metadata": {
+            "type": dict,
+            "properties": {
+                "name": {"type": str},
+                "regions": {"type": list, "items": {"type": str}},
+            },
+            "additionalProperties": True,
+        },
+        "iamidentitymapping": {
+            "type": list,
+            "items": {
+                "type": dict,
+                "required": ["arn", "group", "username"],
+                "properties": {
+                    "arn": {"type": str},
+                    "group": {"type": str},
+                    "username": {"type": str},
+                },
+            },
+        },
+        "spec": {
+            "type": dict,
+            "properties": {
+                "iam": {"type": dict, "additionalProperties": True},
+                "nodeGroups": {"type": list, "items": NODE_GROUP_SCHEMA},
+                "managedNodeGroups": {"type": list, "items": NODE_GROUP_SCHEMA},
+                "fargateProfiles": {"type": list, "items": NODE_GROUP_SCHEMA},
+                "git": {"type": dict, "additionalProperties": True},
+                "cloudWatch": {"type": dict, "additionalProperties": True},
+            },
+        },
+    },
+}
+
+# Merged template: what the cluster rendering relies on
+CONFIG_SCHEMA = {
+    "type": dict,
+    "required": ["metadata", "spec"],
+    "properties": {
+        "metadata": {"type": dict, "additionalProperties": True},
+        "spec": {
+            "type": dict,
+            "required": ["metadata", "vpc"],
+            "properties": {
+                "metadata": {"type": dict, "additionalProperties": True},
+                "vpc": {"type": dict, "additionalProperties": True},
+            },
+            "additionalProperties": True,
+        },
+    },
+    "additionalProperties": True,
+}
+
+TYPE_NAMES = {dict: "a mapping", list: "a list", str: "a string"}
+
+
+def get_default_template_filename():
+    root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+    return os.path.join(root_path, "default.yaml")
+
+
+def read_template(file_name):
+    if file_name == "-":
+        return sys.stdin.read()
+
+    with open(os.path.expanduser(file_name), "r") as file:
+        return file.read()
+
+
+def load_yaml(file_name):
+    return parse_yaml(read_template(file_name))
+
+
+def parse_yaml(text):
+    try:
+        return yaml.load(text, Loader=Loader)
+    except yaml.YAMLError as exc:
+        raise Exception(f"Error in configuration file: {exc}")
+
+
+def dump_yaml(data):
+    return yaml.dump(data, Dumper=Dumper, default_flow_style=False)
+
+
+def get_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def compile_config(default_file, user_file=None):
+    # Returns the merged federation template ({"yaml": ..., "spec": ...}).
+    # Reading the files is cheap, parsing, validating and merging them is
+    # skipped when the same contents were compiled before
+    default_text = read_template(default_file)
+    user_text = read_template(user_file) if user_file else None
+
+    key = get_hash(f"config:{COMPILER_VERSION}", default_text, user_text or "")
+    return cache.cached(f"compiled-config:{key}", COMPILE_TTL,
+                        lambda: merge_templates(default_text, user_text))
+
+
+def merge_templates(default_text, user_text=None):
+    config = parse_yaml(default_text)
+
+    if user_text is not None:
+        user_yaml = parse_yaml(user_text)
+        validate(user_yaml, USER_SCHEMA)
+
+        for path in REPLACED_PATHS:
+            remove_path(config, path)
+        config = deep_merge(config, user_yaml)
+
+    validate(config, CONFIG_SCHEMA)
+
+    spec = config.pop("spec")
+    config.setdefault("metadata", {})
+    return {"yaml": config, "spec": spec}
+
+
+def deep_merge(base, override):
+    # Mappings are merged key by key, any other value (lists included)
+    # replaces the base one
+    if not isinstance(base, dict) or not isinstance(override, dict):
+        return override
+
+    merged = dict(base)
+    for key, value in override.items():
+        merged[key] = deep_merge(base[key], value) if key in base else value
+    return merged
+
+
+def remove_path(data, path):
+    *parents, key = path
+    for parent in parents:
+        data = data.get(parent)
+        if not isinstance(data, dict):
+            return
+    data.pop(key, None)
+
+
+def validate(data, schema, path=""):
+    name = path or "document"
+
+    if "enum" in schema:
+        if data not in schema["enum"]:
+            raise Exception(f"Unknown \"{path}\": {data}")
+        return
+
+    expected = schema.get("type")
+    if expected and not isinstance(data, expected):
+        raise Exception(f"Property \"{name}\" must be {TYPE_NAMES[expected]}")
+
+    if expected is list:
+        for idx, item in enumerate(data):
+            validate(item, schema.get("items", {}), f"{path}[{idx}]")
+
+    if expected is not dict:
+        return
+
+    properties = schema.get("properties", {})
+    prefix = f"{path}." if path else ""
+
+    if not schema.get("additionalProperties", False):
+        for key in data:
+            if key not in properties:
+                supported = f" Supported keys are: {', '.join(properties)}" if path else ""
+                raise Exception(f"Unknown key \"{prefix}{key}\"{supported}")
+
+    for key in schema.get("required", []):
+        if key not in data:
+            raise Exception(f"Property \"{prefix}{key}\" not found in yaml")
+
+    for key, value in data.items():
+        if key in properties:
+            validate(value, properties[key], f"{prefix}{key}")
+
+
+def render_cluster_configs(config, zones):
+    # Renders the eksctl ClusterConfig of every member in zones, a region to
+    # zones mapping, in one pass. Only the per-cluster properties are
+    # copied, the rest of the spec is shared. Returns {region: {"name",
+    # "hash", "document"}}, the hash identifies the exact document eksctl
+    # receives
+    metadata = config.yaml["metadata"]
+    inputs = json.dumps([COMPILER_VERSION, metadata["name"], metadata["regions"],
+                         config.cidrs, zones, config.spec], sort_keys=True)
+
+    def render():
+        documents = {}
+        for idx, region in enumerate(metadata["regions"]):
+            if region not in zones:
+                continue
+
+            cluster_name = f"{metadata['name']}-{idx+1}"
+            cluster_template = {
+                **config.spec,
+                "metadata": {**config.spec["metadata"],
+                             "name": cluster_name, "region": region},
+                "vpc": {**config.spec["vpc"], "cidr": config.cidrs[idx]},
+                "availabilityZones": zones[region],
+            }
+            document = dump_yaml(cluster_template)
+            documents[region] = {"name": cluster_name,
+                                 "hash": get_hash(document),
+                                 "document": document}
+        return documents
+
+    return cache.cached(f"cluster-configs:{get_hash(inputs)}", COMPILE_TTL, render)
@@ -11,32 +11,64 @@
 #  and limitations under the License.                                                                                #
 #####################################################################################################################
 
-import boto3
-import yaml
+import copy
 import json
 import types
-import requests
 import uuid
 import re
-import sys
 import os
+import socket
 
-from create_script import create_federated_clusters
+import cache
+import logs
+import tracing
+from compiler import compile_config, dump_yaml, get_default_template_filename, render_cluster_configs
+from create_script import create_federated_clusters, get_availability_zones
 from errors import ArgumentError
+from metadata import InstanceMetadataClient, BASTION_ENV, get_bastion_overrides
+from planner import get_vpc_cidrs
+from preflight import run_preflight
+from state import FederationState
+
+DEFAULT_PEERING_ENGINE = "cdk"
 
 
 def process(args):
-    check_tmux_session()
+    if not args.dry_run:
+        check_tmux_session()
+
+    if args.no_cache:
+        cache.disable()
 
     config = get_config(args)
+    args.config = config
     validate_config(config)
 
     if not args.dry_run:
-        create_federated_clusters(config)
+        create_federated_clusters(config, args.resume)
     else:
         dump_config(config)
 
 
+def process_traced(args):
+    # Every phase is recorded and the JSON run report is written even when
+    # the run fails
+    status = "error"
+    try:
+        with tracing.span("create", dry_run=args.dry_run):
+            process(args)
+        status = "ok"
+    finally:
+        config = getattr(args, "config", None)
+        metadata = config.yaml["metadata"] if config else {
+            "name": args.name or "eksfedctl", "regions": args.regions}
+
+        filename = args.report or tracing.get_report_filename(metadata["name"])
+        tracing.write_report(filename, "create", status, metadata=metadata,
+                             dry_run=args.dry_run)
+        logs.log(f"Run report written to {filename}")
+
+
 def check_tmux_session():
     msg_head = "Federation creation should be launched inside tmux session"
     msg_command = "run \"tmux\" or \"tmux attach\" to start new session or attach to existing one"
@@ -46,64 +78,103 @@ def check_tmux_session():
 
 
 def dump_config(config):
-    print(yaml.dump(vars(config.bastion)))
+    print(dump_yaml(vars(config.bastion)))
     print("---\n")
-    print(yaml.dump(config.yaml))
-    print("---\n")
-    print(yaml.dump(config.spec))
+    print(dump_yaml(config.yaml))
+
+    # The same documents create passes to eksctl
+    regions = config.yaml["metadata"]["regions"]
+    zones = {region: get_availability_zones(region) for region in regions}
+    for cluster_config in render_cluster_configs(config, zones).values():
+        print(f"---\n# {cluster_config['name']} ({cluster_config['hash'][:12]})\n")
+        print(cluster_config["document"])
 
 
 def get_config(args):
     config = types.SimpleNamespace()
-    config.bastion = get_instance_metadata()
-    config_yaml = {"metadata": {}}
-    config_spec = {"metadata": {}}
-
-    # 1. Default template
-    root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
-    default_yaml_path = os.path.join(root_path, "default.yaml")
-    default_yaml = load_yaml(default_yaml_path)
-    default_spec = default_yaml["spec"]
-    del default_yaml["spec"]
-    config_yaml = {**config_yaml, **default_yaml}
-    config_spec = {**config_spec, **default_spec}
-
-    # 2. User-provided template
-    if args.file:
-        # Remove default nodeGroups and managedNodeGroups form the config
-        if "managedNodeGroups" in config_spec:
-            del config_spec["managedNodeGroups"]
-        if "nodeGroups" in config_spec:
-            del config_spec["nodeGroups"]
-
-        user_yaml = load_yaml(args.file)
-        validate_user_yaml(user_yaml)
-
-        if "spec" in user_yaml:
-            user_spec = user_yaml["spec"]
-            del user_yaml["spec"]
-            config_spec = {**config_spec, **user_spec}
-
-        config_yaml = {**config_yaml, **user_yaml}
-
-    # 3. Command-line arguments
+    config.bastion = get_instance_metadata(args)
+
+    # 1. Default template, deep-merged with the user-provided template
+    with tracing.span("compile-config"):
+        compiled = compile_config(get_default_template_filename(), args.file)
+
+    config_yaml = compiled["yaml"]
+    config_spec = compiled["spec"]
+
+    # 2. Command-line arguments
     if args.name:
         config_yaml["metadata"]["name"] = args.name
     if args.regions:
         config_yaml["metadata"]["regions"] = args.regions
 
     if "name" not in config_yaml["metadata"] or not config_yaml["metadata"]["name"]:
+        if args.resume:
+            raise ArgumentError("Please specify the name of the federation to resume")
         config_yaml["metadata"]["name"] = f"eksfed-{uuid.uuid4().hex[0:6]}"
 
+    peering_engine = args.peering_engine
+    if args.resume:
+        # 3. The run to resume
+        config_yaml, config_spec, peering_engine = get_resumed_config(
+            args, config_yaml, config_spec)
+
     if "regions" not in config_yaml["metadata"]:
         config_yaml["metadata"]["regions"] = []
 
     config.yaml = config_yaml
     config.spec = config_spec
+    config.peering_engine = peering_engine or DEFAULT_PEERING_ENGINE
+    config.cidrs = get_vpc_cidrs(
+        len(config_yaml["metadata"]["regions"]), [config.bastion.vpccidr])
 
     return config
 
 
+def get_resumed_config(args, config_yaml, config_spec):
+    # The regions, template and peering engine recorded by the run are the
+    # defaults, the values given explicitly must be the same
+    name = config_yaml["metadata"]["name"]
+    state = FederationState(name)
+    if not state.exists():
+        raise ArgumentError(f"State file {state.filename} not found, nothing to resume")
+    recorded = state.load().data["metadata"]
+
+    regions = args.regions or (config_yaml["metadata"].get("regions") if args.file else None)
+    recorded_regions = recorded.get("regions")
+    if regions and recorded_regions and regions != recorded_regions:
+        raise ArgumentError(
+            f"Regions {', '.join(regions)} don't match the regions "
+            f"{', '.join(recorded_regions)} of the run to resume")
+
+    peering_engine = args.peering_engine
+    recorded_engine = recorded.get("peering_engine")
+    if peering_engine and recorded_engine and peering_engine != recorded_engine:
+        raise ArgumentError(
+            f"Peering engine {peering_engine} doesn't match the peering engine "
+            f"{recorded_engine} of the run to resume")
+
+    template = recorded.get("template")
+    if template:
+        if args.file and get_template_body(config_yaml, config_spec) != \
+                get_template_body(template["yaml"], template["spec"]):
+            raise ArgumentError(
+                f"Template {args.file} doesn't match the template of the run to resume")
+        config_yaml = copy.deepcopy(template["yaml"])
+        config_spec = copy.deepcopy(template["spec"])
+        config_yaml["metadata"]["name"] = name
+
+    config_yaml["metadata"]["regions"] = list(regions or recorded_regions or [])
+    return config_yaml, config_spec, peering_engine or recorded_engine
+
+
+def get_template_body(config_yaml, config_spec):
+    # Everything but the name and regions, as recorded in the state file
+    body = {**config_yaml, "spec": config_spec}
+    body.pop("metadata", None)
+    return json.loads(json.dumps(body, sort_keys=True, default=str))
+
+
+@tracing.traced()
 def validate_config(config):
     metadata = config.yaml["metadata"]
 
@@ -112,102 +183,24 @@ def validate_config(config):
             "Name must be at least 1 character in length letters and numbers"
         )
 
-    if len(metadata["regions"]) != 2:
-        raise ArgumentError("Please specify exactly 2 regions")
-
-    ec2 = boto3.client("ec2", region_name=config.bastion.region)
-    ec2_regions = ec2.describe_regions()["Regions"]
-    region_names = [val["RegionName"] for val in ec2_regions]
-
-    for region in metadata["regions"]:
-        # Checking region validity first for faster response
-        if not region in region_names:
-            raise Exception(f"Region \"{region}\" is not valid")
-
-        try:
-            eks = boto3.client("eks", region_name=region)
-            eks.list_clusters()
-        except Exception as ex:
-            raise Exception(f"Can't access EKS service in \"{region}\"")
-
-
-def validate_user_yaml(input_yaml):
-    keys = ["apiVersion", "kind", "metadata", "iamidentitymapping", "spec"]
-    for key in input_yaml:
-        if key not in keys:
-            raise Exception(f"Unknown key \"{key}\"")
-
-    if "apiVersion" not in input_yaml:
-        raise Exception("Property \"apiVersion\" not found in yaml")
-    elif input_yaml["apiVersion"] != "fedk8s/v1":
-        raise Exception(f"Unknown \"apiVersion\": {input_yaml['apiVersion']}")
-
-    if "kind" not in input_yaml:
-        raise Exception("Property \"kind\" not found in yaml")
-    elif input_yaml["kind"] != "FederatedEKSConfig":
-        raise Exception(f"Unknown \"kind\": {input_yaml['kind']}")
-
-    if "metadata" not in input_yaml:
-        raise Exception("Property \"metadata\" not found in yaml")
-
-    if "spec" in input_yaml:
-        # Supported subset of eksctl.io/v1alpha5
-        spec_keys = ["iam", "nodeGroups", "managedNodeGroups",
-                     "fargateProfiles", "git", "cloudWatch"]
-
-        supported_keys_str = f"Supported keys are: {', '.join(spec_keys)}"
-        for spec_key in input_yaml["spec"]:
-            if spec_key not in spec_keys:
-
-                raise Exception(
-                    f"Unknown key \"spec.{spec_key}\" {supported_keys_str}"
-                )
-
-
-def load_yaml(file_name):
-    if file_name == "-":
-        try:
-            #config = yaml.load(sys.stdin, Loader=yaml.FullLoader)
-            config = yaml.safe_load(sys.stdin)
-            return config
-        except yaml.YAMLError as exc:
-            raise Exception(f"Error in configuration file: {exc}")
-    else:
-        home_folder = os.path.expanduser("~")
-        file_name = file_name.replace("~", home_folder)
-
-        try:
-            with open(file_name, "r") as file:
-                try:
-                    #config = yaml.load(file, Loader=yaml.FullLoader)
-                    config = yaml.safe_load(sys.stdin)
-                    return config
-                except yaml.YAMLError as exc:
-                    raise Exception(f"Error in configuration file: {exc}")
-        except IOError as e:
-            raise Exception(e)
-
-
-def get_instance_metadata():
-    metadata = types.SimpleNamespace()
-    base_url = "http://169.254.169.254/latest"
+    if len(metadata["regions"]) < 2:
+        raise ArgumentError("Please specify at least 2 regions")
 
-    identity = json.loads(requests.get(
-        f"{base_url}/dynamic/instance-identity/document"
-    ).text)
+    if len(set(metadata["regions"])) != len(metadata["regions"]):
+        raise ArgumentError("Please specify every region only once")
 
-    metadata.region = identity["region"]
+    run_preflight(config)
 
-    metadata.network_interface = requests.get(
-        f"{base_url}/meta-data/network/interfaces/macs/"
-    ).text
 
-    metadata.vpcid = requests.get(
-        f"{base_url}/meta-data/network/interfaces/macs/{metadata.network_interface}/vpc-id/"
-    ).text
+@tracing.traced()
+def get_instance_metadata(args):
+    overrides = get_bastion_overrides(args)
+    if len(overrides) == len(BASTION_ENV):
+        return types.SimpleNamespace(network_interface="", **overrides)
 
-    metadata.vpccidr = requests.get(
-        f"{base_url}/meta-data/network/interfaces/macs/{metadata.network_interface}/vpc-ipv4-cidr-block/"
-    ).text
+    # Keyed by host name, the cache doesn't survive a bastion replacement
+    metadata = cache.cached(
+        f"instance-metadata-{socket.gethostname()}", cache.DAY,
+        lambda: vars(InstanceMetadataClient().get_bastion_metadata()))
 
-    return metadata
+    return types.SimpleNamespace(**{**metadata, **overrides})
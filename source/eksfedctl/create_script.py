@@ -11,82 +11,282 @@
 #  and limitations under the License.                                                                                #
 #####################################################################################################################
 
-import boto3
-import copy
-import yaml
+import json
 import os
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+import cache
 import logs
+import tracing
+from cdk_app import get_deploy_path, prepare_app
+from clients import get_client
+from compiler import render_cluster_configs
 from execution import exec_command
+from fleet import FederationIndex
+from kubeconfig import build_kubeconfig, get_context_name, get_kubeconfig_filename, \
+    join_clusters, write_kubeconfig
+from kubefed import fetch_chart, install_kubefed
+from peering_native import create_native_peering
+from planner import BASTION, get_members, plan_peerings, get_peering_stack_name
+from scheduler import TaskGraph
+from state import FederationState
 
+PEERING_CONCURRENCY = 4
 
-def create_federated_clusters(config):
+# A control plane endpoint update takes several minutes
+ENDPOINT_WAITER_CONFIG = {"Delay": 15, "MaxAttempts": 80}
+
+
+def create_federated_clusters(config, resume=False):
     metadata = config.yaml["metadata"]
-    [region1, region2] = metadata["regions"]
-    zones = [get_availability_zones(region1), get_availability_zones(region2)]
+    regions = metadata["regions"]
+    bastion = config.bastion
+    state = load_state(config, resume)
 
     logs.log(
-        f"Deploying federated Amazon EKS clusters in {region1} and {region2}..."
+        f"Deploying federated Amazon EKS clusters in {', '.join(regions)}..."
     )
 
-    root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
-    os.chdir(f"{root_path}/cdk-vpc-peering/")
-    exec_command(["npm", "install", "--quiet", "--no-progress", "--no-fund"])
+    index = FederationIndex()
+    index.upsert(metadata["name"], "creating", regions, bastion.region,
+                 config.peering_engine)
 
-    clusters = []
     output_config = dict()
-    for idx, region in enumerate(metadata["regions"]):
+    graph = TaskGraph(max_workers=len(regions) + PEERING_CONCURRENCY + 2,
+                      state=state)
+
+    if config.peering_engine != "native":
+        graph.add("cdk-app", lambda results: prepare_app(), checkpoint=False)
+    graph.add("reconcile-clusters",
+              lambda results: start_clusters(config, state, resume),
+              checkpoint=False)
+
+    for idx, region in enumerate(regions):
         cluster_name = f"{metadata['name']}-{idx+1}"
         output_config[f"CLUSTER{idx+1}_NAME"] = cluster_name
         output_config[f"CLUSTER{idx+1}_REGION"] = region
-        logs.log(f"Deploying cluster {cluster_name} to {region}")
 
-        eks = boto3.client("eks", region_name=region)
-        if cluster_name in eks.list_clusters()["clusters"]:
-            raise Exception(f"Cluster \"{cluster_name}\" already exists")
+        graph.add(f"zones-{region}",
+                  lambda results, region=region: get_availability_zones(region),
+                  checkpoint=False)
 
-        cluster_template = copy.deepcopy(config.spec)
-        cluster_template["metadata"]["name"] = cluster_name
-        cluster_template["metadata"]["region"] = region
-        cluster_template["vpc"]["cidr"] = get_cidr_for_vpc(idx+1)
-        cluster_template["availabilityZones"] = zones[idx]
+    # Every ClusterConfig document is rendered at once, and reused from the
+    # cache when the same federation is created again
+    graph.add("render-configs",
+              lambda results: render_cluster_configs(config, {
+                  region: results[f"zones-{region}"] for region in regions}),
+              requires=[f"zones-{region}" for region in regions],
+              checkpoint=False)
 
-        cluster_yaml = yaml.dump(cluster_template)
+    for idx, region in enumerate(regions):
+        cluster_name = f"{metadata['name']}-{idx+1}"
+        graph.add(f"cluster-{idx+1}",
+                  lambda results, idx=idx, region=region: create_cluster(
+                      config, region, results["render-configs"][region],
+                      results["reconcile-clusters"][f"cluster-{idx+1}"] == "adopt"),
+                  requires=["reconcile-clusters", "render-configs"],
+                  rollback=lambda results, cluster_name=cluster_name, region=region:
+                      delete_cluster(cluster_name, region))
+
+    # Peerings run two cdk deploys each, they are deployed in batches
+    # as soon as the VPCs of both ends exist
+    graph.limit("peering", PEERING_CONCURRENCY)
+    peerings = plan_peerings(len(regions))
+
+    cluster_tasks = [f"cluster-{idx+1}" for idx in range(len(regions))]
+
+    if config.peering_engine == "cdk-batch":
+        # One CDK app run per deployment wave for all the peerings
+        graph.add("peerings",
+                  lambda results: create_batched_peerings(
+                      config, results, peerings, results["cdk-app"]),
+                  requires=["cdk-app"] + cluster_tasks)
+        peering_tasks = ["peerings"]
+    else:
+        # The native engine talks to EC2 directly and doesn't need the CDK app
+        cdk_tasks = [] if config.peering_engine == "native" else ["cdk-app"]
+
+        for peering in peerings:
+            graph.add(peering.name,
+                      lambda results, peering=peering: create_planned_peering(
+                          config, results, peering, results.get("cdk-app")),
+                      requires=cdk_tasks + [
+                          f"cluster-{endpoint}" for endpoint in
+                          [peering.requester, peering.accepter] if endpoint != BASTION],
+                      group="peering")
+        peering_tasks = [peering.name for peering in peerings]
+
+    # The KubeFed control plane is installed into the first cluster while
+    # the peerings are deployed, the chart is fetched right away
+    graph.add("fetch-kubefed", lambda results: fetch_chart(), checkpoint=False)
+    graph.add("kubeconfig",
+              lambda results: write_federation_kubeconfig(
+                  config, cluster_results(results, regions)),
+              requires=cluster_tasks,
+              checkpoint=False)
+    graph.add("install-kubefed",
+              lambda results: install_kubefed(get_context_name(results["cluster-1"])),
+              requires=["fetch-kubefed", "kubeconfig"])
+
+    graph.add("disable-public-access",
+              lambda results: clusters_disable_public_access(
+                  config, cluster_results(results, regions)),
+              requires=cluster_tasks + peering_tasks + ["install-kubefed"])
+
+    graph.add("join-federation",
+              lambda results: clusters_join_federation(
+                  config, cluster_results(results, regions), results["kubeconfig"]),
+              requires=["disable-public-access"])
+
+    try:
+        graph.run()
+    except Exception:
+        record_federation(index, config, state, "failed")
+        raise
 
-        exec_command(["eksctl", "create", "cluster", "-f", "-"], cluster_yaml)
-        cluster_details = eks.describe_cluster(name=cluster_name)["cluster"]
-        clusters.append(cluster_details)
-        create_identity_mapping(config, region, cluster_details)
+    output_config["BASE_NAME"] = metadata["name"]
+    output_config["BASTION_REGION"] = bastion.region
+    output_filename = write_output_config(config, output_config)
+    record_federation(index, config, state, "active", output_filename)
 
-    vpc1id = clusters[0]["resourcesVpcConfig"]["vpcId"]
-    vpc2id = clusters[1]["resourcesVpcConfig"]["vpcId"]
+    logs.log("Done. Federated EKS clusters has been created")
 
-    logs.log(f"Creating VPC peering")
-    bastion = config.bastion
-    create_vpc_peering(config, f"{metadata['name']}-peering-clusters",
-                               region1, vpc1id, get_cidr_for_vpc(1),
-                               region2, vpc2id, get_cidr_for_vpc(2))
 
-    create_vpc_peering(config, f"{metadata['name']}-peering-bastion-{vpc1id}",
-                               bastion.region, bastion.vpcid, bastion.vpccidr,
-                               region1, vpc1id, get_cidr_for_vpc(1))
+def cluster_results(results, regions):
+    return [results[f"cluster-{idx+1}"] for idx in range(len(regions))]
 
-    create_vpc_peering(config, f"{metadata['name']}-peering-bastion-{vpc2id}",
-                               bastion.region, bastion.vpcid, bastion.vpccidr,
-                               region2, vpc2id, get_cidr_for_vpc(2))
 
-    os.chdir("..")
-    clusters_disable_public_access(config, clusters)
+def cluster_vpc_id(results, idx):
+    return results[f"cluster-{idx+1}"]["resourcesVpcConfig"]["vpcId"]
 
-    logs.log(f"Joining clusters into federation")
-    clusters_join_federation(config, clusters)
 
-    output_config["BASE_NAME"] = metadata["name"]
-    output_config["BASTION_REGION"] = bastion.region
-    write_output_config(config, output_config)
+def get_peering_endpoint(config, results, endpoint):
+    if endpoint == BASTION:
+        bastion = config.bastion
+        return bastion.region, bastion.vpcid, bastion.vpccidr
 
-    logs.log("Done. Federated EKS clusters has been created")
+    region = config.yaml["metadata"]["regions"][endpoint-1]
+    return region, cluster_vpc_id(results, endpoint-1), config.cidrs[endpoint-1]
+
+
+def create_planned_peering(config, results, peering, cdk_path):
+    metadata = config.yaml["metadata"]
+    requester = get_peering_endpoint(config, results, peering.requester)
+    accepter = get_peering_endpoint(config, results, peering.accepter)
+    stack_name = get_peering_stack_name(
+        metadata["name"], peering.requester, peering.accepter, accepter[1])
+
+    if config.peering_engine == "native":
+        return create_native_peering(metadata["name"], stack_name, *requester, *accepter)
+
+    return create_vpc_peering(config, stack_name, *requester, *accepter, cdk_path)
+
+
+def load_state(config, resume):
+    metadata = config.yaml["metadata"]
+    state = FederationState(metadata["name"])
+
+    if resume:
+        if not state.exists():
+            raise Exception(
+                f"State file {state.filename} not found, nothing to resume")
+
+        state.load()
+        recorded_regions = state.data["metadata"].get("regions")
+        if recorded_regions and recorded_regions != metadata["regions"]:
+            raise Exception(
+                f"Regions {', '.join(metadata['regions'])} don't match "
+                f"the recorded regions {', '.join(recorded_regions)}")
+    elif state.exists():
+        raise Exception(
+            f"State file {state.filename} already exists, use \"--resume\" "
+            "to continue the previous run or destroy the federation first")
+
+    return state
+
+
+def start_clusters(config, state, resume):
+    actions = reconcile_clusters(config, state, resume)
+
+    # The state file of a new run is only written once no cluster of the
+    # federation exists yet, a later --resume never adopts a cluster it
+    # didn't create. The template and the peering engine are kept for
+    # add-region and resume
+    if not resume:
+        metadata = config.yaml["metadata"]
+        state.set_metadata(name=metadata["name"], regions=metadata["regions"],
+                           bastion=vars(config.bastion),
+                           peering_engine=config.peering_engine,
+                           template={"yaml": config.yaml, "spec": config.spec})
+
+    return actions
+
+
+def reconcile_clusters(config, state, resume):
+    metadata = config.yaml["metadata"]
+    actions = dict()
+
+    # Compare the clusters that exist with the recorded ones before
+    # launching anything
+    for number, region in get_members(metadata["regions"]):
+        cluster_name = f"{metadata['name']}-{number}"
+        task_name = f"cluster-{number}"
+
+        eks = get_client("eks", region)
+        exists = cluster_name in eks.list_clusters()["clusters"]
+
+        if state.is_done(task_name):
+            if not exists:
+                raise Exception(
+                    f"Cluster \"{cluster_name}\" is recorded in "
+                    f"{state.filename} but doesn't exist in {region}")
+            actions[task_name] = "resume"
+        elif not exists:
+            actions[task_name] = "create"
+        elif resume:
+            # The previous run died before eksctl finished, nodegroups
+            # and identity mappings are completed on top of the cluster
+            status = eks.describe_cluster(name=cluster_name)["cluster"]["status"]
+            if status != "ACTIVE":
+                raise Exception(
+                    f"Cluster \"{cluster_name}\" is in {status} state, "
+                    "wait until it's active or destroy the federation")
+            actions[task_name] = "adopt"
+        else:
+            raise Exception(f"Cluster \"{cluster_name}\" already exists")
+
+    return actions
+
+
+def create_cluster(config, region, cluster_config, adopt=False):
+    cluster_name = cluster_config["name"]
+    cluster_yaml = cluster_config["document"]
+
+    if adopt:
+        # eksctl skips the nodegroups that already exist
+        logs.log(f"Completing existing cluster {cluster_name} in {region}")
+        exec_command(["eksctl", "create", "nodegroup", "-f", "-"], cluster_yaml)
+    else:
+        logs.log(f"Deploying cluster {cluster_name} to {region} "
+                 f"(config {cluster_config['hash'][:12]})")
+        exec_command(["eksctl", "create", "cluster", "-f", "-"], cluster_yaml)
+
+    eks = get_client("eks", region)
+    cluster_details = eks.describe_cluster(name=cluster_name)["cluster"]
+    create_identity_mapping(config, region, cluster_details)
+
+    return cluster_details
+
+
+def delete_cluster(cluster_name, region):
+    logs.log(f"Deleting cluster {cluster_name} in {region}")
+
+    try:
+        exec_command(["eksctl", "delete", "cluster",
+                      f"--name={cluster_name}", f"--region={region}",
+                      "--wait"])
+    except Exception as ex:
+        logs.error(f"Can't delete cluster {cluster_name}: {ex}")
 
 
 def write_output_config(config, output_config):
@@ -99,28 +299,60 @@ def write_output_config(config, output_config):
     with open(output_filename, "w") as output_file:
         output_file.writelines(sorted(lines_array))
 
+    return output_filename
 
-def get_availability_zones(region):
-    ec2 = boto3.client("ec2", region_name=region)
-    ec2_zones = ec2.describe_availability_zones()["AvailabilityZones"]
-    zones = sorted([val["ZoneName"] for val in ec2_zones])
-    return zones[:3]
 
+def record_federation(index, config, state, status, env_file=None):
+    # Resources created so far, from the results recorded in the state
+    metadata = config.yaml["metadata"]
+    regions = metadata["regions"]
+    steps = state.data["steps"]
+    resources = []
 
-def get_cidr_for_vpc(index):
-    return f"172.2{index}.0.0/16"
+    nodegroups = [nodegroup["name"] for nodegroup in
+                  config.spec.get("managedNodeGroups", []) + config.spec.get("nodeGroups", [])]
 
+    for idx, region in enumerate(regions):
+        cluster = steps.get(f"cluster-{idx+1}")
+        if not cluster:
+            continue
+
+        resources.append(("cluster", region, cluster["name"]))
+        resources.append(("vpc", region, cluster["resourcesVpcConfig"]["vpcId"]))
+        resources.append(("stack", region, f"eksctl-{cluster['name']}-cluster"))
+        resources.extend(("stack", region, f"eksctl-{cluster['name']}-nodegroup-{nodegroup}")
+                         for nodegroup in nodegroups)
+
+    peering_ids = steps.get("peerings") or dict()
+    for peering in plan_peerings(len(regions)):
+        peering_id = steps.get(peering.name) or peering_ids.get(peering.name)
+        if not peering_id:
+            continue
+
+        requester = get_peering_endpoint(config, steps, peering.requester)
+        accepter = get_peering_endpoint(config, steps, peering.accepter)
+        resources.append(("peering", requester[0], peering_id))
+
+        if config.peering_engine != "native":
+            stack_name = get_peering_stack_name(
+                metadata["name"], peering.requester, peering.accepter, accepter[1])
+            resources.append(("stack", requester[0], f"{stack_name}-1"))
+            resources.append(("stack", accepter[0], f"{stack_name}-2"))
+
+    index.set_resources(metadata["name"], resources)
+    index.set_status(metadata["name"], status, env_file)
 
-def try_remove_files(filenames):
-    home_folder = os.path.expanduser("~")
 
-    for filename in filenames:
-        filename = filename.replace("~", home_folder)
+def get_availability_zones(region):
+    return cache.cached(f"zones-{region}", cache.DAY,
+                        lambda: fetch_availability_zones(region))
+
 
-        try:
-            os.remove(filename)
-        except FileNotFoundError:
-            logs.log(f"[OK] File not found {filename}")
+def fetch_availability_zones(region):
+    ec2 = get_client("ec2", region)
+    ec2_zones = ec2.describe_availability_zones()["AvailabilityZones"]
+    zones = sorted([val["ZoneName"] for val in ec2_zones])
+    return zones[:3]
 
 
 def create_identity_mapping(config, region, cluster):
@@ -137,73 +369,176 @@ def create_identity_mapping(config, region, cluster):
                       ])
 
 
+@tracing.traced()
 def clusters_disable_public_access(config, clusters):
+    # The ingress rules and the endpoint updates of all the clusters are
+    # independent, they are all applied at the same time
     metadata = config.yaml["metadata"]
-    [region1, region2] = metadata["regions"]
-
-    sg1id = clusters[0]["resourcesVpcConfig"]["clusterSecurityGroupId"]
-    sg2id = clusters[1]["resourcesVpcConfig"]["clusterSecurityGroupId"]
-
-    ec2 = boto3.client("ec2", region_name=region1)
-    ec2.authorize_security_group_ingress(GroupId=sg1id, IpPermissions=[
-        {"IpProtocol": "tcp",
-         "FromPort": 443,
-         "ToPort": 443,
-         "IpRanges": [{"CidrIp": get_cidr_for_vpc(0)},
-                      {"CidrIp": get_cidr_for_vpc(1)},
-                      {"CidrIp": get_cidr_for_vpc(2)}]}
-    ])
-
-    ec2 = boto3.client("ec2", region_name=region2)
-    ec2.authorize_security_group_ingress(GroupId=sg2id, IpPermissions=[
-        {"IpProtocol": "tcp",
-         "FromPort": 443,
-         "ToPort": 443,
-         "IpRanges": [{"CidrIp": get_cidr_for_vpc(0)},
-                      {"CidrIp": get_cidr_for_vpc(1)},
-                      {"CidrIp": get_cidr_for_vpc(2)}]}
-    ])
-
-    exec_command(["eksctl", "utils", "update-cluster-endpoints",
-                  f"--cluster={clusters[0]['name']}", f"--region={region1}",
-                  "--public-access=false", "--private-access=true",
-                  "--approve"])
-
-    exec_command(["eksctl", "utils", "update-cluster-endpoints",
-                  f"--cluster={clusters[1]['name']}", f"--region={region2}",
-                  "--public-access=false", "--private-access=true",
-                  "--approve"])
-
-
-def clusters_join_federation(config, clusters):
-    metadata = config.yaml["metadata"]
-    [region1, region2] = metadata["regions"]
+    cidrs = [config.bastion.vpccidr] + config.cidrs
+    members = list(zip(metadata["regions"], clusters))
+
+    with ThreadPoolExecutor(max_workers=2 * len(members)) as executor:
+        futures = [executor.submit(authorize_cluster_ingress, region, cluster, cidrs)
+                   for region, cluster in members] + \
+                  [executor.submit(disable_cluster_public_access, region, cluster)
+                   for region, cluster in members]
+
+    for future in futures:
+        future.result()
+
+
+def get_ingress_cidrs(ec2, group_id):
+    group = ec2.describe_security_groups(GroupIds=[group_id])["SecurityGroups"][0]
+    return [ip_range["CidrIp"] for permission in group["IpPermissions"]
+            if permission.get("IpProtocol") == "tcp" and
+            permission.get("FromPort") == 443 and permission.get("ToPort") == 443
+            for ip_range in permission.get("IpRanges", [])]
+
+
+def authorize_cluster_ingress(region, cluster, cidrs):
+    # HTTPS access to the cluster endpoint from the given VPCs, the CIDRs
+    # that are already authorized are skipped
+    ec2 = get_client("ec2", region)
+    group_id = cluster["resourcesVpcConfig"]["clusterSecurityGroupId"]
+    authorized = get_ingress_cidrs(ec2, group_id)
+
+    missing = [cidr for cidr in cidrs if cidr not in authorized]
+    if missing:
+        ec2.authorize_security_group_ingress(
+            GroupId=group_id,
+            IpPermissions=[
+                {"IpProtocol": "tcp",
+                 "FromPort": 443,
+                 "ToPort": 443,
+                 "IpRanges": [{"CidrIp": cidr} for cidr in missing]}
+            ])
+
+
+def revoke_cluster_ingress(region, cluster, cidrs):
+    ec2 = get_client("ec2", region)
+    group_id = cluster["resourcesVpcConfig"]["clusterSecurityGroupId"]
+    authorized = get_ingress_cidrs(ec2, group_id)
+
+    present = [cidr for cidr in cidrs if cidr in authorized]
+    if present:
+        ec2.revoke_security_group_ingress(
+            GroupId=group_id,
+            IpPermissions=[
+                {"IpProtocol": "tcp",
+                 "FromPort": 443,
+                 "ToPort": 443,
+                 "IpRanges": [{"CidrIp": cidr} for cidr in present]}
+            ])
+
+
+def disable_cluster_public_access(region, cluster):
+    # Private endpoint only, a cluster that already has it isn't updated
+    eks = get_client("eks", region)
+    waiter = eks.get_waiter("cluster_active")
+    name = cluster["name"]
+
+    current = eks.describe_cluster(name=name)["cluster"]
+    if current["status"] != "ACTIVE":
+        # Update of an interrupted run still in progress
+        waiter.wait(name=name, WaiterConfig=ENDPOINT_WAITER_CONFIG)
+        current = eks.describe_cluster(name=name)["cluster"]
+
+    vpc_config = current["resourcesVpcConfig"]
+    if not vpc_config.get("endpointPublicAccess") and vpc_config.get("endpointPrivateAccess"):
+        logs.log(f"Cluster {name} endpoint is already private in region: {region}")
+        return
 
-    home_folder = os.path.expanduser("~")
-    try_remove_files(["~/.kube/config", "~/.kube/config1", "~/.kube/config2"])
+    logs.log(f"Disabling public access to cluster {name} endpoint in region: {region}")
+    eks.update_cluster_config(name=name, resourcesVpcConfig={
+        "endpointPublicAccess": False, "endpointPrivateAccess": True})
+    waiter.wait(name=name, WaiterConfig=ENDPOINT_WAITER_CONFIG)
 
-    # Setting up kubeconfig for first cluster
-    exec_command(["aws", "eks", "--region", region1,
-                  "update-kubeconfig", "--name", clusters[0]["name"]])
-    shutil.copy(f"{home_folder}/.kube/config", f"{home_folder}/.kube/config1")
 
-    # Provisining Kubefed into primary Amazon EKS  cluster
-    exec_command(["./eks-cluster-setup/eks-cluster-install-kubefed.sh"])
+def write_federation_kubeconfig(config, clusters):
+    # Single kubeconfig with a context per cluster, the first one is the host
+    metadata = config.yaml["metadata"]
+    return write_kubeconfig(
+        build_kubeconfig(metadata["regions"], clusters), get_kubeconfig_filename())
 
-    # Setting up kubeconfig for second cluster
-    try_remove_files(["~/.kube/config"])
-    exec_command(["aws", "eks", "--region", region2,
-                  "update-kubeconfig", "--name", clusters[1]["name"]])
-    shutil.copy(f"{home_folder}/.kube/config", f"{home_folder}/.kube/config2")
 
+@tracing.traced()
+def clusters_join_federation(config, clusters, kubeconfig_filename):
     # Join clusters into federation
-    exec_command(["./eks-cluster-setup/eks-cluster-join-fed.sh"])
+    join_clusters(clusters, clusters[0])
+    exec_command(["kubectl", "-n", "kube-federation-system", "get", "kubefedclusters"])
 
+    return [kubeconfig_filename]
 
+
+def create_batched_peerings(config, results, peerings, cdk_path):
+    metadata = config.yaml["metadata"]
+    logs.log(f"Creating {len(peerings)} VPC peerings in batch")
+
+    specs = []
+    for peering in peerings:
+        requester = get_peering_endpoint(config, results, peering.requester)
+        accepter = get_peering_endpoint(config, results, peering.accepter)
+        specs.append({
+            "name": get_peering_stack_name(
+                metadata["name"], peering.requester, peering.accepter, accepter[1]),
+            "requester": dict(zip(["region", "id", "cidr"], requester)),
+            "accepter": dict(zip(["region", "id", "cidr"], accepter)),
+        })
+
+    output_path = os.path.join(cdk_path, "cdk.out", f"{metadata['name']}-peerings")
+    os.makedirs(output_path, exist_ok=True)
+    peerings_filename = os.path.join(output_path, "peerings.json")
+    outputs_filename = os.path.join(output_path, "outputs.json")
+    deploy_path = get_deploy_path(cdk_path, f"{metadata['name']}-peerings")
+
+    # The requester stacks create the peering connections, their outputs
+    # feed the accepter stacks of the second deployment wave
+    deploy_peering_stacks(specs, [f"{spec['name']}-1" for spec in specs],
+                          peerings_filename, outputs_filename, output_path, deploy_path)
+
+    with open(outputs_filename, "r") as outputs_file:
+        outputs = json.load(outputs_file)
+
+    for spec in specs:
+        stack_outputs = outputs.get(f"{spec['name']}-1", {})
+        spec["peeringConnectionId"] = next(
+            (value for key, value in stack_outputs.items()
+             if "PeeringConnectionId" in key), "")
+
+    deploy_peering_stacks(specs, [f"{spec['name']}-2" for spec in specs],
+                          peerings_filename, outputs_filename, output_path, deploy_path)
+
+    return {peering.name: spec["peeringConnectionId"]
+            for peering, spec in zip(peerings, specs)}
+
+
+def deploy_peering_stacks(specs, stack_names, peerings_filename, outputs_filename,
+                          output_path, deploy_path):
+    with open(peerings_filename, "w") as peerings_file:
+        json.dump(specs, peerings_file, indent=2)
+
+    exec_command(["cdk", "deploy",
+                  "--require-approval", "never",
+                  "--concurrency", str(PEERING_CONCURRENCY),
+                  "--output", output_path,
+                  "--outputs-file", outputs_filename,
+                  "-c", f"peeringsFile={peerings_filename}"
+                  ] + stack_names, cwd=deploy_path)
+
+
+@tracing.traced()
 def create_vpc_peering(config, stack_name, vpc1region, vpc1id, vpc1cidr,
-                       vpc2region, vpc2id, vpc2cidr):
+                       vpc2region, vpc2id, vpc2cidr, cdk_path):
+    # Every deployment gets its own working folder, with its cloud assembly
+    # and lookup context, so that peerings can be deployed concurrently from
+    # the same CDK app
+    logs.log(f"Creating VPC peering {stack_name}")
+    output_path = os.path.join("cdk.out", stack_name)
+    deploy_path = get_deploy_path(cdk_path, stack_name)
+
     exec_command(["cdk", "deploy",
                   "--require-approval", "never",
+                  "--output", output_path,
                   "-c", f"name={stack_name}-1",
                   "-c", f"vpc1region={vpc1region}",
                   "-c", f"vpc1id={vpc1id}",
@@ -211,9 +546,9 @@ def create_vpc_peering(config, stack_name, vpc1region, vpc1id, vpc1cidr,
                   "-c", f"vpc2region={vpc2region}",
                   "-c", f"vpc2id={vpc2id}",
                   "-c", f"vpc2cidr={vpc2cidr}"
-                  ])
+                  ], cwd=deploy_path)
 
-    cf = boto3.client("cloudformation", region_name=vpc1region)
+    cf = get_client("cloudformation", vpc1region)
     stacks = cf.describe_stacks(StackName=f"{stack_name}-1")["Stacks"]
 
     peeringConnectionId = ""
@@ -225,6 +560,7 @@ def create_vpc_peering(config, stack_name, vpc1region, vpc1id, vpc1cidr,
 
     exec_command(["cdk", "deploy",
                   "--require-approval", "never",
+                  "--output", output_path,
                   "-c", f"peeringConnectionId={peeringConnectionId}",
                   "-c", f"name={stack_name}-2",
                   "-c", f"vpc1region={vpc2region}",
@@ -233,4 +569,6 @@ def create_vpc_peering(config, stack_name, vpc1region, vpc1id, vpc1cidr,
                   "-c", f"vpc2region={vpc1region}",
                   "-c", f"vpc2id={vpc1id}",
                   "-c", f"vpc2cidr={vpc1cidr}"
-                  ])
+                  ], cwd=deploy_path)
+
+    return peeringConnectionId
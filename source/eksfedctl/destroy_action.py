@@ -13,25 +13,53 @@
 
 import sys
 import os
-from execution import exec_command
+
+import logs
+from destroy_script import destroy_federated_clusters, destroy_fleet, read_output_config
+from errors import ArgumentError
+from fleet import FederationIndex, get_output_config
 
 
 def process(args):
-    if not confirm_destroy():
+    output_configs = get_output_configs(args)
+    if not output_configs:
+        logs.log("No federations to destroy")
+        return
+
+    if not confirm_destroy([val["BASE_NAME"] for val in output_configs]):
         sys.exit()
 
-    home_folder = os.path.expanduser("~")
-    config_filename = args.file.replace("~", home_folder)
-    root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+    if len(output_configs) == 1:
+        destroy_federated_clusters(output_configs[0])
+    else:
+        destroy_fleet(output_configs, args.parallel)
+
+
+def get_output_configs(args):
+    if args.parallel < 1:
+        raise ArgumentError("The number of parallel destroys must be at least 1")
+
+    if args.file:
+        home_folder = os.path.expanduser("~")
+        config_filename = args.file.replace("~", home_folder)
+        return [read_output_config(config_filename)]
+
+    index = FederationIndex()
+    federations = index.list(None if args.all else args.name)
+
+    missing = sorted(set(args.name or []) - set(val["name"] for val in federations))
+    if missing:
+        raise ArgumentError(f"Federations not found in {index.filename}: {', '.join(missing)}")
 
-    exec_command(
-        ["bash", "-c",
-         f"source '{config_filename}' && bash '{root_path}/eks-cluster-setup/eks-cluster-destroy.sh'"]
-    )
+    return [get_output_config(federation) for federation in federations]
 
 
-def confirm_destroy():
-    question = "Do you want to destroy federated EKS clusters? [y/N]: "
+def confirm_destroy(names):
+    if len(names) == 1:
+        question = "Do you want to destroy federated EKS clusters? [y/N]: "
+    else:
+        logs.log(f"Federations to destroy: {', '.join(names)}")
+        question = f"Do you want to destroy {len(names)} federations? [y/N]: "
     answer = ""
 
     while answer not in ["y", "n"]:
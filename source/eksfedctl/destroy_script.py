@@ -0,0 +1,212 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import WaiterError
+
+import logs
+from clients import get_client
+from execution import get_label, set_label
+from fleet import FederationIndex
+from inventory import StackInventory
+from peering_native import delete_native_peerings
+from state import get_state_filename
+
+WAIT_INITIAL_DELAY = 5
+WAIT_MAX_DELAY = 60
+WAIT_TIMEOUT = 3600
+FLEET_PARALLEL = 4
+
+
+def destroy_federated_clusters(output_config, inventory=None):
+    base_name = output_config["BASE_NAME"]
+    cluster_regions = get_cluster_regions(output_config)
+    peering_regions = sorted(
+        set(cluster_regions + [output_config["BASTION_REGION"]]))
+
+    index = FederationIndex()
+    index.set_status(base_name, "destroying")
+
+    try:
+        delete_federation(base_name, cluster_regions, peering_regions, inventory)
+    except Exception:
+        index.set_status(base_name, "destroy-failed")
+        raise
+
+    index.remove(base_name)
+
+    logs.log("All resources: VPC Peering, EKS NodeGroups and EKS clusters were deleted")
+
+
+def destroy_fleet(output_configs, parallel=FLEET_PARALLEL):
+    # Tears down many federations, at most parallel of them at a time. One
+    # listing per region serves all of them
+    regions = sorted(set(
+        region for output_config in output_configs
+        for region in get_cluster_regions(output_config) + [output_config["BASTION_REGION"]]))
+    inventory = StackInventory().refresh(regions)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(destroy_labeled, output_config, inventory):
+                   output_config["BASE_NAME"] for output_config in output_configs}
+
+    failed = []
+    for future, base_name in futures.items():
+        if future.exception() is not None:
+            logs.error(f"Can't destroy federation {base_name}: {future.exception()}")
+            failed.append(base_name)
+
+    if failed:
+        raise Exception(f"{len(failed)} of {len(output_configs)} federations "
+                        f"weren't destroyed: {', '.join(failed)}")
+
+
+def destroy_labeled(output_config, inventory):
+    set_label(output_config["BASE_NAME"])
+    try:
+        destroy_federated_clusters(output_config, inventory)
+    finally:
+        set_label(None)
+
+
+def delete_federation(base_name, cluster_regions, peering_regions, inventory=None):
+    # A single listing per region serves all the phases, the waiters then
+    # update the inventory one stack at a time
+    if inventory is None:
+        inventory = StackInventory().refresh(peering_regions)
+
+    # Peerings reference the cluster VPCs, they are deleted first, stacks and
+    # connections of the native engine at the same time
+    stacks = [(region, stack) for region in peering_regions
+              for stack in inventory.stacks(region, base_name, "peering")]
+    logs.log(f"Deleting peering stacks in {', '.join(peering_regions)}")
+    run_concurrently([
+        lambda: delete_stacks(inventory, stacks),
+        # Peerings of the native engine are tagged instead of being stacks
+        lambda: delete_native_peerings(base_name, peering_regions),
+    ])
+
+    # Nodegroups have to be gone before the cluster stack of their region
+    # can be deleted, regions don't wait for each other
+    run_concurrently([
+        lambda region=region: delete_cluster_stacks(inventory, base_name, region)
+        for region in sorted(set(cluster_regions))
+    ])
+
+    try:
+        os.remove(get_state_filename(base_name))
+    except FileNotFoundError:
+        pass
+
+
+def delete_cluster_stacks(inventory, base_name, region):
+    for phase in ["nodegroup", "cluster"]:
+        stacks = [(region, stack) for stack in inventory.stacks(region, base_name, phase)]
+        logs.log(f"Deleting {phase} stacks in {region}")
+        delete_stacks(inventory, stacks)
+
+
+def run_concurrently(funcs):
+    # Worker threads log with the label of the calling one, e.g. the
+    # federation of a fleet destroy
+    if not funcs:
+        return
+
+    label = get_label()
+
+    def run(func):
+        set_label(label)
+        return func()
+
+    with ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+        futures = [executor.submit(run, func) for func in funcs]
+
+    errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        raise errors[0]
+
+
+def read_output_config(filename):
+    output_config = dict()
+
+    with open(filename, "r") as output_file:
+        for line in output_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            key, _, value = line.replace("export ", "", 1).partition("=")
+            output_config[key.strip()] = value.strip()
+
+    for key in ["BASE_NAME", "BASTION_REGION"]:
+        if key not in output_config:
+            raise Exception(f"Property \"{key}\" not found in {filename}")
+
+    return output_config
+
+
+def get_cluster_regions(output_config):
+    # Cluster numbers have gaps once regions were removed
+    numbers = sorted(int(match.group(1)) for match in
+                     [re.match(r"^CLUSTER(\d+)_REGION$", key) for key in output_config]
+                     if match)
+
+    return [output_config[f"CLUSTER{number}_REGION"] for number in numbers]
+
+
+def delete_stacks(inventory, stacks):
+    run_concurrently([
+        lambda region=region, stack=stack: delete_stack(inventory, region, stack)
+        for region, stack in stacks
+    ])
+
+
+def delete_stack(inventory, region, stack):
+    cf = get_client("cloudformation", region)
+    logs.log(f"Deleting {stack['StackName']} stack in region: {region}")
+
+    if stack["StackStatus"] != "DELETE_IN_PROGRESS":
+        cf.delete_stack(StackName=stack["StackName"])
+
+    # Waiting on the stack id keeps describe_stacks working after the
+    # deletion, the stack name stops resolving once the stack is gone
+    wait_for_stack_deleted(cf, stack["StackId"])
+    inventory.update(region, {**stack, "StackStatus": "DELETE_COMPLETE"})
+    logs.log(f"Stack {stack['StackName']} deleted in region: {region}")
+
+
+def wait_for_stack_deleted(cf, stack_id):
+    # CloudFormation waiters poll with a fixed delay, so every waiter call
+    # makes a single attempt. The stack is checked right away, the delay
+    # only grows, exponentially, while it is still being deleted
+    waiter = cf.get_waiter("stack_delete_complete")
+    delay = WAIT_INITIAL_DELAY
+    deadline = time.monotonic() + WAIT_TIMEOUT
+
+    while True:
+        try:
+            waiter.wait(StackName=stack_id,
+                        WaiterConfig={"Delay": 0, "MaxAttempts": 1})
+            return
+        except WaiterError as ex:
+            if "Max attempts exceeded" not in str(ex):
+                raise Exception(f"Can't delete stack {stack_id}: {ex}")
+
+        if time.monotonic() > deadline:
+            raise Exception(f"Timed out waiting for stack {stack_id} deletion")
+
+        time.sleep(delay)
+        delay = min(delay * 2, WAIT_MAX_DELAY)
@@ -14,12 +14,11 @@
 #####################################################################################################################
 
 import argparse
+import importlib
 import signal
 import sys
 
 import logs
-import create_action
-import destroy_action
 from errors import ArgumentError
 
 
@@ -35,24 +34,144 @@ def main():
         "create", help="create Amazon EKS federated clusters")
     create_parser.set_defaults(
         parser=create_parser,
-        func=create_action.process)
+        func=command("create_action", "process_traced"))
     create_parser.add_argument(
         "-f", "--file", type=str, help="load configuration from a file")
     create_parser.add_argument(
         "-n", "--name", type=str, help="cluster name")
     create_parser.add_argument(
-        "-r", "--regions", nargs=2, type=str, help="cluster regions")
+        "-r", "--regions", nargs="+", type=str, help="cluster regions")
     create_parser.add_argument(
         "-d", "--dry-run", action="store_true", help="dry run")
+    create_parser.add_argument(
+        "--resume", action="store_true",
+        help="resume a failed run from its state file")
+    create_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="don't use cached instance metadata, regions and zones")
+    create_parser.add_argument(
+        "--report", type=str,
+        help="run report file, ~/.eksfedctl/reports/<name>-<time>.json by default")
+    create_parser.add_argument(
+        "--peering-engine", choices=["cdk", "cdk-batch", "native"],
+        help="deploy every peering with its own CDK app run (cdk, default), "
+             "all peerings with one run per deployment wave (cdk-batch) "
+             "or create them with EC2 APIs directly (native), "
+             "the engine of the previous run with --resume")
+    create_parser.add_argument(
+        "--bastion-region", type=str,
+        help="bastion region, read from instance metadata by default")
+    create_parser.add_argument(
+        "--bastion-vpc-id", type=str,
+        help="bastion VPC ID, read from instance metadata by default")
+    create_parser.add_argument(
+        "--bastion-vpc-cidr", type=str,
+        help="bastion VPC CIDR, read from instance metadata by default")
 
     destroy_parser = subparsers.add_parser(
         "destroy", help="destroy Amazon EKS federated clusters")
     destroy_parser.set_defaults(
         parser=destroy_parser,
-        func=destroy_action.process)
+        func=command("destroy_action", "process"))
+    destroy_target = destroy_parser.add_mutually_exclusive_group(required=True)
+    destroy_target.add_argument(
+        "-f", "--file", type=str,
+        help="load configuration from a file")
+    destroy_target.add_argument(
+        "-n", "--name", nargs="+", type=str,
+        help="names of federations from the local index")
+    destroy_target.add_argument(
+        "--all", action="store_true",
+        help="all the federations of the local index")
     destroy_parser.add_argument(
+        "--parallel", type=int, default=4,
+        help="number of federations destroyed at the same time")
+
+    add_region_parser = subparsers.add_parser(
+        "add-region", help="add member regions to live federated clusters")
+    add_region_parser.set_defaults(
+        parser=add_region_parser,
+        func=command("scale_action", "process_add"))
+    add_region_parser.add_argument(
+        "-n", "--name", type=str, required=True, help="federation name")
+    add_region_parser.add_argument(
+        "-r", "--regions", nargs="+", type=str, required=True,
+        help="regions of the new clusters")
+    add_region_parser.add_argument(
+        "-f", "--file", type=str,
+        help="configuration of the new clusters, the one used by create by default")
+    add_region_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="don't use cached regions and zones")
+
+    remove_region_parser = subparsers.add_parser(
+        "remove-region", help="remove member regions from live federated clusters")
+    remove_region_parser.set_defaults(
+        parser=remove_region_parser,
+        func=command("scale_action", "process_remove"))
+    remove_region_parser.add_argument(
+        "-n", "--name", type=str, required=True, help="federation name")
+    remove_region_parser.add_argument(
+        "-r", "--regions", nargs="+", type=str, required=True,
+        help="regions of the clusters to remove")
+
+    apply_parser = subparsers.add_parser(
+        "apply", help="apply federated resources to the host cluster")
+    apply_parser.set_defaults(
+        parser=apply_parser,
+        func=command("apply_action", "process"))
+    apply_parser.add_argument(
         "-f", "--file", type=str, required=True,
-        help="load configuration from a file")
+        help="manifest file, or folder of manifest files")
+    apply_parser.add_argument(
+        "--context", type=str,
+        help="kubeconfig context of the host cluster, the current one by default")
+    apply_parser.add_argument(
+        "--kubeconfig", type=str,
+        help="kubeconfig file, the one written by create by default")
+    apply_parser.add_argument(
+        "--concurrency", type=int,
+        help="number of objects applied at the same time")
+    apply_parser.add_argument(
+        "--wait", type=int,
+        help="seconds to wait for federated objects to propagate, 0 to skip")
+    apply_parser.add_argument(
+        "-o", "--output", choices=["table", "json"], default="table",
+        help="output format")
+
+    list_parser = subparsers.add_parser(
+        "list", help="list the federations created from this host")
+    list_parser.set_defaults(
+        parser=list_parser,
+        func=command("list_action", "process"))
+    list_parser.add_argument(
+        "-o", "--output", choices=["table", "json"], default="table",
+        help="output format")
+
+    status_parser = subparsers.add_parser(
+        "status", help="show the health or the stacks of Amazon EKS federated clusters")
+    status_parser.set_defaults(
+        parser=status_parser,
+        func=command("status_action", "process"))
+    status_parser.add_argument(
+        "-f", "--file", type=str, help="load configuration from a file")
+    status_parser.add_argument(
+        "-n", "--name", type=str, help="cluster name")
+    status_parser.add_argument(
+        "-r", "--regions", nargs="+", type=str,
+        help="cluster regions, only their members are probed")
+    status_parser.add_argument(
+        "--stacks", action="store_true",
+        help="show the stacks instead of the health of the members")
+    status_parser.add_argument(
+        "-w", "--watch", action="store_true",
+        help="probe again every interval and show the changes")
+    status_parser.add_argument(
+        "--interval", type=int, default=30,
+        help="seconds between the probes of --watch")
+    status_parser.add_argument(
+        "-o", "--output", choices=["table", "json"], default="table",
+        help="output format")
 
     args = parser.parse_args()
     if "func" not in args:
@@ -67,6 +186,16 @@ def main():
         error(ex)
 
 
+def command(module_name, function_name):
+    # The action modules pull in boto3, requests and yaml, only the one of
+    # the command being run is imported
+    def run(args):
+        module = importlib.import_module(module_name)
+        return getattr(module, function_name)(args)
+
+    return run
+
+
 def error(message, parser=None):
     logs.error(message)
 
@@ -78,7 +207,13 @@ def error(message, parser=None):
 
 
 def interrupt_signal_handler(sig, frame):
+    # Commands run in their own session and don't get the Ctrl-C of the
+    # terminal, they are stopped here. The exit then unwinds the running
+    # command, e.g. the task graph waiting for its tasks
+    from execution import terminate_commands
+
     print("Interrupting and exit!")
+    terminate_commands()
     sys.exit(1)
 
 
@@ -13,7 +13,10 @@
 
 
 class CommandError(ValueError):
-    pass
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        # Outcome of the failed run: return code, timeout and output tails
+        self.result = result
 
 
 class ArgumentError(ValueError):
@@ -11,23 +11,214 @@
 #  and limitations under the License.                                                                                #
 #####################################################################################################################
 
+import os
+import re
+import signal
 import subprocess
+import threading
+import time
+import types
+from collections import deque
+from datetime import datetime
 
+import logs
+import retries
+import tracing
 from errors import CommandError
 
+STDIN_CHUNK_SIZE = 64 * 1024
+OUTPUT_TAIL_LINES = 50
 
-def exec_command(command, command_stdin=None):
-    if command_stdin:
-        child = subprocess.Popen(command, stdin=subprocess.PIPE)
-        child.communicate(input=command_stdin.encode())
-    else:
-        child = subprocess.Popen(command)
-        child.communicate()
+_children = set()
+_children_lock = threading.Lock()
+_cancelled = threading.Event()
+_context = threading.local()
+_log_folder = None
+_log_folder_lock = threading.Lock()
 
-    rc = child.returncode
-    if rc != 0:
+
+def exec_command(command, command_stdin=None, cwd=None, label=None, timeout=None,
+                 retry=True):
+    return run_command(command, command_stdin, cwd, label, timeout,
+                       retry=retry).returncode
+
+
+def run_command(command, command_stdin=None, cwd=None, label=None,
+                timeout=None, check=True, retry=True):
+    # Failures classified as transient, e.g. throttling or network errors
+    # in the output, are retried with backoff. Streamed stdin can't be
+    # replayed, such commands run once
+    label = label or get_label() or os.path.basename(command[0])
+    max_attempts = retries.MAX_ATTEMPTS if retry and check and (
+        command_stdin is None or isinstance(command_stdin, str)) else 1
+
+    def classify(ex):
+        if isinstance(ex, CommandError) and ex.result is not None:
+            return retries.classify_command(ex.result)
+        return None
+
+    with tracing.span(f"exec {label}", command=" ".join(command)) as record:
+        result = retries.call(
+            lambda: run_process(command, command_stdin, cwd, label, timeout, check),
+            classify, f"\"{' '.join(command[:2])}\" of {label}", label=label,
+            max_attempts=max_attempts, cancelled=_cancelled)
+        record["attributes"]["returncode"] = result.returncode
+        return result
+
+
+def run_process(command, command_stdin, cwd, label, timeout, check):
+    # Streams stdout and stderr of the child line by line to the console,
+    # prefixed with the task label, and to a per-task log file. The child is
+    # started in its own process group so that cancel kills its whole tree
+    log_filename = os.path.join(get_log_folder(), f"{safe_filename(label)}.log")
+    start = time.monotonic()
+
+    with _children_lock:
+        if _cancelled.is_set():
+            raise CommandError(
+                f"Command \"{' '.join(command)}\" cancelled"
+            )
+
+        child = subprocess.Popen(
+            command, cwd=cwd, start_new_session=True,
+            stdin=subprocess.PIPE if command_stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        _children.add(child)
+
+    result = types.SimpleNamespace(
+        command=list(command), label=label, log_filename=log_filename,
+        returncode=None, duration=None, timed_out=False,
+        stdout=deque(maxlen=OUTPUT_TAIL_LINES),
+        stderr=deque(maxlen=OUTPUT_TAIL_LINES))
+
+    try:
+        with open(log_filename, "a") as log_file:
+            log_file.write(f"$ {' '.join(command)}\n")
+            log_file.flush()
+            log_lock = threading.Lock()
+
+            threads = [
+                threading.Thread(target=stream_output, daemon=True, args=(
+                    child.stdout, label, result.stdout, log_file, log_lock, False)),
+                threading.Thread(target=stream_output, daemon=True, args=(
+                    child.stderr, label, result.stderr, log_file, log_lock, True)),
+            ]
+            if command_stdin:
+                threads.append(threading.Thread(
+                    target=stream_input, daemon=True,
+                    args=(child.stdin, command_stdin)))
+
+            for thread in threads:
+                thread.start()
+
+            try:
+                child.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                result.timed_out = True
+                kill_process_group(child, signal.SIGKILL)
+                child.wait()
+
+            for thread in threads:
+                thread.join()
+    finally:
+        with _children_lock:
+            _children.discard(child)
+
+    result.returncode = child.returncode
+    result.duration = time.monotonic() - start
+    result.stdout = list(result.stdout)
+    result.stderr = list(result.stderr)
+
+    if check and result.timed_out:
         raise CommandError(
-            f"Command \"{' '.join(child.args)}\" returned exit code {rc}"
+            f"Command \"{' '.join(command)}\" timed out after {timeout}s, "
+            f"see {log_filename}", result
         )
 
-    return rc
+    if check and result.returncode != 0:
+        raise CommandError(
+            f"Command \"{' '.join(command)}\" returned exit code {result.returncode}, "
+            f"see {log_filename}", result
+        )
+
+    return result
+
+
+def stream_output(stream, label, tail, log_file, log_lock, is_stderr):
+    for raw_line in iter(stream.readline, b""):
+        line = raw_line.decode(errors="replace").rstrip("\r\n")
+        tail.append(line)
+
+        with log_lock:
+            log_file.write(f"{line}\n")
+            log_file.flush()
+
+        logs.output(label, line, is_stderr)
+
+    stream.close()
+
+
+def stream_input(stream, command_stdin):
+    # Accepts a string or any iterable of string chunks, large documents
+    # don't have to be materialized in memory as a whole
+    chunks = [command_stdin] if isinstance(command_stdin, str) else command_stdin
+
+    try:
+        for chunk in chunks:
+            data = chunk.encode()
+            for offset in range(0, len(data), STDIN_CHUNK_SIZE):
+                stream.write(data[offset:offset + STDIN_CHUNK_SIZE])
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def kill_process_group(child, sig):
+    try:
+        os.killpg(child.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def set_label(label):
+    _context.label = label
+
+
+def get_label():
+    return getattr(_context, "label", None)
+
+
+def get_log_folder():
+    global _log_folder
+
+    with _log_folder_lock:
+        if _log_folder is None:
+            home_folder = os.path.expanduser("~")
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            _log_folder = os.path.join(
+                home_folder, ".eksfedctl", "logs", f"{timestamp}-{os.getpid()}")
+            os.makedirs(_log_folder, exist_ok=True)
+
+        return _log_folder
+
+
+def safe_filename(label):
+    return re.sub(r"[^-A-Za-z0-9_.]", "_", label)
+
+
+def terminate_commands():
+    # Stops every child process that is still running and refuses to start
+    # new ones until reset_cancellation, used to cancel sibling jobs when one
+    # of the concurrent jobs fails
+    with _children_lock:
+        _cancelled.set()
+        children = list(_children)
+
+    for child in children:
+        if child.poll() is None:
+            kill_process_group(child, signal.SIGTERM)
+
+
+def reset_cancellation():
+    _cancelled.clear()
@@ -0,0 +1,164 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import contextlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS federations (
+        name TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        bastion_region TEXT,
+        regions TEXT NOT NULL,
+        peering_engine TEXT,
+        env_file TEXT,
+        created TEXT NOT NULL,
+        updated TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS resources (
+        federation TEXT NOT NULL REFERENCES federations(name) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        region TEXT NOT NULL,
+        id TEXT NOT NULL,
+        PRIMARY KEY (federation, kind, region, id)
+    )""",
+]
+
+# Resource kinds recorded for every federation
+KINDS = ["cluster", "vpc", "stack", "peering"]
+BUSY_TIMEOUT = 30
+
+
+def get_index_filename():
+    home_folder = os.path.expanduser("~")
+    return os.path.join(home_folder, ".eksfedctl", "index.db")
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class FederationIndex:
+    # Local index of every federation created from this host: its regions,
+    # status and resources. Several eksfedctl processes can share it, every
+    # method runs in its own short transaction
+
+    def __init__(self, filename=None):
+        self.filename = filename or get_index_filename()
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+
+        with self.connect() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    @contextlib.contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.filename, timeout=BUSY_TIMEOUT)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute("PRAGMA foreign_keys = ON")
+            # Readers don't block the writer of another process
+            connection.execute("PRAGMA journal_mode = WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def upsert(self, name, status, regions, bastion_region=None,
+               peering_engine=None, env_file=None):
+        # INSERT OR IGNORE and UPDATE instead of ON CONFLICT, the SQLite of
+        # Amazon Linux 2 predates upserts
+        timestamp = now()
+        with self.connect() as connection:
+            connection.execute(
+                """INSERT OR IGNORE INTO federations (name, status, regions,
+                       created, updated) VALUES (?, ?, ?, ?, ?)""",
+                (name, status, json.dumps(regions), timestamp, timestamp))
+            connection.execute(
+                """UPDATE federations SET status = ?, regions = ?, updated = ?,
+                       bastion_region = COALESCE(?, bastion_region),
+                       peering_engine = COALESCE(?, peering_engine),
+                       env_file = COALESCE(?, env_file)
+                   WHERE name = ?""",
+                (status, json.dumps(regions), timestamp, bastion_region,
+                 peering_engine, env_file, name))
+
+    def set_status(self, name, status, env_file=None):
+        with self.connect() as connection:
+            connection.execute(
+                """UPDATE federations SET status = ?, updated = ?,
+                       env_file = COALESCE(?, env_file) WHERE name = ?""",
+                (status, now(), env_file, name))
+
+    def set_resources(self, name, resources):
+        # Replaces the resources of the federation with (kind, region, id)
+        # tuples
+        with self.connect() as connection:
+            connection.execute("DELETE FROM resources WHERE federation = ?", (name,))
+            connection.executemany(
+                "INSERT OR IGNORE INTO resources VALUES (?, ?, ?, ?)",
+                [(name, kind, region, resource_id)
+                 for kind, region, resource_id in resources])
+
+    def remove(self, name):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM federations WHERE name = ?", (name,))
+
+    def get(self, name):
+        federations = self.list([name])
+        return federations[0] if federations else None
+
+    def list(self, names=None):
+        with self.connect() as connection:
+            query = "SELECT * FROM federations"
+            params = []
+            if names is not None:
+                query += f" WHERE name IN ({', '.join('?' * len(names))})"
+                params = list(names)
+
+            federations = [dict(row) for row in connection.execute(
+                query + " ORDER BY created, name", params)]
+
+            resources = connection.execute(
+                "SELECT * FROM resources ORDER BY kind, region, id").fetchall()
+
+        by_name = {federation["name"]: federation for federation in federations}
+        for federation in federations:
+            federation["regions"] = json.loads(federation["regions"])
+            federation["resources"] = {kind: [] for kind in KINDS}
+
+        for resource in resources:
+            if resource["federation"] in by_name:
+                by_name[resource["federation"]]["resources"].setdefault(
+                    resource["kind"], []).append(
+                        {"region": resource["region"], "id": resource["id"]})
+
+        return federations
+
+
+def get_output_config(federation):
+    # Same properties as the .env file written by create
+    output_config = {
+        "BASE_NAME": federation["name"],
+        "BASTION_REGION": federation["bastion_region"],
+    }
+    # Removed clusters leave a None region, numbers are never reused
+    for idx, region in enumerate(federation["regions"]):
+        if region:
+            output_config[f"CLUSTER{idx+1}_NAME"] = f"{federation['name']}-{idx+1}"
+            output_config[f"CLUSTER{idx+1}_REGION"] = region
+
+    return output_config
@@ -0,0 +1,270 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import get_client
+from kube_api import KubeClient, load_context
+from kubeconfig import get_context_name
+from peering_native import find_peering, get_route_tables
+from planner import BASTION, get_members, plan_peerings
+
+PROBE_CONCURRENCY = 16
+KUBEFED_CLUSTERS = "/apis/core.kubefed.io/v1beta1/namespaces/kube-federation-system/kubefedclusters"
+
+
+class FederationProbe:
+    # Health of the members of a federation: EKS cluster and nodegroups,
+    # VPC peerings and their routes, and KubeFedCluster readiness. All the
+    # probes of a run are concurrent. What doesn't change between runs,
+    # i.e. VPC, nodegroup and peering IDs, is looked up once, so repeated
+    # runs of watch mode make a single call per probe
+
+    def __init__(self, name, regions, bastion=None, selected_regions=None):
+        self.name = name
+        self.members = get_members(regions)
+        self.bastion = bastion if bastion and bastion.get("vpcid") else None
+
+        # Only the members of the selected regions and their peerings are
+        # reported, the clusters at the other end of a peering are still
+        # described for their VPC
+        self.selected = [(number, region) for number, region in self.members
+                         if not selected_regions or region in selected_regions]
+        selected_numbers = {number for number, _ in self.selected}
+        self.peerings = [peering for peering in plan_peerings(len(regions))
+                         if all(endpoint == BASTION and self.bastion or
+                                endpoint != BASTION and regions[endpoint - 1]
+                                for endpoint in [peering.requester, peering.accepter]) and
+                         {peering.requester, peering.accepter} & selected_numbers]
+
+        self.lock = threading.Lock()
+        self.vpcs = dict()
+        self.nodegroups = dict()
+        self.peering_ids = dict()
+        self.kube_client = None
+
+        if self.bastion:
+            self.vpcs[BASTION] = (self.bastion["region"], self.bastion["vpcid"])
+
+    def close(self):
+        if self.kube_client:
+            self.kube_client.close()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=PROBE_CONCURRENCY) as executor:
+            member_futures = [executor.submit(self.probe_kubefed)]
+            for number, region in self.members:
+                member_futures.append(executor.submit(self.probe_cluster, number, region))
+                if (number, region) in self.selected:
+                    member_futures.append(executor.submit(self.probe_nodegroups, number, region))
+
+            # Peerings need the VPCs of both ends, known after the first run
+            waiting = [peering for peering in self.peerings if not self.has_vpcs(peering)]
+            peering_futures = [executor.submit(self.probe_peering, peering)
+                               for peering in self.peerings if peering not in waiting]
+
+            results = []
+            for future in member_futures:
+                results.extend(future.result())
+
+            for peering in waiting:
+                peering_futures.append(executor.submit(self.probe_peering, peering))
+            for future in peering_futures:
+                results.extend(future.result())
+
+        selected = [str(number) for number, _ in self.selected]
+        return [result for result in results
+                if result["probe"] in ["peering", "routes"] or result["member"] in selected]
+
+    def has_vpcs(self, peering):
+        with self.lock:
+            return peering.requester in self.vpcs and peering.accepter in self.vpcs
+
+    def get_cluster_name(self, number):
+        return f"{self.name}-{number}"
+
+    def probe_cluster(self, number, region):
+        def probe():
+            cluster = get_client("eks", region).describe_cluster(
+                name=self.get_cluster_name(number))["cluster"]
+            vpc_config = cluster["resourcesVpcConfig"]
+            with self.lock:
+                self.vpcs[number] = (region, vpc_config["vpcId"])
+
+            endpoint = "public" if vpc_config.get("endpointPublicAccess") else "private"
+            return cluster["status"], cluster["status"] == "ACTIVE", \
+                f"{cluster.get('version', '')} {endpoint} endpoint".strip()
+
+        return [run_probe("cluster", str(number), region, self.get_cluster_name(number), probe)]
+
+    def probe_nodegroups(self, number, region):
+        def probe():
+            eks = get_client("eks", region)
+            cluster_name = self.get_cluster_name(number)
+
+            with self.lock:
+                names = self.nodegroups.get(number)
+            if names is None:
+                names = eks.list_nodegroups(clusterName=cluster_name)["nodegroups"]
+                with self.lock:
+                    self.nodegroups[number] = names
+
+            statuses = {}
+            for name in names:
+                try:
+                    statuses[name] = eks.describe_nodegroup(
+                        clusterName=cluster_name, nodegroupName=name)["nodegroup"]["status"]
+                except eks.exceptions.ResourceNotFoundException:
+                    # Listed again on the next run
+                    statuses[name] = "DELETED"
+                    with self.lock:
+                        self.nodegroups.pop(number, None)
+
+            if not statuses:
+                return "NONE", True, "no managed nodegroups"
+
+            unhealthy = [status for status in statuses.values() if status != "ACTIVE"]
+            return unhealthy[0] if unhealthy else "ACTIVE", not unhealthy, \
+                ", ".join(f"{name}={status}" for name, status in statuses.items())
+
+        return [run_probe("nodegroups", str(number), region,
+                          self.get_cluster_name(number), probe)]
+
+    def probe_peering(self, peering):
+        endpoints = [peering.requester, peering.accepter]
+        member = "-".join("bastion" if endpoint == BASTION else str(endpoint)
+                          for endpoint in endpoints)
+        with self.lock:
+            vpcs = [self.vpcs.get(endpoint) for endpoint in endpoints]
+
+        if None in vpcs:
+            return [get_result(probe, member, "", peering.name, "unknown", False,
+                               "VPC of a cluster not found")
+                    for probe in ["peering", "routes"]]
+
+        connection = {}
+
+        def probe_connection():
+            (region1, vpc1id), (region2, vpc2id) = vpcs
+            ec2 = get_client("ec2", region1)
+
+            with self.lock:
+                peering_id = self.peering_ids.get(peering.name)
+            if peering_id:
+                found = ec2.describe_vpc_peering_connections(
+                    VpcPeeringConnectionIds=[peering_id])["VpcPeeringConnections"]
+            else:
+                found = [find_peering(ec2, vpc1id, vpc2id) or
+                         find_peering(get_client("ec2", region2), vpc2id, vpc1id)]
+
+            if not found or found[0] is None:
+                return "missing", False, f"no peering between {vpc1id} and {vpc2id}"
+
+            connection.update(found[0])
+            status = connection["Status"]["Code"]
+            with self.lock:
+                self.peering_ids[peering.name] = connection["VpcPeeringConnectionId"]
+                if status in ["deleted", "rejected", "failed", "expired"]:
+                    # Looked up by VPC again on the next run
+                    self.peering_ids.pop(peering.name)
+
+            return status, status == "active", connection["VpcPeeringConnectionId"]
+
+        def probe_routes():
+            if connection.get("Status", {}).get("Code") != "active":
+                return "unknown", False, "peering isn't active"
+
+            peering_id = connection["VpcPeeringConnectionId"]
+            vpc_regions = {vpc_id: region for region, vpc_id in vpcs}
+            missing = []
+            for info, peer_info in [(connection["RequesterVpcInfo"], connection["AccepterVpcInfo"]),
+                                    (connection["AccepterVpcInfo"], connection["RequesterVpcInfo"])]:
+                ec2 = get_client("ec2", vpc_regions[info["VpcId"]])
+                tables = get_route_tables(ec2, info["VpcId"])
+                missing.extend(table["RouteTableId"] for table in tables
+                               if not has_route(table, peer_info["CidrBlock"], peering_id))
+
+            if missing:
+                return "missing", False, f"no route in {', '.join(missing)}"
+            return "ok", True, f"routes through {peering_id}"
+
+        region = vpcs[0][0]
+        return [run_probe("peering", member, region, peering.name, probe_connection),
+                run_probe("routes", member, region, peering.name, probe_routes)]
+
+    def probe_kubefed(self):
+        # KubeFedCluster objects of the host cluster, the first member
+        host_number, host_region = self.members[0]
+        conditions = {}
+
+        def probe_host():
+            if self.kube_client is None:
+                host_cluster = {"name": self.get_cluster_name(host_number)}
+                # Failed probes are reported, watch mode tries again
+                self.kube_client = KubeClient(load_context(get_context_name(host_cluster)),
+                                              max_attempts=1)
+
+            for kubefed_cluster in self.kube_client.list(KUBEFED_CLUSTERS):
+                conditions[kubefed_cluster["metadata"]["name"]] = {
+                    condition["type"]: condition
+                    for condition in (kubefed_cluster.get("status") or {}).get("conditions", [])}
+
+        start = time.monotonic()
+        try:
+            probe_host()
+            error = None
+        except Exception as ex:
+            error = str(ex)
+        latency = time.monotonic() - start
+
+        results = []
+        for number, region in self.selected:
+            name = get_context_name({"name": self.get_cluster_name(number)})
+            if error:
+                status, healthy, detail = "error", False, error
+            elif name not in conditions:
+                status, healthy, detail = "unjoined", False, "no KubeFedCluster"
+            else:
+                ready = conditions[name].get("Ready", {})
+                healthy = ready.get("status") == "True"
+                status, detail = "Ready" if healthy else "NotReady", ready.get("message", "")
+
+            results.append(get_result("kubefed", str(number), region, name,
+                                      status, healthy, detail, latency))
+
+        return results
+
+
+def run_probe(probe, member, region, target, func):
+    start = time.monotonic()
+    try:
+        status, healthy, detail = func()
+    except Exception as ex:
+        status, healthy, detail = "error", False, str(ex)
+
+    return get_result(probe, member, region, target, status, healthy, detail,
+                      time.monotonic() - start)
+
+
+def get_result(probe, member, region, target, status, healthy, detail, latency=0.0):
+    return {"member": member, "region": region, "probe": probe, "target": target,
+            "status": status, "healthy": healthy, "detail": detail, "latency": latency}
+
+
+def has_route(table, cidr, peering_id):
+    return any(route.get("DestinationCidrBlock") == cidr and
+               route.get("VpcPeeringConnectionId") == peering_id and
+               route.get("State", "active") == "active"
+               for route in table["Routes"])
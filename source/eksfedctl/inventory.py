@@ -0,0 +1,116 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import get_client
+
+PHASES = ["peering", "nodegroup", "cluster"]
+
+# Every status except DELETE_COMPLETE, deleted stacks are kept by
+# list_stacks for 90 days and would dominate the listing otherwise
+STACK_STATUSES = [
+    "CREATE_IN_PROGRESS", "CREATE_FAILED", "CREATE_COMPLETE",
+    "ROLLBACK_IN_PROGRESS", "ROLLBACK_FAILED", "ROLLBACK_COMPLETE",
+    "DELETE_IN_PROGRESS", "DELETE_FAILED",
+    "UPDATE_IN_PROGRESS", "UPDATE_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_COMPLETE", "UPDATE_FAILED", "UPDATE_ROLLBACK_IN_PROGRESS",
+    "UPDATE_ROLLBACK_FAILED", "UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_ROLLBACK_COMPLETE", "REVIEW_IN_PROGRESS",
+    "IMPORT_IN_PROGRESS", "IMPORT_COMPLETE", "IMPORT_ROLLBACK_IN_PROGRESS",
+    "IMPORT_ROLLBACK_FAILED", "IMPORT_ROLLBACK_COMPLETE",
+]
+
+EKSCTL_STACK_PATTERN = re.compile(
+    r"^eksctl-(?P<base>.+)-(?P<idx>\d+)-(?P<phase>cluster|nodegroup)(-.+)?$")
+PEERING_STACK_PATTERN = re.compile(r"^(?P<base>.+)-peering-.+$")
+
+
+def classify_stack(stack_name):
+    match = EKSCTL_STACK_PATTERN.match(stack_name)
+    if match:
+        return match.group("base"), match.group("phase")
+
+    match = PEERING_STACK_PATTERN.match(stack_name)
+    if match:
+        return match.group("base"), "peering"
+
+    return None, None
+
+
+class StackInventory:
+    # Index of the federation stacks: region -> base name -> phase -> stack
+    # name -> stack summary, built from one paginated list_stacks per region
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = dict()
+
+    def refresh(self, regions):
+        regions = sorted(set(regions))
+
+        with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+            for region, region_index in executor.map(
+                    lambda region: (region, self.list_region(region)), regions):
+                with self.lock:
+                    self.index[region] = region_index
+
+        return self
+
+    def list_region(self, region):
+        cf = get_client("cloudformation", region)
+        paginator = cf.get_paginator("list_stacks")
+
+        region_index = dict()
+        for page in paginator.paginate(StackStatusFilter=STACK_STATUSES):
+            for summary in page["StackSummaries"]:
+                base_name, phase = classify_stack(summary["StackName"])
+                if not base_name:
+                    continue
+
+                phases = region_index.setdefault(base_name, dict())
+                phases.setdefault(phase, dict())[summary["StackName"]] = summary
+
+        return region_index
+
+    def update(self, region, stack):
+        # Incremental refresh of a single stack, e.g. from a waiter response
+        base_name, phase = classify_stack(stack["StackName"])
+        if not base_name:
+            return
+
+        with self.lock:
+            phases = self.index.setdefault(region, dict()).setdefault(base_name, dict())
+            stacks = phases.setdefault(phase, dict())
+
+            if stack["StackStatus"] == "DELETE_COMPLETE":
+                stacks.pop(stack["StackName"], None)
+            else:
+                stacks[stack["StackName"]] = stack
+
+    def stacks(self, region, base_name, phase):
+        with self.lock:
+            stacks = self.index.get(region, {}).get(base_name, {}).get(phase, {})
+            return sorted(stacks.values(), key=lambda val: val["StackName"])
+
+    def base_names(self):
+        with self.lock:
+            return sorted(set(base_name for region_index in self.index.values()
+                              for base_name in region_index))
+
+    def regions(self, base_name):
+        with self.lock:
+            return sorted(region for region, region_index in self.index.items()
+                          if region_index.get(base_name))
@@ -0,0 +1,246 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import base64
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import types
+
+import requests
+import yaml
+from botocore.signers import RequestSigner
+from requests.adapters import HTTPAdapter
+
+import retries
+from clients import get_client, get_session
+from compiler import Loader
+from execution import get_label
+from kubeconfig import get_kubeconfig_filename
+
+POOL_SIZE = 16
+REQUEST_TIMEOUT = 30
+FIELD_MANAGER = "eksfedctl"
+APPLY_CONTENT_TYPE = "application/apply-patch+yaml"
+
+# EKS tokens are valid for 15 minutes, they are renewed a minute earlier
+TOKEN_TTL = 14 * 60
+RETRYABLE_STATUSES = [429, 500, 502, 503, 504]
+
+# Kinds of freshly applied CRDs show up in discovery once they are
+# established
+DISCOVERY_TIMEOUT = 30
+DISCOVERY_DELAY = 1
+
+
+class KubeApiError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def load_context(name=None, filename=None):
+    # Server, CA and user of a kubeconfig context, the current one by default
+    filename = filename or get_kubeconfig_filename()
+    with open(filename, "r") as kubeconfig_file:
+        kubeconfig = yaml.load(kubeconfig_file, Loader=Loader)
+
+    name = name or kubeconfig.get("current-context")
+
+    def find(section, entry_name):
+        for entry in kubeconfig.get(section) or []:
+            if entry["name"] == entry_name:
+                return entry[section[:-1]]
+        raise Exception(f"No {section[:-1]} \"{entry_name}\" in {filename}")
+
+    context = find("contexts", name)
+    return types.SimpleNamespace(name=name, cluster=find("clusters", context["cluster"]),
+                                 user=find("users", context["user"]))
+
+
+class KubeClient:
+    # Kubernetes API client over a single pooled HTTPS connection pool to
+    # the API server, shared by all the threads of the process
+
+    def __init__(self, context, pool_size=POOL_SIZE, max_attempts=retries.MAX_ATTEMPTS):
+        self.context = context
+        self.max_attempts = max_attempts
+        self.server = context.cluster["server"].rstrip("/")
+        self.lock = threading.Lock()
+        self.token = None
+        self.token_expires = 0
+        self.resources = dict()
+        self.ca_filename = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if context.cluster.get("insecure-skip-tls-verify"):
+            self.session.verify = False
+        elif "certificate-authority-data" in context.cluster:
+            fd, self.ca_filename = tempfile.mkstemp(prefix=".eksfedctl-ca-", suffix=".crt")
+            with os.fdopen(fd, "wb") as ca_file:
+                ca_file.write(base64.b64decode(context.cluster["certificate-authority-data"]))
+            self.session.verify = self.ca_filename
+        elif "certificate-authority" in context.cluster:
+            self.session.verify = context.cluster["certificate-authority"]
+
+    def close(self):
+        self.session.close()
+        if self.ca_filename:
+            os.remove(self.ca_filename)
+
+    def get_token(self):
+        with self.lock:
+            if self.token is None or time.time() > self.token_expires:
+                self.token, ttl = get_user_token(self.context.user)
+                self.token_expires = time.time() + ttl
+            return self.token
+
+    def request(self, method, path, body=None, content_type="application/json",
+                params=None):
+        # Throttled and transient failures are retried with backoff
+        def send():
+            response = self.session.request(
+                method, self.server + path, data=body, params=params,
+                headers={"Authorization": f"Bearer {self.get_token()}",
+                         "Content-Type": content_type,
+                         "Accept": "application/json"},
+                timeout=REQUEST_TIMEOUT)
+
+            if response.status_code >= 400:
+                try:
+                    message = response.json().get("message", response.text)
+                except ValueError:
+                    message = response.text
+                raise KubeApiError(f"{method} {path}: {message}", response.status_code)
+
+            return response.json()
+
+        def classify(ex):
+            if isinstance(ex, KubeApiError):
+                return f"HTTP {ex.status}" if ex.status in RETRYABLE_STATUSES else None
+            if isinstance(ex, (requests.ConnectionError, requests.Timeout)):
+                return str(ex)
+            return None
+
+        label = get_label()
+        return retries.call(send, classify, f"{method} {path} of {label or 'eksfedctl'}",
+                            label=label, max_attempts=self.max_attempts)
+
+    def get_resource(self, api_version, kind):
+        # Plural name and scope of the kind from the API discovery, fetched
+        # once per group version
+        deadline = time.monotonic() + DISCOVERY_TIMEOUT
+
+        while True:
+            with self.lock:
+                resources = self.resources.get(api_version)
+
+            if resources is None or kind not in resources:
+                resources = self.discover(api_version)
+
+            if kind in resources:
+                return resources[kind]
+
+            if time.monotonic() > deadline:
+                raise Exception(f"Kind {kind} of {api_version} is not served by {self.server}")
+            time.sleep(DISCOVERY_DELAY)
+
+    def discover(self, api_version):
+        path = "/api/v1" if api_version == "v1" else f"/apis/{api_version}"
+        try:
+            resource_list = self.request("GET", path)
+        except KubeApiError as ex:
+            if ex.status != 404:
+                raise
+            resource_list = {"resources": []}
+
+        resources = {resource["kind"]: (resource["name"], resource["namespaced"])
+                     for resource in resource_list["resources"] if "/" not in resource["name"]}
+        with self.lock:
+            self.resources[api_version] = resources
+
+        return resources
+
+    def get_path(self, obj):
+        api_version = obj["apiVersion"]
+        plural, namespaced = self.get_resource(api_version, obj["kind"])
+        metadata = obj["metadata"]
+
+        path = "/api/v1" if api_version == "v1" else f"/apis/{api_version}"
+        if namespaced:
+            path += f"/namespaces/{metadata.get('namespace') or 'default'}"
+
+        return f"{path}/{plural}/{metadata['name']}"
+
+    def apply(self, obj):
+        # Server-side apply, the fields are owned by eksfedctl and conflicts
+        # with other managers are overridden like "kubectl apply
+        # --server-side --force-conflicts" does
+        return self.request("PATCH", self.get_path(obj), json.dumps(obj),
+                            content_type=APPLY_CONTENT_TYPE,
+                            params={"fieldManager": FIELD_MANAGER, "force": "true"})
+
+    def get(self, obj):
+        return self.request("GET", self.get_path(obj))
+
+    def list(self, path):
+        return self.request("GET", path)["items"]
+
+
+def get_user_token(user):
+    # Bearer token of a kubeconfig user and its lifetime in seconds
+    if "token" in user:
+        return user["token"], float("inf")
+
+    command = user.get("exec")
+    if not command:
+        raise Exception("Only token and exec kubeconfig users are supported")
+
+    args = command.get("args") or []
+    if os.path.basename(command["command"]) == "aws" and "get-token" in args:
+        # Written by eksfedctl create, the token is signed in process
+        # instead of starting the AWS CLI
+        return get_eks_token(args[args.index("--cluster-name") + 1],
+                             args[args.index("--region") + 1]), TOKEN_TTL
+
+    env = dict(os.environ)
+    env.update({val["name"]: val["value"] for val in command.get("env") or []})
+    output = subprocess.run([command["command"]] + args, env=env, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return json.loads(output)["status"]["token"], TOKEN_TTL
+
+
+def get_eks_token(cluster_name, region):
+    # Same token as "aws eks get-token": a presigned STS GetCallerIdentity
+    # URL bound to the cluster name
+    session = get_session()
+    sts = get_client("sts", region)
+    signer = RequestSigner(sts.meta.service_model.service_id, region, "sts", "v4",
+                           session.get_credentials(), session.events)
+
+    url = signer.generate_presigned_url({
+        "method": "GET",
+        "url": f"{sts.meta.endpoint_url}/?Action=GetCallerIdentity&Version=2011-06-15",
+        "body": {},
+        "headers": {"x-k8s-aws-id": cluster_name},
+        "context": {},
+    }, region_name=region, expires_in=60, operation_name="")
+
+    return "k8s-aws-v1." + base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
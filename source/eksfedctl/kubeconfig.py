@@ -0,0 +1,141 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import json
+import os
+import subprocess
+import tempfile
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+from execution import exec_command
+from kubefed import KUBEFED_NAMESPACE
+
+# Version of the ExecCredential of "aws eks get-token" when it can't be
+# run, the one of AWS CLI v1 on Amazon Linux 2
+DEFAULT_EXEC_API_VERSION = "client.authentication.k8s.io/v1alpha1"
+
+
+def get_kubeconfig_filename():
+    return os.environ.get("KUBECONFIG", os.path.join(
+        os.path.expanduser("~"), ".kube", "config")).split(os.pathsep)[0]
+
+
+def get_context_name(cluster):
+    # Kubernetes object names created by kubefedctl join must be lowercase
+    return cluster["name"].lower()
+
+
+def get_exec_api_version(region, cluster_name):
+    # kubectl, helm and kubefedctl reject a credential whose version differs
+    # from the one asked in the kubeconfig, and it depends on the installed
+    # AWS CLI: v1alpha1 for v1 before 1.23, v1beta1 for the later ones.
+    # The token is only signed locally, it is not printed
+    try:
+        output = subprocess.run(
+            ["aws", "--region", region, "eks", "get-token",
+             "--cluster-name", cluster_name],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, timeout=60).stdout
+        return json.loads(output)["apiVersion"]
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError) as ex:
+        logs.warning(f"Unable to get the token version of \"aws eks get-token\", "
+                     f"using {DEFAULT_EXEC_API_VERSION}: {ex}")
+        return DEFAULT_EXEC_API_VERSION
+
+
+def build_kubeconfig(regions, clusters):
+    # Multi-context kubeconfig built straight from describe_cluster results,
+    # credentials come from "aws eks get-token" like update-kubeconfig does
+    kubeconfig = {"apiVersion": "v1", "kind": "Config", "preferences": {},
+                  "clusters": [], "contexts": [], "users": [],
+                  "current-context": get_context_name(clusters[0])}
+    api_version = get_exec_api_version(regions[0], clusters[0]["name"])
+
+    for region, cluster in zip(regions, clusters):
+        name = get_context_name(cluster)
+
+        kubeconfig["clusters"].append({"name": name, "cluster": {
+            "server": cluster["endpoint"].lower(),
+            "certificate-authority-data": cluster["certificateAuthority"]["data"],
+        }})
+        kubeconfig["users"].append({"name": name, "user": {"exec": {
+            "apiVersion": api_version,
+            "command": "aws",
+            "args": ["--region", region, "eks", "get-token",
+                     "--cluster-name", cluster["name"]],
+        }}})
+        kubeconfig["contexts"].append({"name": name, "context": {
+            "cluster": name, "user": name,
+        }})
+
+    return kubeconfig
+
+
+def write_kubeconfig(kubeconfig, filename):
+    folder = os.path.dirname(filename)
+    os.makedirs(folder, exist_ok=True)
+
+    fd, temp_filename = tempfile.mkstemp(dir=folder, prefix=".kubeconfig-")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            yaml.safe_dump(kubeconfig, temp_file, default_flow_style=False)
+        os.chmod(temp_filename, 0o600)
+        os.replace(temp_filename, filename)
+    except Exception:
+        os.remove(temp_filename)
+        raise
+
+    return filename
+
+
+def unjoin_cluster(cluster, host_cluster):
+    name = get_context_name(cluster)
+    host_context = get_context_name(host_cluster)
+    logs.log(f"Unjoining cluster {name} from federation")
+
+    try:
+        exec_command(["kubefedctl", "unjoin", name,
+                      "--cluster-context", name,
+                      "--host-cluster-context", host_context,
+                      "--v=2"], label=f"unjoin-{name}")
+    except Exception as ex:
+        # A member being removed is often unreachable, e.g. because it is
+        # broken. Its KubeFedCluster is deleted from the host so that
+        # nothing is propagated to it anymore, what kubefedctl leaves in
+        # the member is deleted with the cluster
+        logs.warning(f"Can't unjoin cluster {name}, removing it from the host only: {ex}")
+        exec_command(["kubectl", "delete", "kubefedcluster", name,
+                      "--namespace", KUBEFED_NAMESPACE,
+                      "--context", host_context,
+                      "--ignore-not-found"], label=f"unjoin-{name}")
+
+
+def join_clusters(clusters, host_cluster):
+    host_context = get_context_name(host_cluster)
+
+    def join(cluster):
+        name = get_context_name(cluster)
+        logs.log(f"Joining cluster {name} into federation")
+        exec_command(["kubefedctl", "join", name,
+                      "--cluster-context", name,
+                      "--host-cluster-context", host_context,
+                      "--v=2"], label=f"join-{name}")
+
+    with ThreadPoolExecutor(max_workers=len(clusters)) as executor:
+        futures = [executor.submit(join, cluster) for cluster in clusters]
+
+    for future in futures:
+        future.result()
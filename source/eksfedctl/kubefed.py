@@ -0,0 +1,121 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+# Installs the KubeFed control plane with Helm. The chart, CRDs included,
+# is downloaded once per version into the cache folder and installed from
+# there. Can be run on its own against any kubeconfig context, e.g. a kind
+# cluster:
+#
+#   python3 kubefed.py --context kind-kind
+
+import argparse
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+import logs
+import tracing
+from execution import exec_command
+
+KUBEFED_VERSION = os.environ.get("EKSFEDCTL_KUBEFED_VERSION", "0.5.1")
+KUBEFED_CHARTS = "https://raw.githubusercontent.com/kubernetes-sigs/kubefed/master/charts"
+KUBEFED_NAMESPACE = "kube-federation-system"
+KUBEFED_RELEASE = "kubefed"
+
+# Deployments of the chart, the control plane is ready once both are
+# rolled out
+KUBEFED_DEPLOYMENTS = ["kubefed-controller-manager", "kubefed-admission-webhook"]
+ROLLOUT_TIMEOUT = 300
+
+
+def get_chart_folder():
+    return os.path.join(cache.get_cache_folder(), "charts")
+
+
+def get_chart_filename(version=KUBEFED_VERSION):
+    return os.path.join(get_chart_folder(), f"kubefed-{version}.tgz")
+
+
+@tracing.traced()
+def fetch_chart(version=KUBEFED_VERSION):
+    # Charts of a released version never change, the archive is kept for
+    # every later install and downloaded only when it's missing
+    chart_filename = get_chart_filename(version)
+    if os.path.exists(chart_filename):
+        return chart_filename
+
+    logs.log(f"Downloading KubeFed {version} chart to {chart_filename}")
+
+    folder = get_chart_folder()
+    os.makedirs(folder, exist_ok=True)
+
+    # Downloaded next to the cache entry and renamed, concurrent runs never
+    # see a partial archive
+    download_path = tempfile.mkdtemp(dir=folder, prefix=".download-")
+    try:
+        exec_command(["helm", "pull", KUBEFED_RELEASE,
+                      "--repo", KUBEFED_CHARTS,
+                      "--version", version,
+                      "--destination", download_path])
+        os.replace(os.path.join(download_path, f"kubefed-{version}.tgz"), chart_filename)
+    finally:
+        shutil.rmtree(download_path, ignore_errors=True)
+
+    return chart_filename
+
+
+@tracing.traced()
+def install_kubefed(context, version=KUBEFED_VERSION, timeout=ROLLOUT_TIMEOUT):
+    chart_filename = fetch_chart(version)
+
+    logs.log(f"Installing KubeFed {version} into {context}")
+    exec_command(["helm", "upgrade", "--install", KUBEFED_RELEASE, chart_filename,
+                  "--namespace", KUBEFED_NAMESPACE, "--create-namespace",
+                  "--kube-context", context])
+
+    wait_for_rollouts(context, KUBEFED_DEPLOYMENTS, timeout)
+
+
+def wait_for_rollouts(context, deployments, timeout=ROLLOUT_TIMEOUT):
+    # "rollout status" watches the deployment and returns as soon as it's
+    # available, instead of polling every deployment up to a fixed timeout
+    def wait(deployment):
+        exec_command(["kubectl", "rollout", "status", f"deployment/{deployment}",
+                      "--namespace", KUBEFED_NAMESPACE,
+                      "--context", context,
+                      f"--timeout={timeout}s"], label=f"rollout-{deployment}")
+
+    with ThreadPoolExecutor(max_workers=len(deployments)) as executor:
+        futures = [executor.submit(wait, deployment) for deployment in deployments]
+
+    for future in futures:
+        future.result()
+
+    logs.log(f"KubeFed control plane is ready in {context}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install the KubeFed control plane")
+    parser.add_argument("--context", required=True, help="kubeconfig context of the host cluster")
+    parser.add_argument("--version", default=KUBEFED_VERSION, help="KubeFed chart version")
+    parser.add_argument("--timeout", type=int, default=ROLLOUT_TIMEOUT,
+                        help="seconds to wait for every deployment")
+    args = parser.parse_args()
+
+    install_kubefed(args.context, args.version, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+
+from fleet import FederationIndex
+from tables import print_table
+
+
+def process(args):
+    # Answers from the local index only, no AWS calls
+    federations = FederationIndex().list()
+
+    if args.output == "json":
+        print(json.dumps(federations, indent=2))
+        return
+
+    rows = []
+    for federation in federations:
+        resources = federation["resources"]
+        rows.append([federation["name"], federation["status"],
+                     ", ".join(region for region in federation["regions"] if region),
+                     len(resources["cluster"]), len(resources["peering"]),
+                     len(resources["stack"]), federation["updated"]])
+
+    print_table(["NAME", "STATUS", "REGIONS", "CLUSTERS", "PEERINGS", "STACKS", "UPDATED"],
+                rows)
@@ -29,6 +29,16 @@ def log(data):
     print(f"{log_prefix} {data}", flush=True)
 
 
+def warning(data):
+    print(f"{Colors.WARNING}EKSFedCtl Warning: {data}{Colors.CEND}",
+          flush=True, file=sys.stderr)
+
+
 def error(data):
     print(f"{Colors.FAIL}EKSFedCtl Error: {data}{Colors.CEND}",
           flush=True, file=sys.stderr)
+
+
+def output(label, data, is_stderr=False):
+    color = Colors.WARNING if is_stderr else Colors.OKBLUE
+    print(f"{color}[{label}]{Colors.CEND} {data}", flush=True)
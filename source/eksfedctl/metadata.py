@@ -0,0 +1,123 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import json
+import os
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+IMDS_ENDPOINT = "http://169.254.169.254"
+TOKEN_TTL = 21600
+CONNECT_TIMEOUT = 0.5
+READ_TIMEOUT = 2
+
+# Bastion facts that can be supplied instead of being read from IMDS,
+# with their command-line argument and environment variable
+BASTION_ENV = {
+    "region": ("bastion_region", "EKSFEDCTL_BASTION_REGION"),
+    "vpcid": ("bastion_vpc_id", "EKSFEDCTL_BASTION_VPC_ID"),
+    "vpccidr": ("bastion_vpc_cidr", "EKSFEDCTL_BASTION_VPC_CIDR"),
+}
+
+
+class InstanceMetadataClient:
+    # IMDSv2 client, a single keep-alive session and one session token
+    # shared by all requests. Falls back to IMDSv1 when the token endpoint
+    # isn't available
+
+    def __init__(self, endpoint=None):
+        self.endpoint = (endpoint or os.environ.get(
+            "EKSFEDCTL_IMDS_ENDPOINT", IMDS_ENDPOINT)).rstrip("/")
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.token = None
+        self.token_expires = 0
+
+    def get_token(self, refresh=False):
+        with self.lock:
+            if refresh or time.monotonic() >= self.token_expires:
+                self.token = self.fetch_token()
+                # Renew well before IMDS expires the token
+                self.token_expires = time.monotonic() + TOKEN_TTL / 2
+
+            return self.token
+
+    def fetch_token(self):
+        try:
+            response = self.session.put(
+                f"{self.endpoint}/latest/api/token",
+                headers={"X-aws-ec2-metadata-token-ttl-seconds": str(TOKEN_TTL)},
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.exceptions.ConnectionError:
+            raise Exception(
+                f"Instance metadata service {self.endpoint} is not reachable, "
+                "specify the bastion region, VPC ID and VPC CIDR instead")
+
+        if response.status_code in [403, 404, 405]:
+            return None
+
+        response.raise_for_status()
+        return response.text
+
+    def get(self, path):
+        for refresh in [False, True]:
+            token = self.get_token(refresh)
+            headers = {"X-aws-ec2-metadata-token": token} if token else {}
+
+            response = self.session.get(
+                f"{self.endpoint}/latest/{path}", headers=headers,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+            # Expired or revoked token, fetch a new one and retry once
+            if response.status_code == 401 and not refresh:
+                continue
+
+            response.raise_for_status()
+            return response.text
+
+    def get_all(self, paths):
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            return list(executor.map(self.get, paths))
+
+    def get_bastion_metadata(self):
+        metadata = types.SimpleNamespace()
+
+        # The token is fetched once up front instead of by every thread
+        self.get_token()
+
+        identity, mac = self.get_all(
+            ["dynamic/instance-identity/document", "meta-data/mac"])
+        metadata.region = json.loads(identity)["region"]
+        metadata.network_interface = mac.strip()
+
+        interface_path = f"meta-data/network/interfaces/macs/{metadata.network_interface}"
+        metadata.vpcid, metadata.vpccidr = self.get_all(
+            [f"{interface_path}/vpc-id", f"{interface_path}/vpc-ipv4-cidr-block"])
+
+        return metadata
+
+
+def get_bastion_overrides(args):
+    # Command-line arguments take precedence over environment variables
+    overrides = dict()
+    for key, (arg_name, env_name) in BASTION_ENV.items():
+        value = getattr(args, arg_name, None) or os.environ.get(env_name)
+        if value:
+            overrides[key] = value
+
+    return overrides
@@ -0,0 +1,249 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+import logs
+import tracing
+from clients import get_client
+
+FEDERATION_TAG = "eksfedctl:federation"
+PEERING_TIMEOUT = 300
+POLL_DELAY = 2
+
+OPEN_STATES = ["initiating-request", "pending-acceptance", "provisioning", "active"]
+ROUTE_TARGETS = ["VpcPeeringConnectionId", "GatewayId", "NatGatewayId", "TransitGatewayId",
+                 "NetworkInterfaceId", "InstanceId", "LocalGatewayId", "CarrierGatewayId"]
+
+# Subnet type tag read by Vpc.fromLookup()
+SUBNET_TYPE_TAG = "aws-cdk:subnet-type"
+
+
+@tracing.traced()
+def create_native_peering(base_name, name, vpc1region, vpc1id, vpc1cidr,
+                          vpc2region, vpc2id, vpc2cidr):
+    # Same result as the two VpcPeeringConstruct stacks: a peering
+    # connection from vpc1 to vpc2 and routes to the other side in every
+    # route table of both VPCs. Every step is idempotent, re-running it
+    # reuses the existing connection and routes
+    logs.log(f"Creating VPC peering {name}")
+    ec2 = get_client("ec2", vpc1region)
+    peer_ec2 = get_client("ec2", vpc2region)
+    tags = [{"Key": "Name", "Value": name}, {"Key": FEDERATION_TAG, "Value": base_name}]
+
+    peering = find_peering(ec2, vpc1id, vpc2id)
+    if peering is None:
+        peering = ec2.create_vpc_peering_connection(
+            VpcId=vpc1id, PeerVpcId=vpc2id, PeerRegion=vpc2region,
+            TagSpecifications=[{"ResourceType": "vpc-peering-connection",
+                                "Tags": tags}])["VpcPeeringConnection"]
+
+    peering_id = peering["VpcPeeringConnectionId"]
+
+    # The connection shows up in the accepter region asynchronously
+    peer_ec2.get_waiter("vpc_peering_connection_exists").wait(
+        VpcPeeringConnectionIds=[peering_id])
+    peering = wait_for_status(peer_ec2, peering_id,
+                              ["pending-acceptance", "provisioning", "active"])
+
+    if peering["Status"]["Code"] == "pending-acceptance":
+        peer_ec2.accept_vpc_peering_connection(VpcPeeringConnectionId=peering_id)
+
+    # Tags of a cross-region connection aren't replicated to the accepter
+    if vpc1region != vpc2region:
+        peer_ec2.create_tags(Resources=[peering_id], Tags=tags)
+
+    wait_for_status(ec2, peering_id, ["active"])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(add_routes, ec2, vpc1id, vpc2cidr, peering_id),
+                   executor.submit(add_routes, peer_ec2, vpc2id, vpc1cidr, peering_id)]
+
+    for future in futures:
+        future.result()
+
+    return peering_id
+
+
+def find_peering(ec2, vpc1id, vpc2id):
+    peerings = ec2.describe_vpc_peering_connections(Filters=[
+        {"Name": "requester-vpc-info.vpc-id", "Values": [vpc1id]},
+        {"Name": "accepter-vpc-info.vpc-id", "Values": [vpc2id]},
+        {"Name": "status-code", "Values": OPEN_STATES},
+    ])["VpcPeeringConnections"]
+
+    return peerings[0] if peerings else None
+
+
+def wait_for_status(ec2, peering_id, status_codes):
+    deadline = time.monotonic() + PEERING_TIMEOUT
+
+    while True:
+        peering = ec2.describe_vpc_peering_connections(
+            VpcPeeringConnectionIds=[peering_id])["VpcPeeringConnections"][0]
+        status = peering["Status"]["Code"]
+
+        if status in status_codes:
+            return peering
+
+        if status not in OPEN_STATES or time.monotonic() > deadline:
+            raise Exception(
+                f"VPC peering {peering_id} is in \"{status}\" state: "
+                f"{peering['Status'].get('Message', '')}")
+
+        time.sleep(POLL_DELAY)
+
+
+def get_route_tables(ec2, vpc_id):
+    # Same tables as the VpcPeeringConstruct, whose Vpc.fromLookup() keeps
+    # the public and private subnets: the table associated with each subnet,
+    # or the main table of the VPC for a subnet without one. Tables of no
+    # subnet and of isolated subnets get no route
+    subnet_ids = [subnet["SubnetId"] for page in ec2.get_paginator("describe_subnets").paginate(
+                      Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])
+                  for subnet in page["Subnets"]
+                  if get_tag(subnet, SUBNET_TYPE_TAG) != "Isolated"]
+    if not subnet_ids:
+        return []
+
+    tables = describe_route_tables(ec2, vpc_id, "association.subnet-id", subnet_ids)
+    associated = set(association.get("SubnetId") for table in tables
+                     for association in table.get("Associations", []))
+    if not associated.issuperset(subnet_ids):
+        tables.extend(table for table in describe_route_tables(ec2, vpc_id, "association.main", ["true"])
+                      if table["RouteTableId"] not in [val["RouteTableId"] for val in tables])
+
+    return tables
+
+
+def describe_route_tables(ec2, vpc_id, filter_name, values):
+    paginator = ec2.get_paginator("describe_route_tables")
+    return [table for page in paginator.paginate(Filters=[
+        {"Name": "vpc-id", "Values": [vpc_id]},
+        {"Name": filter_name, "Values": values},
+    ]) for table in page["RouteTables"]]
+
+
+def get_tag(resource, key):
+    return next((tag["Value"] for tag in resource.get("Tags", []) if tag["Key"] == key), None)
+
+
+def add_routes(ec2, vpc_id, cidr, peering_id):
+    tables = get_route_tables(ec2, vpc_id)
+    if not tables:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+        futures = [executor.submit(add_route, ec2, table, cidr, peering_id)
+                   for table in tables]
+
+    for future in futures:
+        future.result()
+
+
+def add_route(ec2, table, cidr, peering_id):
+    # A route to the peer CIDR through the same connection is left as is.
+    # Any other target was set up by someone else, e.g. a transit gateway,
+    # and is never replaced
+    for route in table["Routes"]:
+        if route.get("DestinationCidrBlock") == cidr:
+            check_route_target(table, route, peering_id)
+            return
+
+    try:
+        ec2.create_route(RouteTableId=table["RouteTableId"],
+                         DestinationCidrBlock=cidr,
+                         VpcPeeringConnectionId=peering_id)
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "RouteAlreadyExists":
+            raise
+
+        # Added since the table was described
+        table = ec2.describe_route_tables(
+            RouteTableIds=[table["RouteTableId"]])["RouteTables"][0]
+        for route in table["Routes"]:
+            if route.get("DestinationCidrBlock") == cidr:
+                check_route_target(table, route, peering_id)
+
+
+def check_route_target(table, route, peering_id):
+    if route.get("VpcPeeringConnectionId") == peering_id:
+        return
+
+    target = next((route[key] for key in ROUTE_TARGETS if route.get(key)), "unknown")
+    raise Exception(
+        f"Route table {table['RouteTableId']} already routes "
+        f"{route['DestinationCidrBlock']} to {target}, not to VPC peering {peering_id}")
+
+
+def delete_native_peerings(base_name, regions, vpc_ids=None):
+    # Finds the connections by the federation tag, removes the routes
+    # pointing to them and deletes them. With vpc_ids, only the connections
+    # of these VPCs are deleted
+    with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+        found = list(executor.map(
+            lambda region: [(region, peering)
+                            for peering in find_tagged_peerings(region, base_name)
+                            if vpc_ids is None or is_peering_of(peering, vpc_ids)],
+            regions))
+
+    # A cross-region connection is visible from both of its regions
+    peerings = dict()
+    for region, peering in [val for region_peerings in found for val in region_peerings]:
+        peerings.setdefault(peering["VpcPeeringConnectionId"], (region, peering))
+
+    if not peerings:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(peerings)) as executor:
+        futures = [executor.submit(delete_native_peering, region, peering)
+                   for region, peering in peerings.values()]
+
+    for future in futures:
+        future.result()
+
+
+def is_peering_of(peering, vpc_ids):
+    return peering["RequesterVpcInfo"]["VpcId"] in vpc_ids or \
+        peering["AccepterVpcInfo"]["VpcId"] in vpc_ids
+
+
+def find_tagged_peerings(region, base_name):
+    ec2 = get_client("ec2", region)
+    return ec2.describe_vpc_peering_connections(Filters=[
+        {"Name": f"tag:{FEDERATION_TAG}", "Values": [base_name]},
+        {"Name": "status-code", "Values": OPEN_STATES},
+    ])["VpcPeeringConnections"]
+
+
+def delete_native_peering(region, peering):
+    peering_id = peering["VpcPeeringConnectionId"]
+    logs.log(f"Deleting VPC peering {peering_id}")
+
+    for vpc_info in [peering["RequesterVpcInfo"], peering["AccepterVpcInfo"]]:
+        ec2 = get_client("ec2", vpc_info["Region"])
+        tables = ec2.describe_route_tables(Filters=[
+            {"Name": "route.vpc-peering-connection-id", "Values": [peering_id]}
+        ])["RouteTables"]
+
+        for table in tables:
+            for route in table["Routes"]:
+                if route.get("VpcPeeringConnectionId") == peering_id:
+                    ec2.delete_route(RouteTableId=table["RouteTableId"],
+                                     DestinationCidrBlock=route["DestinationCidrBlock"])
+
+    get_client("ec2", region).delete_vpc_peering_connection(
+        VpcPeeringConnectionId=peering_id)
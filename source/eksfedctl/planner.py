@@ -0,0 +1,76 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import ipaddress
+import itertools
+import types
+
+BASTION = 0
+
+
+def get_vpc_cidrs(count, reserved=()):
+    # Cluster VPCs keep the historical 172.2{index}.0.0/16 ranges and
+    # continue with 10.{n}.0.0/16 past index 9. Ranges overlapping a
+    # reserved CIDR, e.g. the bastion VPC, are skipped. The allocation is
+    # deterministic, adding a cluster never moves the existing ones
+    reserved = [ipaddress.ip_network(cidr) for cidr in reserved]
+    candidates = itertools.chain(
+        (f"172.2{index}.0.0/16" for index in range(1, 10)),
+        (f"10.{index}.0.0/16" for index in range(256)))
+
+    cidrs = []
+    for candidate in candidates:
+        if len(cidrs) == count:
+            return cidrs
+
+        network = ipaddress.ip_network(candidate)
+        if not any(network.overlaps(val) for val in reserved):
+            cidrs.append(candidate)
+
+    raise Exception(f"Can't allocate {count} non-overlapping VPC CIDRs")
+
+
+def get_members(regions):
+    # Cluster numbers and regions of the current members. Numbers of
+    # removed clusters are never reused, their region is None
+    return [(idx + 1, region) for idx, region in enumerate(regions) if region]
+
+
+def plan_peerings(count):
+    # Full mesh between the clusters plus a peering from the bastion to
+    # every cluster. Endpoints are cluster numbers, BASTION is the bastion
+    # VPC. Every unordered pair is planned once, with the lower endpoint
+    # as the requester
+    return [types.SimpleNamespace(
+        name=get_peering_task_name(requester, accepter),
+        requester=requester, accepter=accepter)
+        for requester, accepter in itertools.combinations(range(count + 1), 2)]
+
+
+def get_peering_task_name(endpoint1, endpoint2):
+    if endpoint1 == BASTION:
+        return f"peering-bastion-{endpoint2}"
+
+    return f"peering-clusters-{endpoint1}-{endpoint2}"
+
+
+def get_peering_stack_name(base_name, requester, accepter, accepter_vpc_id):
+    if requester == BASTION:
+        return f"{base_name}-peering-bastion-{accepter_vpc_id}"
+
+    # The first pair keeps the stack name of two-region federations
+    if (requester, accepter) == (1, 2):
+        return f"{base_name}-peering-clusters"
+
+    return f"{base_name}-peering-clusters-{requester}-{accepter}"
@@ -0,0 +1,165 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cache
+import logs
+from clients import get_client
+
+PROBE_TIMEOUT = 3
+QUOTA_TTL = 3600
+
+# Service Quotas codes. A quota that can't be read, e.g. without the
+# servicequotas:GetServiceQuota permission, isn't checked: defaults would
+# reject accounts whose limits were raised
+QUOTAS = {
+    "vpcs": ("vpc", "L-F678F1CE"),
+    "eips": ("ec2", "L-0263D0A3"),
+    "clusters": ("eks", "L-1194D53C"),
+}
+
+
+def run_preflight(config, regions=None):
+    # All probes run concurrently with a short timeout and every failure
+    # is reported at once, before anything gets deployed. Only the given
+    # regions are probed when clusters are added to a federation
+    regions = regions or config.yaml["metadata"]["regions"]
+    required = get_required_resources(config)
+
+    probes = {"regions": lambda: check_regions(config.bastion.region, regions),
+              "cidrs": lambda: check_cidrs(config.bastion.vpccidr, config.cidrs)}
+    for region in regions:
+        probes[f"eks-{region}"] = lambda region=region: check_eks_access(region)
+        for resource in QUOTAS:
+            probes[f"{resource}-{region}"] = \
+                lambda region=region, resource=resource: check_member_quota(
+                    config, region, resource, required[resource])
+
+    # Probes that hang are abandoned instead of being waited for
+    executor = ThreadPoolExecutor(max_workers=len(probes))
+    futures = {name: executor.submit(probe) for name, probe in probes.items()}
+    wait(futures.values(), timeout=PROBE_TIMEOUT * 3)
+    executor.shutdown(wait=False)
+
+    errors = []
+    for name, future in futures.items():
+        if not future.done():
+            errors.append(f"Pre-flight check \"{name}\" timed out")
+        elif future.exception():
+            errors.append(str(future.exception()))
+
+    if errors:
+        raise Exception("Pre-flight checks failed:\n  " + "\n  ".join(errors))
+
+    logs.log(f"Pre-flight checks passed for {', '.join(regions)}")
+
+
+def get_required_resources(config):
+    nat = config.spec.get("vpc", {}).get("nat", {}).get("gateway", "Single")
+    eips = {"Disable": 0, "HighlyAvailable": 3}.get(nat, 1)
+
+    return {"vpcs": 1, "eips": eips, "clusters": 1}
+
+
+def check_regions(bastion_region, regions):
+    ec2 = get_client("ec2", bastion_region, PROBE_TIMEOUT)
+    region_names = cache.cached(
+        f"regions-{bastion_region}", cache.DAY,
+        lambda: [val["RegionName"] for val in ec2.describe_regions()["Regions"]])
+
+    for region in regions:
+        if region not in region_names:
+            raise Exception(f"Region \"{region}\" is not valid")
+
+
+def check_cidrs(bastion_cidr, cidrs):
+    networks = [("bastion VPC", ipaddress.ip_network(bastion_cidr))]
+    networks += [(f"cluster {idx+1} VPC", ipaddress.ip_network(cidr))
+                 for idx, cidr in enumerate(cidrs)]
+
+    for idx, (name1, network1) in enumerate(networks):
+        for name2, network2 in networks[idx+1:]:
+            if network1.overlaps(network2):
+                raise Exception(
+                    f"CIDR {network1} of {name1} overlaps with {network2} of {name2}")
+
+
+def check_eks_access(region):
+    try:
+        get_client("eks", region, PROBE_TIMEOUT).list_clusters()
+    except Exception:
+        raise Exception(f"Can't access EKS service in \"{region}\"")
+
+
+def check_quota(region, resource, required):
+    service, quota_code = QUOTAS[resource]
+    limit = get_quota(region, service, quota_code)
+    if limit is None:
+        return
+
+    used = count_resources(region, resource)
+
+    if used + required > limit:
+        raise Exception(
+            f"Not enough {resource} quota in \"{region}\": "
+            f"{used} used, {required} required, limit is {limit}")
+
+
+def check_member_quota(config, region, resource, required):
+    # The cluster of a member that already exists, e.g. resumed or adopted
+    # by --resume, is counted in the usage with its VPC and addresses
+    if member_exists(config, region):
+        required = 0
+
+    check_quota(region, resource, required)
+
+
+def member_exists(config, region):
+    metadata = config.yaml["metadata"]
+    cluster_name = f"{metadata['name']}-{metadata['regions'].index(region) + 1}"
+    eks = get_client("eks", region, PROBE_TIMEOUT)
+    return any(cluster_name in page["clusters"]
+               for page in eks.get_paginator("list_clusters").paginate())
+
+
+def get_quota(region, service, quota_code):
+    quotas = get_client("service-quotas", region, PROBE_TIMEOUT)
+
+    def fetch():
+        quota = quotas.get_service_quota(ServiceCode=service, QuotaCode=quota_code)
+        return int(quota["Quota"]["Value"])
+
+    try:
+        return cache.cached(f"quota-{region}-{service}-{quota_code}", QUOTA_TTL, fetch)
+    except Exception as ex:
+        logs.warning(f"Can't read {service} quota {quota_code} in \"{region}\", "
+                     f"skipping its check: {ex}")
+        return None
+
+
+def count_resources(region, resource):
+    if resource == "vpcs":
+        ec2 = get_client("ec2", region, PROBE_TIMEOUT)
+        return sum(len(page["Vpcs"])
+                   for page in ec2.get_paginator("describe_vpcs").paginate())
+
+    if resource == "eips":
+        ec2 = get_client("ec2", region, PROBE_TIMEOUT)
+        return len(ec2.describe_addresses()["Addresses"])
+
+    eks = get_client("eks", region, PROBE_TIMEOUT)
+    return sum(len(page["clusters"])
+               for page in eks.get_paginator("list_clusters").paginate())
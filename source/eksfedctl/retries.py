@@ -0,0 +1,161 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+import random
+import re
+import threading
+import time
+
+import logs
+import tracing
+
+MAX_ATTEMPTS = int(os.environ.get("EKSFEDCTL_COMMAND_MAX_ATTEMPTS", "4"))
+BASE_DELAY = 2
+MAX_DELAY = 60
+
+# Sustained requests per second and burst of the AWS APIs per service and
+# region, shared by all the clients of the process
+API_RATES = {
+    "cloudformation": (5, 10),
+    "eks": (10, 20),
+    "ec2": (20, 40),
+    "service-quotas": (5, 10),
+}
+DEFAULT_API_RATE = (10, 20)
+
+# Output of the command-line tools that means the same command can succeed
+# when it's run again: throttling, transient service and network errors.
+# Fatal patterns win, e.g. a throttled eksctl run that already created its
+# stack fails with AlreadyExists on the retry and must not be retried again
+RETRYABLE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"Throttling", r"Rate exceeded", r"RequestLimitExceeded",
+    r"TooManyRequests", r"SlowDown", r"RequestTimeout",
+    r"ServiceUnavailable", r"InternalFailure", r"InternalError",
+    r"connection reset by peer", r"connection refused", r"broken pipe",
+    r"i/o timeout", r"TLS handshake timeout", r"unexpected EOF",
+    r"Unable to connect to the server", r"no such host",
+    r"the server is currently unable to handle the request",
+    r"etcdserver: request timed out",
+    r"ETIMEDOUT", r"ECONNRESET", r"EAI_AGAIN",
+]]
+FATAL_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r"AlreadyExists", r"already exists", r"AccessDenied",
+    r"UnauthorizedOperation", r"ValidationError", r"InvalidParameter",
+    r"(?<!Request)LimitExceeded", r"not authorized",
+]]
+# Not found, not executable and the signals used to cancel commands
+FATAL_RETURNCODES = [126, 127, -2, -9, -15]
+
+_buckets = dict()
+_buckets_lock = threading.Lock()
+_counts = dict()
+_counts_lock = threading.Lock()
+
+
+class TokenBucket:
+    # Classic token bucket, rate tokens per second up to capacity. acquire
+    # blocks until a token is available so that concurrent tasks queue up
+    # instead of running into the service throttling
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def get_bucket(service, region):
+    key = (service, region)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(*API_RATES.get(service, DEFAULT_API_RATE))
+
+        return _buckets[key]
+
+
+def get_delay(attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1)))
+
+
+def classify_command(result):
+    # Returns the reason to retry a failed command or None when it's fatal
+    if result.timed_out or result.returncode in FATAL_RETURNCODES:
+        return None
+
+    lines = result.stderr + result.stdout
+    if any(pattern.search(line) for pattern in FATAL_PATTERNS for line in lines):
+        return None
+
+    for line in reversed(lines):
+        if any(pattern.search(line) for pattern in RETRYABLE_PATTERNS):
+            return line.strip()
+
+    return None
+
+
+def call(func, classify, description, label=None, max_attempts=MAX_ATTEMPTS,
+         cancelled=None):
+    # Calls func until it succeeds, classify returns None for the exception
+    # or the attempts are exhausted. The backoff is cut short by cancelled
+    attempt = 1
+    while True:
+        try:
+            return func()
+        except Exception as ex:
+            reason = classify(ex)
+            if reason is None or attempt >= max_attempts:
+                raise
+
+            delay = get_delay(attempt)
+            record_retries(label)
+            logs.log(f"Retrying {description} in {delay:.1f}s "
+                     f"(attempt {attempt + 1}/{max_attempts}): {reason}")
+
+            if cancelled is not None:
+                if cancelled.wait(delay):
+                    raise
+            else:
+                time.sleep(delay)
+
+            attempt += 1
+
+
+def record_retries(label, count=1):
+    with _counts_lock:
+        _counts[label or "main"] = _counts.get(label or "main", 0) + count
+
+    tracing.add_retry(count)
+
+
+def get_retry_count(label):
+    with _counts_lock:
+        return _counts.get(label, 0)
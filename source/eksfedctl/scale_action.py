@@ -0,0 +1,95 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import sys
+
+import cache
+from create_action import check_tmux_session
+from errors import ArgumentError
+from planner import get_members
+from preflight import run_preflight
+from scale_script import add_regions, load_federation, plan_added_regions, remove_regions
+
+
+def process_add(args):
+    check_tmux_session()
+
+    if args.no_cache:
+        cache.disable()
+
+    config, state = load_federation(args.name, args.file)
+    validate_added_regions(config, state, args.regions)
+
+    # The CIDRs of the new clusters are checked along with the existing ones
+    plan_added_regions(config, args.regions)
+    run_preflight(config, args.regions)
+
+    add_regions(config, state, args.regions)
+
+
+def process_remove(args):
+    config, state = load_federation(args.name)
+    validate_removed_regions(config, args.regions)
+
+    if not confirm_remove(args.name, args.regions):
+        sys.exit()
+
+    remove_regions(config, state, args.regions)
+
+
+def validate_added_regions(config, state, regions):
+    name = config.yaml["metadata"]["name"]
+    members = [region for _, region in get_members(config.yaml["metadata"]["regions"])]
+    pending = state.data["metadata"].get("pending", [])
+
+    if len(set(regions)) != len(regions):
+        raise ArgumentError("Please specify every region only once")
+
+    # Regions whose previous add failed are resumed
+    existing = [region for region in regions if region in members and region not in pending]
+    if existing:
+        raise ArgumentError(
+            f"Regions {', '.join(existing)} are already members of federation {name}")
+
+
+def validate_removed_regions(config, regions):
+    name = config.yaml["metadata"]["name"]
+    members = [region for _, region in get_members(config.yaml["metadata"]["regions"])]
+
+    if len(set(regions)) != len(regions):
+        raise ArgumentError("Please specify every region only once")
+
+    unknown = [region for region in regions if region not in members]
+    if unknown:
+        raise ArgumentError(
+            f"Regions {', '.join(unknown)} are not members of federation {name}")
+
+    if members[0] in regions:
+        raise ArgumentError(
+            f"Region {members[0]} hosts the KubeFed control plane and can't be removed")
+
+    if len(members) - len(regions) < 2:
+        raise ArgumentError("A federation needs at least 2 regions, "
+                            "destroy it to remove all of them")
+
+
+def confirm_remove(name, regions):
+    question = f"Do you want to remove {', '.join(regions)} from federation {name}? [y/N]: "
+    answer = ""
+
+    while answer not in ["y", "n"]:
+        answer = str(input(question)).lower().strip()
+        if answer == "":
+            return False
+
+    return answer == "y"
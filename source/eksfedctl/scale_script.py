@@ -0,0 +1,356 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import types
+
+import logs
+from cdk_app import prepare_app
+from clients import get_client
+from compiler import compile_config, get_default_template_filename, render_cluster_configs
+from create_script import (PEERING_CONCURRENCY, authorize_cluster_ingress, create_cluster,
+                           create_planned_peering, delete_cluster, disable_cluster_public_access,
+                           get_availability_zones, reconcile_clusters, record_federation,
+                           revoke_cluster_ingress, write_output_config)
+from destroy_script import delete_stacks
+from fleet import FederationIndex, get_output_config
+from inventory import StackInventory
+from kubeconfig import build_kubeconfig, get_kubeconfig_filename, join_clusters, \
+    unjoin_cluster, write_kubeconfig
+from peering_native import delete_native_peerings
+from planner import BASTION, get_members, get_peering_stack_name, get_vpc_cidrs, plan_peerings
+from scheduler import TaskGraph
+from state import FederationState
+
+
+def load_federation(name, template_file=None):
+    # Config of a live federation rebuilt from its state file: the bastion,
+    # the member regions and the template recorded by create. Federations
+    # created before the template was recorded use the default template
+    state = FederationState(name)
+    if not state.exists():
+        raise Exception(f"State file {state.filename} not found, "
+                        f"federation \"{name}\" wasn't created from this host")
+
+    metadata = state.load().data["metadata"]
+    template = metadata.get("template")
+    if template_file or not template:
+        template = compile_config(get_default_template_filename(), template_file)
+
+    config = types.SimpleNamespace()
+    config.bastion = types.SimpleNamespace(**metadata["bastion"])
+    config.yaml = {**template["yaml"], "metadata": {
+        **template["yaml"]["metadata"], "name": name, "regions": list(metadata["regions"])}}
+    config.spec = template["spec"]
+    config.peering_engine = metadata.get("peering_engine") or get_peering_engine(name)
+    config.cidrs = get_vpc_cidrs(len(metadata["regions"]), [config.bastion.vpccidr])
+
+    return config, state
+
+
+def get_peering_engine(name):
+    federation = FederationIndex().get(name)
+    return (federation or {}).get("peering_engine") or "cdk"
+
+
+def plan_added_regions(config, new_regions):
+    # New clusters get the next numbers and CIDRs, the existing members
+    # keep theirs. A region whose previous add failed keeps its number.
+    # Returns the numbers of the new clusters
+    regions = config.yaml["metadata"]["regions"]
+    for region in new_regions:
+        if region not in regions:
+            regions.append(region)
+
+    config.cidrs = get_vpc_cidrs(len(regions), [config.bastion.vpccidr])
+    return [regions.index(region) + 1 for region in new_regions]
+
+
+def add_regions(config, state, new_regions):
+    metadata = config.yaml["metadata"]
+    regions = metadata["regions"]
+    numbers = plan_added_regions(config, new_regions)
+
+    pending = sorted(set(state.data["metadata"].get("pending", []) + new_regions))
+    state.set_metadata(regions=regions, pending=pending)
+
+    logs.log(f"Adding {', '.join(new_regions)} to federation {metadata['name']}...")
+
+    index = FederationIndex()
+    index.upsert(metadata["name"], "updating", regions, config.bastion.region,
+                 config.peering_engine)
+
+    graph = build_add_graph(config, state, numbers)
+
+    try:
+        graph.run()
+    except Exception:
+        record_federation(index, config, state, "update-failed")
+        raise
+
+    state.set_metadata(pending=[region for region in pending if region not in new_regions])
+    update_federation(index, config, state)
+
+    logs.log(f"Done. {', '.join(new_regions)} joined federation {metadata['name']}")
+
+
+def build_add_graph(config, state, numbers):
+    metadata = config.yaml["metadata"]
+    regions = metadata["regions"]
+    members = get_members(regions)
+    cidrs = [config.bastion.vpccidr] + [config.cidrs[number-1] for number, _ in members]
+
+    graph = TaskGraph(max_workers=2 * len(members) + PEERING_CONCURRENCY + 2,
+                      state=state)
+
+    if config.peering_engine != "native":
+        graph.add("cdk-app", lambda results: prepare_app(), checkpoint=False)
+    graph.add("reconcile-clusters",
+              lambda results: reconcile_clusters(config, state, True),
+              checkpoint=False)
+
+    new_regions = [regions[number-1] for number in numbers]
+    for region in new_regions:
+        graph.add(f"zones-{region}",
+                  lambda results, region=region: get_availability_zones(region),
+                  checkpoint=False)
+
+    graph.add("render-configs",
+              lambda results: render_cluster_configs(config, {
+                  region: results[f"zones-{region}"] for region in new_regions}),
+              requires=[f"zones-{region}" for region in new_regions],
+              checkpoint=False)
+
+    for number, region in members:
+        if number not in numbers:
+            # Recorded by the run that created the member, only described
+            # again when the state lacks it
+            graph.add(f"cluster-{number}",
+                      lambda results, number=number, region=region: describe_member(
+                          config, number, region))
+            continue
+
+        cluster_name = f"{metadata['name']}-{number}"
+        graph.add(f"cluster-{number}",
+                  lambda results, number=number, region=region: create_cluster(
+                      config, region, results["render-configs"][region],
+                      results["reconcile-clusters"][f"cluster-{number}"] == "adopt"),
+                  requires=["reconcile-clusters", "render-configs"],
+                  rollback=lambda results, cluster_name=cluster_name, region=region:
+                      delete_cluster(cluster_name, region))
+
+    # Only the peerings of the new clusters, to the bastion, the existing
+    # members and each other. cdk-batch federations get one CDK app run per
+    # peering here, the stacks are the same
+    graph.limit("peering", PEERING_CONCURRENCY)
+    peerings = [peering for peering in plan_peerings(len(regions))
+                if {peering.requester, peering.accepter} & set(numbers) and
+                all(endpoint == BASTION or regions[endpoint-1]
+                    for endpoint in [peering.requester, peering.accepter])]
+    cdk_tasks = [] if config.peering_engine == "native" else ["cdk-app"]
+
+    for peering in peerings:
+        graph.add(peering.name,
+                  lambda results, peering=peering: create_planned_peering(
+                      config, results, peering, results.get("cdk-app")),
+                  requires=cdk_tasks + [
+                      f"cluster-{endpoint}" for endpoint in
+                      [peering.requester, peering.accepter] if endpoint != BASTION],
+                  group="peering")
+
+    # Every member accepts HTTPS from every member VPC and the bastion.
+    # Authorizing is idempotent and runs again on every add
+    for number, region in members:
+        graph.add(f"ingress-{number}",
+                  lambda results, number=number, region=region: authorize_cluster_ingress(
+                      region, results[f"cluster-{number}"], cidrs),
+                  requires=[f"cluster-{number}"],
+                  checkpoint=False)
+
+    for number in numbers:
+        graph.add(f"disable-public-access-{number}",
+                  lambda results, number=number: disable_cluster_public_access(
+                      regions[number-1], results[f"cluster-{number}"]),
+                  requires=[f"ingress-{number}"] + [
+                      peering.name for peering in peerings
+                      if number in [peering.requester, peering.accepter]])
+
+    graph.add("kubeconfig",
+              lambda results: update_kubeconfig(config, results),
+              requires=[f"cluster-{number}" for number, _ in members],
+              checkpoint=False)
+
+    # The first member hosts the KubeFed control plane
+    host_number = members[0][0]
+    for number in numbers:
+        graph.add(f"join-{number}",
+                  lambda results, number=number: join_clusters(
+                      [results[f"cluster-{number}"]], results[f"cluster-{host_number}"]),
+                  requires=["kubeconfig", f"disable-public-access-{number}"] + [
+                      f"ingress-{member}" for member, _ in members])
+
+    return graph
+
+
+def describe_member(config, number, region):
+    cluster_name = f"{config.yaml['metadata']['name']}-{number}"
+    eks = get_client("eks", region)
+    return eks.describe_cluster(name=cluster_name)["cluster"]
+
+
+def update_kubeconfig(config, results):
+    members = get_members(config.yaml["metadata"]["regions"])
+    kubeconfig = build_kubeconfig([region for _, region in members],
+                                  [results[f"cluster-{number}"] for number, _ in members])
+    return write_kubeconfig(kubeconfig, get_kubeconfig_filename())
+
+
+def update_federation(index, config, state):
+    metadata = config.yaml["metadata"]
+    index.upsert(metadata["name"], "active", metadata["regions"],
+                 config.bastion.region, config.peering_engine)
+
+    output_config = get_output_config({"name": metadata["name"],
+                                       "bastion_region": config.bastion.region,
+                                       "regions": metadata["regions"]})
+    output_filename = write_output_config(config, output_config)
+    record_federation(index, config, state, "active", output_filename)
+
+
+def remove_regions(config, state, removed_regions):
+    metadata = config.yaml["metadata"]
+    base_name = metadata["name"]
+    regions = metadata["regions"]
+    numbers = [regions.index(region) + 1 for region in removed_regions]
+    remaining = [(number, region) for number, region in get_members(regions)
+                 if number not in numbers]
+    host_number = remaining[0][0]
+    steps = state.data["steps"]
+
+    logs.log(f"Removing {', '.join(removed_regions)} from federation {base_name}...")
+
+    index = FederationIndex()
+    index.set_status(base_name, "updating")
+
+    # Clusters whose add failed early may not exist, their step is missing
+    clusters = {number: steps.get(f"cluster-{number}") for number in numbers}
+    removed_cidrs = [config.cidrs[number-1] for number in numbers]
+    peerings = [peering for peering in plan_peerings(len(regions))
+                if {peering.requester, peering.accepter} & set(numbers)]
+
+    inventory = StackInventory().refresh(
+        [region for _, region in get_members(regions)] + [config.bastion.region])
+
+    graph = TaskGraph(max_workers=2 * len(numbers) + len(remaining) + 1)
+
+    # Members whose add failed were never joined
+    pending = state.data["metadata"].get("pending", [])
+    for number in numbers:
+        joined = clusters[number] and regions[number-1] not in pending
+        graph.add(f"unjoin-{number}",
+                  lambda results, number=number, joined=joined: joined and unjoin_cluster(
+                      clusters[number], steps[f"cluster-{host_number}"]))
+
+    unjoin_tasks = [f"unjoin-{number}" for number in numbers]
+
+    for number, region in remaining:
+        graph.add(f"ingress-{number}",
+                  lambda results, number=number, region=region: revoke_cluster_ingress(
+                      region, steps[f"cluster-{number}"], removed_cidrs),
+                  requires=unjoin_tasks)
+
+    graph.add("delete-peerings",
+              lambda results: delete_member_peerings(
+                  config, steps, peerings, clusters, inventory),
+              requires=unjoin_tasks)
+
+    for number in numbers:
+        graph.add(f"delete-cluster-{number}",
+                  lambda results, number=number: delete_member_stacks(
+                      base_name, number, regions[number-1], inventory),
+                  requires=["delete-peerings", f"unjoin-{number}"])
+
+    try:
+        graph.run()
+    except Exception:
+        index.set_status(base_name, "update-failed")
+        raise
+
+    # The slots of the removed clusters stay empty, the remaining members
+    # keep their numbers, names and CIDRs
+    for number in numbers:
+        regions[number-1] = None
+
+    state.forget([f"cluster-{number}" for number in numbers] +
+                 [f"disable-public-access-{number}" for number in numbers] +
+                 [f"join-{number}" for number in numbers] +
+                 [peering.name for peering in peerings])
+    if isinstance(steps.get("peerings"), dict):
+        state.record("peerings", {name: peering_id for name, peering_id
+                                  in steps["peerings"].items()
+                                  if name not in [peering.name for peering in peerings]})
+
+    state.set_metadata(regions=regions,
+                       pending=[region for region in pending if region not in removed_regions])
+
+    write_kubeconfig(build_kubeconfig(
+        [region for _, region in remaining],
+        [steps[f"cluster-{number}"] for number, _ in remaining]), get_kubeconfig_filename())
+    update_federation(index, config, state)
+
+    logs.log(f"Done. {', '.join(removed_regions)} removed from federation {base_name}")
+
+
+def delete_member_peerings(config, steps, peerings, clusters, inventory):
+    # Stacks of the CDK engines and tagged connections of the native one
+    base_name = config.yaml["metadata"]["name"]
+    regions = config.yaml["metadata"]["regions"]
+    stacks = []
+
+    for peering in peerings:
+        accepter = steps.get(f"cluster-{peering.accepter}")
+        if not accepter:
+            continue
+
+        requester_region = config.bastion.region if peering.requester == BASTION \
+            else regions[peering.requester-1]
+        stack_name = get_peering_stack_name(
+            base_name, peering.requester, peering.accepter,
+            accepter["resourcesVpcConfig"]["vpcId"])
+
+        for region, name in [(requester_region, f"{stack_name}-1"),
+                             (regions[peering.accepter-1], f"{stack_name}-2")]:
+            stacks.extend((region, stack) for stack in
+                          inventory.stacks(region, base_name, "peering")
+                          if stack["StackName"] == name)
+
+    logs.log(f"Deleting {len(stacks)} peering stacks of {base_name}")
+    delete_stacks(inventory, stacks)
+
+    vpc_ids = [cluster["resourcesVpcConfig"]["vpcId"]
+               for cluster in clusters.values() if cluster]
+    if vpc_ids:
+        peering_regions = sorted(set([config.bastion.region] + [
+            region for _, region in get_members(regions)]))
+        delete_native_peerings(base_name, peering_regions, vpc_ids)
+
+
+def delete_member_stacks(base_name, number, region, inventory):
+    # Nodegroups have to be gone before the cluster stack can be deleted
+    prefix = f"eksctl-{base_name}-{number}-"
+
+    for phase in ["nodegroup", "cluster"]:
+        stacks = [(region, stack) for stack in inventory.stacks(region, base_name, phase)
+                  if stack["StackName"].startswith(prefix)]
+
+        logs.log(f"Deleting {phase} stacks of {base_name}-{number} in {region}")
+        delete_stacks(inventory, stacks)
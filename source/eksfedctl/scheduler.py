@@ -0,0 +1,231 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import logs
+import tracing
+from execution import terminate_commands, reset_cancellation, set_label
+from retries import get_retry_count
+
+
+FINISHED = ("done", "resumed")
+
+
+class TaskGraph:
+    def __init__(self, max_workers=8, state=None):
+        self.max_workers = max_workers
+        self.state = state
+        self.tasks = dict()
+        self.limits = dict()
+
+    def limit(self, group, max_running):
+        # Caps the number of tasks of the group that run at the same time
+        self.limits[group] = max_running
+
+    def add(self, name, func, requires=(), rollback=None, checkpoint=True,
+            group=None):
+        # func receives the results of all finished tasks keyed by task name,
+        # rollback receives the same and is called when the task was
+        # interrupted by the failure of another task. Results of checkpointed
+        # tasks are recorded in the state and not recomputed on resume
+        if name in self.tasks:
+            raise ValueError(f"Task \"{name}\" is already defined")
+
+        self.tasks[name] = types.SimpleNamespace(
+            name=name, func=func, requires=list(requires), rollback=rollback,
+            checkpoint=checkpoint, group=group,
+            start=None, end=None, status="pending")
+
+    def validate(self):
+        for task in self.tasks.values():
+            for dependency in task.requires:
+                if dependency not in self.tasks:
+                    raise ValueError(
+                        f"Task \"{task.name}\" requires unknown task \"{dependency}\"")
+
+        visited = set()
+        path = set()
+
+        def visit(name):
+            if name in path:
+                raise ValueError(f"Dependency cycle detected at task \"{name}\"")
+            if name in visited:
+                return
+
+            path.add(name)
+            for dependency in self.tasks[name].requires:
+                visit(dependency)
+            path.discard(name)
+            visited.add(name)
+
+        for name in self.tasks:
+            visit(name)
+
+    def run(self):
+        self.validate()
+
+        results = dict()
+        running = dict()
+        failure = None
+        interrupted = False
+        self.started_at = time.monotonic()
+        parent = tracing.get_current_span()
+
+        if self.state:
+            for task in self.tasks.values():
+                if task.checkpoint and self.state.is_done(task.name):
+                    task.status = "resumed"
+                    results[task.name] = self.state.get(task.name)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                if failure is None:
+                    for task in self.ready_tasks():
+                        task.status = "running"
+                        task.start = time.monotonic()
+                        future = executor.submit(
+                            run_labeled, task.name, task.func, dict(results), parent)
+                        running[future] = task
+
+                if not running:
+                    break
+
+                try:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                except (KeyboardInterrupt, SystemExit) as ex:
+                    # Interrupted by the user: no new task is started, the
+                    # running ones are stopped and nothing is rolled back,
+                    # the run can be resumed
+                    logs.log("Interrupted, stopping the running tasks")
+                    terminate_commands()
+                    if not interrupted:
+                        failure = ex
+                    interrupted = True
+                    continue
+
+                for future in done:
+                    task = running.pop(future)
+                    task.end = time.monotonic()
+
+                    if future.exception() is None:
+                        task.status = "done"
+                        results[task.name] = future.result()
+                        if self.state and task.checkpoint:
+                            self.state.record(task.name, results[task.name])
+                    elif failure is None and not interrupted:
+                        task.status = "failed"
+                        failure = future.exception()
+                        logs.error(f"Task \"{task.name}\" failed: {failure}")
+
+                        # Cancel the tasks that are still running
+                        terminate_commands()
+                    else:
+                        task.status = "interrupted"
+
+            if failure is not None and not interrupted:
+                reset_cancellation()
+                self.rollback(executor, results)
+
+        self.print_summary()
+
+        if failure is not None:
+            raise failure
+
+        return results
+
+    def ready_tasks(self):
+        running = dict()
+        for task in self.tasks.values():
+            if task.status == "running":
+                running[task.group] = running.get(task.group, 0) + 1
+
+        ready = []
+        for task in self.tasks.values():
+            if task.status != "pending" or not all(
+                    self.tasks[dependency].status in FINISHED
+                    for dependency in task.requires):
+                continue
+
+            if task.group in self.limits:
+                if running.get(task.group, 0) >= self.limits[task.group]:
+                    continue
+                running[task.group] = running.get(task.group, 0) + 1
+
+            ready.append(task)
+
+        return ready
+
+    def rollback(self, executor, results):
+        interrupted = [task for task in self.tasks.values()
+                       if task.status == "interrupted" and task.rollback]
+
+        futures = dict()
+        for task in interrupted:
+            logs.log(f"Rolling back task \"{task.name}\"")
+            futures[executor.submit(
+                run_labeled, f"{task.name}-rollback", task.rollback, dict(results))] = task
+
+        for future in futures:
+            if future.exception() is not None:
+                logs.error(
+                    f"Rollback of task \"{futures[future].name}\" failed: {future.exception()}")
+
+    def critical_path(self):
+        finished = [task for task in self.tasks.values() if task.end is not None]
+        if not finished:
+            return []
+
+        path = []
+        task = max(finished, key=lambda val: val.end)
+        while task:
+            path.append(task.name)
+            dependencies = [self.tasks[name] for name in task.requires
+                            if self.tasks[name].end is not None]
+            task = max(dependencies, key=lambda val: val.end) if dependencies else None
+
+        return list(reversed(path))
+
+    def print_summary(self):
+        critical_path = self.critical_path()
+        width = max([len(name) for name in self.tasks] + [4])
+
+        logs.log("Task timing summary:")
+        logs.log(f"  {'TASK':<{width}}  {'STATUS':<11}  {'START':>8}  {'DURATION':>9}  "
+                 f"{'RETRIES':>7}")
+        for task in sorted(self.tasks.values(),
+                           key=lambda val: (val.start is None, val.start or 0)):
+            if task.start is None:
+                logs.log(f"  {task.name:<{width}}  {task.status:<11}")
+                continue
+
+            start = task.start - self.started_at
+            duration = (task.end or time.monotonic()) - task.start
+            marker = " *" if task.name in critical_path else ""
+            logs.log(f"  {task.name:<{width}}  {task.status:<11}  "
+                     f"{start:>7.1f}s  {duration:>8.1f}s  "
+                     f"{get_retry_count(task.name):>7}{marker}")
+
+        logs.log(f"Critical path (*): {' -> '.join(critical_path)}")
+
+
+def run_labeled(label, func, results, parent=None):
+    # Output of the commands started by the task is prefixed with its name
+    set_label(label)
+    try:
+        with tracing.span(f"task {label}", parent=parent):
+            return func(results)
+    finally:
+        set_label(None)
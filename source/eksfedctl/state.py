@@ -0,0 +1,81 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+import os
+import tempfile
+import threading
+
+
+def get_state_filename(name):
+    home_folder = os.path.expanduser("~")
+    return os.path.join(home_folder, f"{name}.state.json")
+
+
+class FederationState:
+    def __init__(self, name):
+        self.filename = get_state_filename(name)
+        self.lock = threading.Lock()
+        self.data = {"metadata": {}, "steps": {}}
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def load(self):
+        try:
+            with open(self.filename, "r") as state_file:
+                self.data = json.load(state_file)
+        except (IOError, ValueError) as ex:
+            raise Exception(f"Can't read state file {self.filename}: {ex}")
+
+        return self
+
+    def is_done(self, step):
+        with self.lock:
+            return step in self.data["steps"]
+
+    def get(self, step, default=None):
+        with self.lock:
+            return self.data["steps"].get(step, default)
+
+    def set_metadata(self, **kwargs):
+        with self.lock:
+            self.data["metadata"].update(kwargs)
+            self.save()
+
+    def record(self, step, result):
+        with self.lock:
+            # Round-trip through JSON so that resumed runs see exactly
+            # the same values as the run that recorded them
+            self.data["steps"][step] = json.loads(json.dumps(result, default=str))
+            self.save()
+
+    def forget(self, steps):
+        # Drops the results of the steps, e.g. of a removed cluster
+        with self.lock:
+            for step in steps:
+                self.data["steps"].pop(step, None)
+            self.save()
+
+    def save(self):
+        # Write to a temporary file and rename it, a crash in the middle of
+        # the write never leaves a truncated state file behind
+        folder = os.path.dirname(self.filename)
+        fd, temp_filename = tempfile.mkstemp(dir=folder, prefix=".eksfedctl-state-")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(self.data, temp_file, indent=2, sort_keys=True)
+            os.replace(temp_filename, self.filename)
+        except Exception:
+            os.remove(temp_filename)
+            raise
@@ -0,0 +1,220 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+import os
+import re
+import sys
+import time
+
+from destroy_script import read_output_config, get_cluster_regions
+from errors import ArgumentError
+from fleet import FederationIndex
+from health_script import FederationProbe
+from inventory import StackInventory, PHASES
+from planner import get_members
+from state import FederationState
+from tables import format_row, get_widths, print_table
+
+PROBES = ["cluster", "nodegroups", "kubefed", "peering", "routes"]
+HEALTH_HEADER = ["MEMBER", "REGION", "PROBE", "TARGET", "STATUS", "LATENCY", "DETAIL"]
+DETAIL_WIDTH = 60
+
+
+def process(args):
+    # Stacks of every federation of the regions unless a federation is given
+    if args.stacks or not (args.file or args.name):
+        process_stacks(args)
+        return
+
+    if args.interval < 1:
+        raise ArgumentError("Interval must be at least 1 second")
+
+    name, regions, bastion = get_federation_members(args)
+    unknown = [region for region in args.regions or [] if region not in regions]
+    if unknown:
+        raise ArgumentError(f"Federation {name} has no member in {', '.join(unknown)}")
+
+    probe = FederationProbe(name, regions, bastion, args.regions)
+    try:
+        if args.watch:
+            watch_health(probe, args.interval, args.output)
+        else:
+            print_health(probe.run(), args.output)
+    finally:
+        probe.close()
+
+
+def process_stacks(args):
+    base_name, regions = get_federation(args)
+
+    inventory = StackInventory().refresh(regions)
+    base_names = [base_name] if base_name else inventory.base_names()
+
+    print_stacks(inventory, base_names, regions)
+
+
+def get_federation(args):
+    if args.file:
+        home_folder = os.path.expanduser("~")
+        output_config = read_output_config(args.file.replace("~", home_folder))
+        regions = get_cluster_regions(output_config) + \
+            [output_config["BASTION_REGION"]]
+        return output_config["BASE_NAME"], regions
+
+    if args.regions:
+        return args.name, args.regions
+
+    if args.name:
+        federation = FederationIndex().get(args.name)
+        if federation:
+            return args.name, get_member_regions(federation["regions"]) + \
+                [federation["bastion_region"]]
+
+        state = FederationState(args.name)
+        if state.exists():
+            metadata = state.load().data["metadata"]
+            return args.name, get_member_regions(metadata["regions"]) + \
+                [metadata["bastion"]["region"]]
+
+    raise ArgumentError("Please specify a configuration file, or a name and regions")
+
+
+def get_member_regions(regions):
+    return [region for _, region in get_members(regions)]
+
+
+def get_federation_members(args):
+    # Name, regions by cluster number and bastion of the federation
+    name = args.name
+    regions = None
+    bastion = None
+
+    if args.file:
+        home_folder = os.path.expanduser("~")
+        output_config = read_output_config(args.file.replace("~", home_folder))
+        name = output_config["BASE_NAME"]
+        numbered = {int(match.group(1)): output_config[match.group(0)] for match in
+                    [re.match(r"^CLUSTER(\d+)_REGION$", key) for key in output_config]
+                    if match}
+        regions = [numbered.get(number) for number in range(1, max(numbered, default=0) + 1)]
+        bastion = {"region": output_config["BASTION_REGION"]}
+
+    # The state file has the bastion VPC, needed to probe its peerings
+    state = FederationState(name)
+    if state.exists():
+        metadata = state.load().data["metadata"]
+        return name, regions or metadata["regions"], metadata["bastion"]
+
+    federation = FederationIndex().get(name)
+    if federation and not regions:
+        regions = federation["regions"]
+        bastion = {"region": federation["bastion_region"]}
+
+    if not regions:
+        raise ArgumentError(f"Federation {name} not found in the local index")
+
+    return name, regions, bastion
+
+
+def get_health_rows(results):
+    def sort_key(result):
+        endpoints = [0 if endpoint == "bastion" else int(endpoint)
+                     for endpoint in result["member"].split("-")]
+        return len(endpoints), endpoints, PROBES.index(result["probe"])
+
+    return [((result["member"], result["probe"], result["target"]),
+             [result["member"], result["region"], result["probe"], result["target"],
+              result["status"], f"{result['latency'] * 1000:.0f}ms",
+              shorten(result["detail"], DETAIL_WIDTH)])
+            for result in sorted(results, key=sort_key)]
+
+
+def shorten(text, width):
+    # Errors of the API clients span several lines and sentences
+    text = " ".join(str(text).split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def print_health(results, output):
+    if output == "json":
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(HEALTH_HEADER, [row for _, row in get_health_rows(results)])
+
+
+def watch_health(probe, interval, output):
+    # Every probe runs again each interval, only the rows whose status or
+    # detail changed are written: in place on a terminal, appended with the
+    # time otherwise
+    shown = dict()
+    table = None
+
+    while True:
+        results = probe.run()
+        rows = get_health_rows(results)
+        changed = {key for key, row in rows if shown.get(key) != (row[4], row[6])}
+        shown = {key: (row[4], row[6]) for key, row in rows}
+
+        if output == "json":
+            timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+            for result in results:
+                if (result["member"], result["probe"], result["target"]) in changed:
+                    print(json.dumps({"time": timestamp, **result}))
+        elif table is None:
+            print_table(HEALTH_HEADER, [row for _, row in rows])
+            table = {"keys": [key for key, _ in rows],
+                     "widths": get_widths(HEALTH_HEADER, [row for _, row in rows])}
+        elif sys.stdout.isatty():
+            table = update_table(table, rows, changed)
+        else:
+            timestamp = time.strftime("%H:%M:%S")
+            for key, row in rows:
+                if key in changed:
+                    print(f"{timestamp}  {format_row(row, table['widths'])}")
+
+        sys.stdout.flush()
+        time.sleep(interval)
+
+
+def update_table(table, rows, changed):
+    # Rewrites the changed lines of the table printed last, or the whole
+    # table when rows were added or removed or a value got wider
+    keys = [key for key, _ in rows]
+    fits = all(len(str(value)) <= width
+               for _, row in rows for value, width in zip(row, table["widths"]))
+
+    if keys != table["keys"] or not fits:
+        print("")
+        print_table(HEALTH_HEADER, [row for _, row in rows])
+        return {"keys": keys, "widths": get_widths(HEALTH_HEADER, [row for _, row in rows])}
+
+    for idx, (key, row) in enumerate(rows):
+        if key in changed:
+            up = len(rows) - idx
+            sys.stdout.write(f"\033[{up}A\r\033[K{format_row(row, table['widths'])}\033[{up}B\r")
+
+    return table
+
+
+def print_stacks(inventory, base_names, regions):
+    rows = []
+    for base_name in base_names:
+        for region in sorted(set(regions)):
+            for phase in PHASES:
+                for stack in inventory.stacks(region, base_name, phase):
+                    rows.append([base_name, region, phase,
+                                 stack["StackName"], stack["StackStatus"]])
+
+    print_table(["NAME", "REGION", "PHASE", "STACK", "STATUS"], rows)
@@ -0,0 +1,32 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+# Plain text tables of the list, status and apply commands. Kept free of
+# boto3, requests and yaml, list answers without importing them
+
+
+def print_table(header, rows):
+    widths = get_widths(header, rows)
+
+    for row in [header] + rows:
+        print(format_row(row, widths))
+
+
+def get_widths(header, rows):
+    return [max([len(str(row[idx])) for row in rows] + [len(column)])
+            for idx, column in enumerate(header)]
+
+
+def format_row(row, widths):
+    return "  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
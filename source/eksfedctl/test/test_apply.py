@@ -0,0 +1,55 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import copy
+
+import apply_script
+
+MANIFEST = """
+apiVersion: types.kubefed.io/v1beta1
+kind: FederatedNamespace
+metadata:
+  name: {name}
+  namespace: {name}
+"""
+
+
+class FakeClient:
+    # Propagated objects, the get of the "broken" one fails
+    def apply(self, obj):
+        return {**obj, "metadata": {**obj["metadata"], "generation": 1}}
+
+    def get(self, obj):
+        if obj["metadata"]["name"] == "broken":
+            raise Exception("connection reset by peer")
+
+        obj = copy.deepcopy(obj)
+        obj["status"] = {"observedGeneration": 1, "clusters": [{"name": "cluster-1"}],
+                         "conditions": [{"type": "Propagation", "status": "True"}]}
+        return obj
+
+    def list(self, path):
+        return [{"metadata": {"name": "cluster-1"}}]
+
+
+def test_propagation_error_is_reported_with_its_object(tmp_path):
+    for name in ["app", "broken", "web"]:
+        (tmp_path / f"{name}.yaml").write_text(MANIFEST.format(name=name))
+
+    results = apply_script.apply_manifests(FakeClient(), str(tmp_path), wait=5)
+
+    assert {result["name"]: (result["clusters"], result["error"]) for result in results} == {
+        "app/app": ("1/1", None),
+        "broken/broken": (None, "connection reset by peer"),
+        "web/web": ("1/1", None),
+    }
@@ -0,0 +1,40 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+
+import cdk_app
+
+
+def test_deployments_have_their_own_context(tmp_path):
+    app_path = tmp_path / "app"
+    (app_path / "src").mkdir(parents=True)
+    (app_path / "src" / "index.ts").write_text("app")
+    (app_path / "cdk.json").write_text("{}")
+    (app_path / "node_modules").mkdir()
+
+    paths = [cdk_app.get_deploy_path(str(app_path), name) for name in ["fed-1-2", "fed-1-3"]]
+    # Reused by a resumed deployment
+    assert cdk_app.get_deploy_path(str(app_path), "fed-1-2") == paths[0]
+
+    for idx, path in enumerate(paths):
+        assert (tmp_path / "app" / "src" / "index.ts").read_text() == \
+            open(os.path.join(path, "src", "index.ts")).read()
+        assert os.path.islink(os.path.join(path, "node_modules"))
+        assert not os.path.lexists(os.path.join(path, "package-lock.json"))
+
+        with open(os.path.join(path, "cdk.context.json"), "w") as context_file:
+            context_file.write(str(idx))
+
+    assert not os.path.exists(app_path / "cdk.context.json")
+    assert [open(os.path.join(path, "cdk.context.json")).read() for path in paths] == ["0", "1"]
@@ -0,0 +1,101 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import types
+
+import pytest
+from moto import mock_aws
+
+from clients import get_client
+from create_action import get_resumed_config
+from create_script import load_state, start_clusters
+from errors import ArgumentError
+from state import FederationState
+
+NAME = "fed"
+REGIONS = ["eu-west-1", "us-east-1"]
+TEMPLATE = {"yaml": {"apiVersion": "fedk8s/v1", "kind": "FederatedEKSConfig",
+                     "metadata": {"name": NAME, "regions": REGIONS}},
+            "spec": {"metadata": {}, "vpc": {"nat": {"gateway": "Single"}}}}
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    with mock_aws():
+        yield
+
+
+def get_config(regions=REGIONS):
+    return types.SimpleNamespace(
+        yaml={"metadata": {"name": NAME, "regions": regions}}, spec=TEMPLATE["spec"],
+        bastion=types.SimpleNamespace(region="eu-west-1", vpcid="vpc-1", vpccidr="172.31.0.0/16"),
+        peering_engine="native")
+
+
+def get_args(**kwargs):
+    return types.SimpleNamespace(**{"name": NAME, "regions": None, "file": None,
+                                    "peering_engine": None, "resume": True, **kwargs})
+
+
+def record_run():
+    state = FederationState(NAME)
+    state.set_metadata(name=NAME, regions=REGIONS, peering_engine="native",
+                       template=TEMPLATE)
+    return state
+
+
+def test_resume_defaults_to_the_recorded_run():
+    record_run()
+    config_yaml, config_spec, peering_engine = get_resumed_config(
+        get_args(), {"metadata": {"name": NAME}}, {"metadata": {}, "vpc": {}})
+
+    assert config_yaml["metadata"] == {"name": NAME, "regions": REGIONS}
+    assert config_spec == TEMPLATE["spec"]
+    assert peering_engine == "native"
+
+
+@pytest.mark.parametrize("args", [{"regions": list(reversed(REGIONS))},
+                                  {"peering_engine": "cdk"}])
+def test_resume_rejects_other_values(args):
+    record_run()
+    with pytest.raises(ArgumentError, match="run to resume"):
+        get_resumed_config(get_args(**args), {"metadata": {"name": NAME}}, {})
+
+
+def test_resume_keeps_the_recorded_metadata():
+    state = record_run()
+    load_state(get_config(), True)
+
+    assert FederationState(NAME).load().data["metadata"] == state.data["metadata"]
+
+
+def test_existing_cluster_is_not_recorded():
+    get_client("eks", REGIONS[1]).create_cluster(
+        name=f"{NAME}-2", roleArn="arn:aws:iam::123456789012:role/eks", resourcesVpcConfig={})
+
+    state = load_state(get_config(), False)
+    with pytest.raises(Exception, match="already exists"):
+        start_clusters(get_config(), state, False)
+
+    # A later --resume can't adopt the cluster of someone else
+    assert not state.exists()
+
+
+def test_new_run_is_recorded():
+    state = load_state(get_config(), False)
+    assert start_clusters(get_config(), state, False) == {
+        "cluster-1": "create", "cluster-2": "create"}
+
+    metadata = FederationState(NAME).load().data["metadata"]
+    assert metadata["regions"] == REGIONS
+    assert metadata["peering_engine"] == "native"
@@ -0,0 +1,46 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import pytest
+from moto import mock_aws
+
+from clients import get_client
+from health_script import FederationProbe
+
+NAME = "fed"
+REGIONS = ["eu-west-1", "us-east-1", "us-west-2"]
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    with mock_aws():
+        yield
+
+
+def test_probes_of_the_selected_regions():
+    for number, region in enumerate(REGIONS, 1):
+        ec2 = get_client("ec2", region)
+        vpc_id = ec2.create_vpc(CidrBlock=f"10.{number}.0.0/16")["Vpc"]["VpcId"]
+        subnet_id = ec2.create_subnet(
+            VpcId=vpc_id, CidrBlock=f"10.{number}.0.0/24")["Subnet"]["SubnetId"]
+        get_client("eks", region).create_cluster(
+            name=f"{NAME}-{number}", roleArn="arn:aws:iam::123456789012:role/eks",
+            resourcesVpcConfig={"subnetIds": [subnet_id]})
+
+    probe = FederationProbe(NAME, REGIONS, selected_regions=["us-east-1"])
+    results = probe.run()
+    probe.close()
+
+    assert {(result["member"], result["probe"]) for result in results} == {
+        ("2", "cluster"), ("2", "nodegroups"), ("2", "kubefed"),
+        ("1-2", "peering"), ("1-2", "routes"), ("2-3", "peering"), ("2-3", "routes")}
@@ -0,0 +1,99 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+import shutil
+import subprocess
+
+import pytest
+
+import kubeconfig
+
+CLUSTER = {"name": "Federation-Cluster-1", "endpoint": "https://EXAMPLE.eks.amazonaws.com",
+           "certificateAuthority": {"data": "Q0EK"}}
+
+FAKE_AWS = """#!/bin/sh
+echo '{credential}'
+"""
+
+
+@pytest.fixture
+def fake_aws(tmp_path, monkeypatch):
+    # "aws eks get-token" of a given ExecCredential version
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    monkeypatch.setenv("PATH", str(bin_path))
+
+    def install(api_version):
+        aws = bin_path / "aws"
+        aws.write_text(FAKE_AWS.format(credential=json.dumps({
+            "kind": "ExecCredential", "apiVersion": api_version, "spec": {},
+            "status": {"token": "k8s-aws-v1.fake"}})))
+        aws.chmod(0o755)
+
+    return install
+
+
+def get_user_api_versions(config):
+    return [user["user"]["exec"]["apiVersion"] for user in config["users"]]
+
+
+@pytest.mark.parametrize("api_version", ["client.authentication.k8s.io/v1alpha1",
+                                         "client.authentication.k8s.io/v1beta1"])
+def test_exec_api_version_of_the_installed_cli(fake_aws, api_version):
+    fake_aws(api_version)
+    config = kubeconfig.build_kubeconfig(["eu-west-1"], [CLUSTER])
+    assert get_user_api_versions(config) == [api_version]
+
+
+def test_exec_api_version_without_cli(fake_aws):
+    config = kubeconfig.build_kubeconfig(["eu-west-1"], [CLUSTER])
+    assert get_user_api_versions(config) == [kubeconfig.DEFAULT_EXEC_API_VERSION]
+
+
+@pytest.mark.skipif(not shutil.which("aws"), reason="needs the AWS CLI")
+def test_exec_api_version_matches_aws_cli():
+    # The token is signed locally, the fake credentials and cluster are enough
+    credential = json.loads(subprocess.run(
+        ["aws", "--region", "eu-west-1", "eks", "get-token",
+         "--cluster-name", CLUSTER["name"]],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout)
+
+    config = kubeconfig.build_kubeconfig(["eu-west-1"], [CLUSTER])
+    assert get_user_api_versions(config) == [credential["apiVersion"]]
+
+
+FAKE_TOOL = """#!/bin/sh
+echo "$(basename "$0") $@" >> "{calls}"
+{exit}
+"""
+
+
+def test_unreachable_member_is_removed_from_the_host(tmp_path, monkeypatch):
+    bin_path = tmp_path / "tools"
+    bin_path.mkdir()
+    calls = tmp_path / "calls"
+    for tool, exit_code in [("kubefedctl", 1), ("kubectl", 0)]:
+        filename = bin_path / tool
+        filename.write_text(FAKE_TOOL.format(calls=calls, exit=f"exit {exit_code}"))
+        filename.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_path}:/usr/bin:/bin")
+
+    host = {**CLUSTER, "name": "Federation-Cluster-2"}
+    kubeconfig.unjoin_cluster(CLUSTER, host)
+
+    calls = calls.read_text().splitlines()
+    assert calls[0].startswith("kubefedctl unjoin federation-cluster-1 ")
+    assert calls[-1] == (
+        "kubectl delete kubefedcluster federation-cluster-1 "
+        "--namespace kube-federation-system --context federation-cluster-2 --ignore-not-found")
@@ -0,0 +1,80 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import kubefed
+
+# Name of an existing kind cluster to install KubeFed into, the test is
+# skipped without one, e.g. "kind create cluster --name eksfedctl"
+KIND_CLUSTER = os.environ.get("EKSFEDCTL_TEST_KIND_CLUSTER")
+
+FAKE_HELM = """#!/bin/sh
+echo "$@" >> "{calls}"
+while [ $# -gt 0 ]; do
+    if [ "$1" = "--destination" ]; then
+        echo chart > "$2/kubefed-{version}.tgz"
+    fi
+    shift
+done
+"""
+
+
+@pytest.fixture
+def fake_helm(tmp_path, monkeypatch):
+    # Records its calls and writes an archive where "helm pull" would
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    calls = tmp_path / "helm-calls"
+    helm = bin_path / "helm"
+    helm.write_text(FAKE_HELM.format(calls=calls, version=kubefed.KUBEFED_VERSION))
+    helm.chmod(0o755)
+
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    return calls
+
+
+def test_chart_is_downloaded_once(fake_helm):
+    chart_filename = kubefed.fetch_chart()
+    assert kubefed.fetch_chart() == chart_filename
+
+    assert os.path.exists(chart_filename)
+    assert os.path.dirname(chart_filename) == kubefed.get_chart_folder()
+    assert [line.split()[0] for line in fake_helm.read_text().splitlines()] == ["pull"]
+    # No partial download left behind
+    assert os.listdir(kubefed.get_chart_folder()) == [os.path.basename(chart_filename)]
+
+
+@pytest.mark.skipif(not KIND_CLUSTER or not all(shutil.which(tool) for tool in
+                                                ["kind", "helm", "kubectl"]),
+                    reason="needs EKSFEDCTL_TEST_KIND_CLUSTER, kind, helm and kubectl")
+def test_install_from_cached_chart_into_kind(monkeypatch):
+    context = f"kind-{KIND_CLUSTER}"
+    kubefed.install_kubefed(context)
+
+    # The second install can't reach the chart repository, it only
+    # succeeds from the cached archive
+    monkeypatch.setattr(kubefed, "KUBEFED_CHARTS", "http://127.0.0.1:9/charts")
+    kubefed.install_kubefed(context)
+
+    for deployment in kubefed.KUBEFED_DEPLOYMENTS:
+        available = subprocess.run(
+            ["kubectl", "get", "deployment", deployment, "--context", context,
+             "--namespace", kubefed.KUBEFED_NAMESPACE,
+             "--output", "jsonpath={.status.availableReplicas}"],
+            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        assert int(available or 0) > 0
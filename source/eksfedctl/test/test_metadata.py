@@ -0,0 +1,145 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import eksfedctl
+from metadata import InstanceMetadataClient, get_bastion_overrides
+
+MAC = "0a:00:00:00:00:01"
+INTERFACE_PATH = f"/latest/meta-data/network/interfaces/macs/{MAC}"
+PATHS = {
+    "/latest/dynamic/instance-identity/document": json.dumps({"region": "eu-west-1"}),
+    "/latest/meta-data/mac": MAC,
+    f"{INTERFACE_PATH}/vpc-id": "vpc-0123456789abcdef0",
+    f"{INTERFACE_PATH}/vpc-ipv4-cidr-block": "172.31.0.0/16",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Stands in for 169.254.169.254, IMDSv2 only unless tokens are disabled
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        self.server.requests.append(("PUT", self.path))
+        if not self.server.tokens:
+            return self.reply(405, "")
+
+        self.server.token_count += 1
+        self.reply(200, f"token-{self.server.token_count}")
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        token = self.headers.get("X-aws-ec2-metadata-token")
+        if self.server.tokens and token != f"token-{self.server.token_count}":
+            return self.reply(401, "")
+
+        value = PATHS.get(self.path)
+        self.reply(404 if value is None else 200, value or "")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def imds():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.tokens = True
+    server.token_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def get_endpoint(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_bastion_metadata_with_one_token(imds):
+    metadata = InstanceMetadataClient(get_endpoint(imds)).get_bastion_metadata()
+
+    assert (metadata.region, metadata.vpcid, metadata.vpccidr) == \
+        ("eu-west-1", "vpc-0123456789abcdef0", "172.31.0.0/16")
+    assert [path for method, path in imds.requests if method == "PUT"] == ["/latest/api/token"]
+    assert len(imds.requests) == 5
+
+
+def test_expired_token_is_renewed(imds):
+    client = InstanceMetadataClient(get_endpoint(imds))
+    assert client.get("meta-data/mac") == MAC
+
+    # Token revoked on the server side
+    imds.token_count += 1
+    assert client.get("meta-data/mac") == MAC
+    assert imds.token_count == 3
+
+
+def test_imdsv1_fallback(imds):
+    imds.tokens = False
+    metadata = InstanceMetadataClient(get_endpoint(imds)).get_bastion_metadata()
+
+    assert metadata.region == "eu-west-1"
+
+
+def test_unreachable_endpoint():
+    # A port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    with pytest.raises(Exception, match="specify the bastion region"):
+        InstanceMetadataClient(f"http://127.0.0.1:{port}").get_bastion_metadata()
+
+
+def parse_create_args(monkeypatch, argv):
+    # Arguments as parsed by the real command line
+    parsed = []
+    monkeypatch.setattr(eksfedctl, "command", lambda module_name, function_name: parsed.append)
+    monkeypatch.setattr(sys, "argv", ["eksfedctl", "create"] + argv)
+    eksfedctl.main()
+    return parsed[0]
+
+
+def test_bastion_overrides_from_arguments(monkeypatch):
+    args = parse_create_args(monkeypatch, [
+        "--bastion-region", "eu-west-1", "--bastion-vpc-id", "vpc-1",
+        "--bastion-vpc-cidr", "172.31.0.0/16"])
+
+    assert get_bastion_overrides(args) == \
+        {"region": "eu-west-1", "vpcid": "vpc-1", "vpccidr": "172.31.0.0/16"}
+
+
+def test_bastion_overrides_from_environment(monkeypatch):
+    monkeypatch.setenv("EKSFEDCTL_BASTION_VPC_ID", "vpc-2")
+    monkeypatch.setenv("EKSFEDCTL_BASTION_VPC_CIDR", "172.31.0.0/16")
+    args = parse_create_args(monkeypatch, ["--bastion-vpc-id", "vpc-1"])
+
+    # Arguments take precedence
+    assert get_bastion_overrides(args) == {"vpcid": "vpc-1", "vpccidr": "172.31.0.0/16"}
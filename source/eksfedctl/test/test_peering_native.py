@@ -0,0 +1,200 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import pytest
+from moto import mock_aws
+
+from clients import get_client
+from peering_native import add_route, create_native_peering, delete_native_peerings
+
+PEER_CIDR = "10.2.0.0/16"
+SUBNET_TYPE_TAG = "aws-cdk:subnet-type"
+
+
+@pytest.fixture
+def ec2():
+    with mock_aws():
+        yield get_client("ec2", "us-east-1")
+
+
+def create_table(ec2, cidr="10.1.0.0/16"):
+    vpc_id = ec2.create_vpc(CidrBlock=cidr)["Vpc"]["VpcId"]
+    table_id = ec2.create_route_table(VpcId=vpc_id)["RouteTable"]["RouteTableId"]
+    return vpc_id, table_id
+
+
+def create_peering(ec2, vpc_id):
+    peer_vpc_id = ec2.create_vpc(CidrBlock=PEER_CIDR)["Vpc"]["VpcId"]
+    return ec2.create_vpc_peering_connection(
+        VpcId=vpc_id, PeerVpcId=peer_vpc_id)["VpcPeeringConnection"]["VpcPeeringConnectionId"]
+
+
+def describe_table(ec2, table_id):
+    return ec2.describe_route_tables(RouteTableIds=[table_id])["RouteTables"][0]
+
+
+def get_peer_routes(ec2, table_id):
+    return [route for route in describe_table(ec2, table_id)["Routes"]
+            if route.get("DestinationCidrBlock") == PEER_CIDR]
+
+
+def test_add_route_creates_missing_route(ec2):
+    vpc_id, table_id = create_table(ec2)
+    peering_id = create_peering(ec2, vpc_id)
+
+    add_route(ec2, describe_table(ec2, table_id), PEER_CIDR, peering_id)
+
+    routes = get_peer_routes(ec2, table_id)
+    assert [route["VpcPeeringConnectionId"] for route in routes] == [peering_id]
+
+
+def test_add_route_keeps_route_through_same_peering(ec2):
+    vpc_id, table_id = create_table(ec2)
+    peering_id = create_peering(ec2, vpc_id)
+    table = describe_table(ec2, table_id)
+
+    add_route(ec2, table, PEER_CIDR, peering_id)
+    add_route(ec2, describe_table(ec2, table_id), PEER_CIDR, peering_id)
+    # A table described before the route was added
+    add_route(ec2, table, PEER_CIDR, peering_id)
+
+    assert len(get_peer_routes(ec2, table_id)) == 1
+
+
+def test_add_route_never_replaces_other_target(ec2):
+    vpc_id, table_id = create_table(ec2)
+    peering_id = create_peering(ec2, vpc_id)
+    gateway_id = ec2.create_internet_gateway()["InternetGateway"]["InternetGatewayId"]
+    ec2.attach_internet_gateway(InternetGatewayId=gateway_id, VpcId=vpc_id)
+    ec2.create_route(RouteTableId=table_id, DestinationCidrBlock=PEER_CIDR,
+                     GatewayId=gateway_id)
+
+    with pytest.raises(Exception, match=gateway_id):
+        add_route(ec2, describe_table(ec2, table_id), PEER_CIDR, peering_id)
+
+    with pytest.raises(Exception, match=gateway_id):
+        # Added since the table was described
+        add_route(ec2, {"RouteTableId": table_id, "Routes": []}, PEER_CIDR, peering_id)
+
+    routes = get_peer_routes(ec2, table_id)
+    assert [route.get("GatewayId") for route in routes] == [gateway_id]
+
+
+def create_cluster_vpc(ec2, cidr):
+    # Layout of an eksctl VPC, plus what a user may add next to it: a
+    # subnet left on the main table, an isolated subnet and a table of no
+    # subnet
+    vpc_id = ec2.create_vpc(CidrBlock=cidr)["Vpc"]["VpcId"]
+    prefix = cidr.rsplit(".", 2)[0]
+
+    def create_subnet(number, subnet_type=None):
+        tags = [{"Key": "Name", "Value": f"subnet-{number}"}]
+        if subnet_type:
+            tags.append({"Key": SUBNET_TYPE_TAG, "Value": subnet_type})
+
+        subnet = ec2.create_subnet(VpcId=vpc_id, CidrBlock=f"{prefix}.{number}.0/24",
+                                   TagSpecifications=[{"ResourceType": "subnet", "Tags": tags}])
+        return subnet["Subnet"]["SubnetId"]
+
+    def create_table(subnet_ids):
+        table_id = ec2.create_route_table(VpcId=vpc_id)["RouteTable"]["RouteTableId"]
+        for subnet_id in subnet_ids:
+            ec2.associate_route_table(RouteTableId=table_id, SubnetId=subnet_id)
+        return table_id
+
+    gateway_id = ec2.create_internet_gateway()["InternetGateway"]["InternetGatewayId"]
+    ec2.attach_internet_gateway(InternetGatewayId=gateway_id, VpcId=vpc_id)
+    public_table_id = create_table([create_subnet(0), create_subnet(1)])
+    ec2.create_route(RouteTableId=public_table_id, DestinationCidrBlock="0.0.0.0/0",
+                     GatewayId=gateway_id)
+
+    create_table([create_subnet(2)])
+    create_table([create_subnet(3)])
+    create_subnet(4)
+    create_table([create_subnet(5, "Isolated")])
+    create_table([])
+
+    return vpc_id
+
+
+def get_cdk_route_tables(ec2, vpc_id):
+    # Route tables of the public and private subnets of Vpc.fromLookup(),
+    # i.e. the ones VpcPeeringConstruct adds routes to. As the CDK context
+    # provider does, a subnet without a table uses the main one and its
+    # type comes from its tag, or from an internet gateway route otherwise
+    tables = ec2.describe_route_tables(
+        Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])["RouteTables"]
+    main_table = next(table for table in tables
+                      if any(association["Main"] for association in table["Associations"]))
+    table_ids = set()
+
+    for subnet in ec2.describe_subnets(
+            Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])["Subnets"]:
+        table = next((table for table in tables
+                      if any(association.get("SubnetId") == subnet["SubnetId"]
+                             for association in table["Associations"])), main_table)
+        is_public = any(route.get("GatewayId", "").startswith("igw-")
+                        for route in table["Routes"])
+        subnet_type = next((tag["Value"] for tag in subnet.get("Tags", [])
+                            if tag["Key"] == SUBNET_TYPE_TAG),
+                           "Public" if is_public else "Private")
+
+        if subnet_type in ["Public", "Private"]:
+            table_ids.add(table["RouteTableId"])
+
+    return table_ids
+
+
+def get_peering_route_tables(ec2, vpc_id, peering_id):
+    return set(table["RouteTableId"] for table in ec2.describe_route_tables(
+        Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])["RouteTables"]
+        if any(route.get("VpcPeeringConnectionId") == peering_id
+               for route in table["Routes"]))
+
+
+def test_native_routes_match_cdk_construct():
+    with mock_aws():
+        ec2 = get_client("ec2", "us-east-1")
+        peer_ec2 = get_client("ec2", "us-west-2")
+        vpc1id = create_cluster_vpc(ec2, "10.1.0.0/16")
+        vpc2id = create_cluster_vpc(peer_ec2, PEER_CIDR)
+
+        peering_id = create_native_peering("fed", "fed-peering-1-2",
+                                           "us-east-1", vpc1id, "10.1.0.0/16",
+                                           "us-west-2", vpc2id, PEER_CIDR)
+
+        for client, vpc_id in [(ec2, vpc1id), (peer_ec2, vpc2id)]:
+            table_ids = get_peering_route_tables(client, vpc_id, peering_id)
+            # Public, two private and main tables
+            assert len(table_ids) == 4
+            assert table_ids == get_cdk_route_tables(client, vpc_id)
+
+
+def test_delete_native_peerings_removes_routes_and_connection():
+    with mock_aws():
+        ec2 = get_client("ec2", "us-east-1")
+        peer_ec2 = get_client("ec2", "us-west-2")
+        vpc1id = create_cluster_vpc(ec2, "10.1.0.0/16")
+        vpc2id = create_cluster_vpc(peer_ec2, PEER_CIDR)
+        peering_id = create_native_peering("fed", "fed-peering-1-2",
+                                           "us-east-1", vpc1id, "10.1.0.0/16",
+                                           "us-west-2", vpc2id, PEER_CIDR)
+
+        delete_native_peerings("fed", ["us-east-1", "us-west-2"])
+
+        for client, vpc_id in [(ec2, vpc1id), (peer_ec2, vpc2id)]:
+            assert get_peering_route_tables(client, vpc_id, peering_id) == set()
+
+        peering = ec2.describe_vpc_peering_connections(
+            VpcPeeringConnectionIds=[peering_id])["VpcPeeringConnections"][0]
+        assert peering["Status"]["Code"] == "deleted"
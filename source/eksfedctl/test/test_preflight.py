@@ -0,0 +1,62 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import types
+
+import pytest
+from moto import mock_aws
+
+from clients import get_client
+from preflight import check_member_quota, check_quota
+
+REGION = "us-east-1"
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    with mock_aws():
+        yield
+
+
+def test_check_quota_rejects_exceeded_quota():
+    # The default VPC and 4 more use the whole quota of 5
+    ec2 = get_client("ec2", REGION)
+    for idx in range(4):
+        ec2.create_vpc(CidrBlock=f"10.{idx}.0.0/16")
+
+    with pytest.raises(Exception, match="5 used, 1 required, limit is 5"):
+        check_quota(REGION, "vpcs", 1)
+
+
+def test_check_quota_skips_unreadable_quota(capsys):
+    # The EKS quota isn't served by the stand-in, like without the
+    # servicequotas:GetServiceQuota permission. No default limit is assumed
+    check_quota(REGION, "clusters", 101)
+
+    assert "skipping its check" in capsys.readouterr().err
+
+
+def test_existing_member_requires_no_quota():
+    ec2 = get_client("ec2", REGION)
+    for idx in range(4):
+        ec2.create_vpc(CidrBlock=f"10.{idx}.0.0/16")
+    config = types.SimpleNamespace(
+        yaml={"metadata": {"name": "fed", "regions": ["eu-west-1", REGION]}})
+
+    with pytest.raises(Exception, match="5 used, 1 required, limit is 5"):
+        check_member_quota(config, REGION, "vpcs", 1)
+
+    # Resumed cluster, its VPC is one of the used ones
+    get_client("eks", REGION).create_cluster(
+        name="fed-2", roleArn="arn:aws:iam::123456789012:role/eks", resourcesVpcConfig={})
+    check_member_quota(config, REGION, "vpcs", 1)
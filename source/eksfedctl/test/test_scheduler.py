@@ -0,0 +1,77 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+SLEEP = "20.25"
+
+# Two long commands run concurrently, a third task waits for them. Ctrl-C
+# is handled like eksfedctl.py does
+SCRIPT = textwrap.dedent(f"""
+    import signal
+    import sys
+
+    sys.path.insert(0, {SOURCE_PATH!r})
+    import eksfedctl
+    from execution import exec_command
+    from scheduler import TaskGraph
+
+    signal.signal(signal.SIGINT, eksfedctl.interrupt_signal_handler)
+
+    graph = TaskGraph()
+    graph.add("sleep-1", lambda results: exec_command(["sleep", "{SLEEP}"]))
+    graph.add("sleep-2", lambda results: exec_command(["sleep", "{SLEEP}"]))
+    graph.add("after", lambda results: print("after started", flush=True),
+              requires=["sleep-1", "sleep-2"])
+    graph.run()
+""")
+
+
+def get_sleeps():
+    pids = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+                if cmdline.read().split(b"\0")[:2] == [b"sleep", SLEEP.encode()]:
+                    pids.append(pid)
+        except OSError:
+            pass
+
+    return pids
+
+
+def test_interrupt_stops_running_commands():
+    process = subprocess.Popen([sys.executable, "-c", SCRIPT],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               universal_newlines=True)
+
+    deadline = time.monotonic() + 10
+    while len(get_sleeps()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert len(get_sleeps()) == 2
+
+    start = time.monotonic()
+    process.send_signal(signal.SIGINT)
+    output, _ = process.communicate(timeout=15)
+
+    assert time.monotonic() - start < 5
+    assert process.returncode == 1
+    assert get_sleeps() == []
+    assert "Interrupting and exit!" in output
+    assert "after started" not in output
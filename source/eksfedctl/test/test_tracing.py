@@ -0,0 +1,32 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+import json
+
+import tracing
+
+
+def test_report_keeps_the_metadata_apart(tmp_path):
+    # Template metadata may use any key, e.g. a "status" label
+    metadata = {"name": "fed", "regions": ["eu-west-1"], "status": "draft", "command": "x"}
+    with tracing.span("create"):
+        pass
+
+    filename = tracing.write_report(str(tmp_path / "report.json"), "create", "ok",
+                                    metadata=metadata, dry_run=False)
+
+    with open(filename) as report_file:
+        report = json.load(report_file)
+    assert (report["command"], report["status"], report["dry_run"]) == ("create", "ok", False)
+    assert report["metadata"] == metadata
+    assert "create" in [record["name"] for record in report["spans"]]
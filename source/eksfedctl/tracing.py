@@ -0,0 +1,153 @@
+######################################################################################################################
+#  Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.                                           #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the License). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+#####################################################################################################################
+
+
+import contextlib
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+_spans = []
+_spans_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_context = threading.local()
+
+
+def get_current_span():
+    stack = getattr(_context, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def span(name, parent=None, **attributes):
+    # Records start, end, duration, status and retries of a phase. The
+    # parent defaults to the enclosing span of the same thread, threads
+    # started by a span pass it explicitly
+    parent = parent or get_current_span()
+    record = {
+        "id": next(_span_ids),
+        "parent": parent["id"] if parent else None,
+        "name": name,
+        "thread": threading.current_thread().name,
+        "start": time.time(),
+        "end": None,
+        "duration": None,
+        "status": "running",
+        "retries": 0,
+        "attributes": dict(attributes),
+    }
+
+    with _spans_lock:
+        _spans.append(record)
+
+    if not hasattr(_context, "stack"):
+        _context.stack = []
+    _context.stack.append(record)
+
+    otel_span = start_otel_span(name, parent, attributes)
+    record["otel"] = otel_span
+
+    try:
+        yield record
+        record["status"] = "ok"
+    except BaseException as ex:
+        record["status"] = "error"
+        record["error"] = str(ex)
+        raise
+    finally:
+        record["end"] = time.time()
+        record["duration"] = record["end"] - record["start"]
+        _context.stack.pop()
+
+        if otel_span is not None:
+            otel_span.set_attribute("retries", record["retries"])
+            otel_span.end()
+
+
+def traced(name=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_retry(count=1):
+    record = get_current_span()
+    if record is not None:
+        record["retries"] += count
+
+
+def set_attribute(key, value):
+    record = get_current_span()
+    if record is not None:
+        record["attributes"][key] = value
+
+
+def start_otel_span(name, parent, attributes):
+    # Mirrors the spans to OpenTelemetry when its API is installed and a
+    # tracer provider is configured, e.g. by opentelemetry-instrument
+    if otel_trace is None:
+        return None
+
+    context = None
+    if parent is not None and parent.get("otel") is not None:
+        context = otel_trace.set_span_in_context(parent["otel"])
+
+    otel_span = otel_trace.get_tracer("eksfedctl").start_span(name, context=context)
+    for key, value in attributes.items():
+        otel_span.set_attribute(key, str(value))
+
+    return otel_span
+
+
+def get_report_filename(name):
+    home_folder = os.path.expanduser("~")
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(home_folder, ".eksfedctl", "reports", f"{name}-{timestamp}.json")
+
+
+def write_report(filename, command, status, metadata=None, **attributes):
+    # The metadata of the federation is nested, its keys can't collide with
+    # the attributes of the run
+    with _spans_lock:
+        spans = [{key: value for key, value in record.items() if key != "otel"}
+                 for record in _spans]
+
+    for record in spans:
+        for key in ["start", "end"]:
+            if record[key] is not None:
+                record[key] = datetime.fromtimestamp(
+                    record[key], timezone.utc).isoformat()
+
+    report = {"command": command, "status": status, **attributes,
+              "metadata": metadata or {}, "spans": spans}
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, "w") as report_file:
+        json.dump(report, report_file, indent=2, default=str)
+
+    return filename
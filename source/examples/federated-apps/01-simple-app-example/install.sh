@@ -4,9 +4,6 @@ set -ex
 
 BASE_DIR=$(dirname $0)
 
-# create test NS
-kubectl apply -f $BASE_DIR/namespace.yaml
-kubectl apply -f $BASE_DIR/federated-namespace.yaml
-kubectl apply -f $BASE_DIR/federated-nginx.yaml
-# Replicas scheduling preference across Fed EKS clusters
-kubectl apply -f $BASE_DIR/federated-deployment-rsp.yaml
+# Test NS, federated nginx deployment and its replicas scheduling preference
+# across Fed EKS clusters, applied in dependency order
+eksfedctl apply -f $BASE_DIR